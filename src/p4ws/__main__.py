@@ -1,39 +1,85 @@
 """Main of P4 Workshop executable."""
 
 import argparse
+import importlib
 import sys
 
 from . import __version__
-from .loadmn import *
-from .patch import *
-from .tar import *
 
+# Subcommands, name -> (module, help), modules are imported only when run
+COMMANDS = {
+    "clean": (".clean", "Clean up leftovers of p4ws runs, running networks are stopped too."),
+    "events": (".events", "Query nanolog events of switches written by loadmn --events."),
+    "exec": (".exec", "Run a command in a node of a running network."),
+    "fanout": (".fanout", "Run a command on many nodes of a running network at once."),
+    "loadmn": (".loadmn", "Run a Mininet instance."),
+    "patch": (".patch", "Patch a SDE."),
+    "tar": (".tar", "Save program into a single archive."),
+}
 
-def main(args: argparse.Namespace):
-    """Main of P4 Workshop executable."""
-    if args.subparser_name == "loadmn":
-        return main_loadmn(args)
-    elif args.subparser_name == "patch":
-        return main_patch(args)
-    elif args.subparser_name == "tar":
-        return main_tar(args)
-    else:
-        print(f"Unknown command: {args.subparser_name}.", file=sys.stderr)
-        parser.print_help()
-        return 1
 
+def load_command(name: str):
+    """Import module of a subcommand.
+
+    Parameters
+    ----------
+    name : str
+        Name of the subcommand.
+
+    Returns
+    -------
+    module : module
+        Module providing `make_<name>_subparser` and `main_<name>`.
+    """
+
+    return importlib.import_module(COMMANDS[name][0], __package__)
+
+
+def make_parser(argv: list):
+    """Make parser of P4 Workshop executable.
+
+    Only the subcommand named by `argv` gets its full subparser, others are
+    registered by name and help, so their modules are not imported.
+
+    Parameters
+    ----------
+    argv : list
+        Arguments, without program name.
+
+    Returns
+    -------
+    arg_parser : argparse.ArgumentParser
+    """
 
-if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         prog="python3 -m p4ws",
         description=__doc__)
 
     subparsers = parser.add_subparsers(dest="subparser_name")
-    make_loadmn_subparser(subparsers)
-    make_patch_subparser(subparsers)
-    make_tar_subparser(subparsers)
+    selected = argv[0] if argv else None
+    for name, (_, help) in COMMANDS.items():
+        if name == selected:
+            getattr(load_command(name), f"make_{name}_subparser")(subparsers)
+        else:
+            subparsers.add_parser(name, help=help, add_help=False)
     subparsers.add_parser("help", help="Show this help message and exit.")
     subparsers.add_parser("version", help="Show version and exit.")
+    return parser
+
+
+def main(args: argparse.Namespace):
+    """Main of P4 Workshop executable."""
+    if args.subparser_name in COMMANDS:
+        name = args.subparser_name
+        return getattr(load_command(name), f"main_{name}")(args)
+    else:
+        print(f"Unknown command: {args.subparser_name}.", file=sys.stderr)
+        parser.print_help()
+        return 1
+
+
+if __name__ == "__main__":
+    parser = make_parser(sys.argv[1:])
 
     args = parser.parse_args()
     if args.subparser_name == "help":
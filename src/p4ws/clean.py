@@ -0,0 +1,264 @@
+"""Clean up leftovers of crashed runs."""
+
+import argparse
+import glob
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Union
+
+from p4ws.state import STATE_ENV, get_start_time, parse_node_mark, read_state
+from p4ws.utils import NODE_ENV
+
+# Prefixes of temporary files of p4ws nodes
+TEMP_FILE_PREFIXES = ("p4ws.mnhlp.nodes.TofinoModel.",)
+
+# Defaults of `p4ws.mnhlp`, not imported here, as it imports Mininet:
+# `allocator.DEFAULT_ALLOC_DIR` and `cgroup.DEFAULT_PARENT`
+DEFAULT_ALLOC_DIR = "/tmp/p4ws-alloc"
+DEFAULT_CGROUP_PARENT = "p4ws"
+
+
+def make_clean_subparser(parser: argparse._SubParsersAction):
+    """Make subparser of clean.
+
+    Parameters
+    ----------
+    parser : argparse._SubParsersAction
+        An ArgumentParser.
+
+    Returns
+    -------
+    arg_parser : argparse.ArgumentParser
+    """
+
+    subparser = parser.add_parser(
+        "clean", help="Clean up leftovers of exited p4ws runs, and nodes of the state file.")
+    subparser.add_argument("-n", "--dry-run", action="store_true", required=False,
+                           help="only list leftovers, do not remove them")
+    subparser.add_argument("-s", "--state-file", type=str, required=False,
+                           default=os.environ.get(STATE_ENV),
+                           help=f"state file written by loadmn --state-file, its nodes and interfaces are cleaned too, even if running (default: ${STATE_ENV})",
+                           metavar="STATE")
+    subparser.add_argument("--alloc-dir", type=str, required=False, default=DEFAULT_ALLOC_DIR,
+                           help="directory of leases of loadmn --allocate, interfaces of exited networks are cleaned (default: %(default)s)",
+                           metavar="DIR")
+    subparser.add_argument("--cgroup-parent", type=str, required=False, default=DEFAULT_CGROUP_PARENT,
+                           help="parent of cgroups of loadmn runs, cgroups of exited runs are removed (default: %(default)s)",
+                           metavar="PARENT")
+    return subparser
+
+
+def find_processes(state: Union[dict, None] = None, cgroups: Union[List[str], None] = None):
+    """Find processes of p4ws nodes, of exited runs or in the state.
+
+    Parameters
+    ----------
+    state : dict | None
+        State of a network, see `p4ws.state.read_state`, or None.
+    cgroups : List[str] | None
+        Cgroups of exited runs, see `find_stale_cgroups`, or None.
+
+    Returns
+    -------
+    pids : list[int]
+        PIDs of processes marked by `NODE_ENV` as of exited runs, of nodes in
+        `state`, and in `cgroups`.
+    """
+
+    from p4ws.mnhlp.cgroup import get_cgroup_pids
+
+    pids = set()
+    for cgroup in cgroups or ():
+        pids.update(get_cgroup_pids(cgroup))
+    if state is not None:
+        for node in state["nodes"].values():
+            if get_start_time(node["pid"]) == node.get("start-time"):
+                pids.add(node["pid"])
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit() or int(entry) == os.getpid():
+            continue
+        try:
+            with open(f"/proc/{entry}/environ", "rb") as f:
+                environ = f.read().split(b"\0")
+        except OSError:
+            continue
+        prefix = NODE_ENV.encode() + b"="
+        mark = next((e[len(prefix):] for e in environ if e.startswith(prefix)), None)
+        if mark is None:
+            continue
+        mark = parse_node_mark(mark.decode(errors="replace"))
+        # Nodes of running networks, or not known of which, are kept
+        if mark is not None and get_start_time(mark[1]) != mark[2]:
+            pids.add(int(entry))
+    return sorted(pids)
+
+
+def find_intfs(state: Union[dict, None] = None, leases: Union[dict, None] = None):
+    """Find veth interfaces recorded by p4ws in the root namespace.
+
+    Parameters
+    ----------
+    state : dict | None
+        State of a network, whose interfaces of nodes are selected, or None.
+    leases : dict | None
+        Leases of exited networks, see `find_stale_leases`, interfaces with
+        their prefixes, or Tofino veths of their blocks, are selected, or None.
+
+    Returns
+    -------
+    intfs : list[str]
+        Names of interfaces.
+    """
+
+    from p4ws.mnhlp.nodes.TofinoModel import VETH_BLOCK
+
+    names = set()
+    if state is not None:
+        for node in state["nodes"].values():
+            names.update(node.get("intfs", []))
+    prefixes = tuple(f"{name}-" for lease in (leases or {}).values()
+                     for name in lease.get("names", {}).get("net", []))
+    # Blocks of veth ids, see `TofinoModel.allocate_veth_base`
+    veth_blocks = set(int(block) + 1 for lease in (leases or {}).values()
+                      for block in lease.get("names", {}).get("tofino-veth", [])
+                      if block.isdigit())
+
+    out = subprocess.run(["ip", "-o", "link", "show", "type", "veth"],
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+    intfs = []
+    for line in out.decode(errors="replace").splitlines():
+        # 2: s1-eth1@if3: <...> ...
+        fields = line.split(":", 2)
+        if len(fields) < 3:
+            continue
+        name = fields[1].strip().split("@", 1)[0]
+        if name in names or (prefixes and name.startswith(prefixes)):
+            intfs.append(name)
+        elif name[4:].isdigit() and name.startswith("veth")\
+                and int(name[4:]) // VETH_BLOCK in veth_blocks:
+            intfs.append(name)
+    return intfs
+
+
+def find_temp_files():
+    """Find temporary files of p4ws nodes.
+
+    Returns
+    -------
+    paths : list[str]
+        Paths to files.
+    """
+
+    paths = []
+    for prefix in TEMP_FILE_PREFIXES:
+        paths.extend(glob.glob(os.path.join(
+            tempfile.gettempdir(), glob.escape(prefix) + "*")))
+    return paths
+
+
+def kill_processes(pids: list, timeout: float = 5.0):
+    """Kill processes at once, and wait for all of them to exit.
+
+    Parameters
+    ----------
+    pids : list[int]
+        PIDs of processes.
+    timeout : float
+        Seconds to wait for processes to exit.
+    """
+
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    deadline = time.monotonic() + timeout
+    remaining = set(pids)
+    while remaining and time.monotonic() < deadline:
+        for pid in list(remaining):
+            if not os.path.exists(f"/proc/{pid}"):
+                remaining.discard(pid)
+        if remaining:
+            time.sleep(0.01)
+
+
+def delete_intfs(intfs: list):
+    """Delete interfaces by one `ip -batch` process.
+
+    Parameters
+    ----------
+    intfs : list[str]
+        Names of interfaces.
+    """
+
+    if not intfs:
+        return
+    script = "".join(f"link del dev {name}\n" for name in intfs)
+    subprocess.run(["ip", "-force", "-batch", "-"], input=script.encode(),
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main_clean(args: argparse.Namespace):
+    """Main of clean executable."""
+
+    from p4ws.mnhlp.allocator import find_stale_leases
+    from p4ws.mnhlp.cgroup import find_stale_cgroups, remove_cgroup
+
+    state = None
+    if args.state_file and os.path.exists(args.state_file):
+        try:
+            state = read_state(args.state_file)
+        except (OSError, ValueError) as e:
+            print(f"Cannot read state: {e}", file=sys.stderr)
+            return 1
+    leases = find_stale_leases(args.alloc_dir)
+    cgroups = find_stale_cgroups(args.cgroup_parent)
+
+    pids = find_processes(state, cgroups)
+    print(f"-- Processes: {len(pids)}")
+    for pid in pids:
+        print(f"  {pid}")
+    if not args.dry_run:
+        kill_processes(pids)
+
+    # Namespaces held by processes are released with them, and interfaces
+    # in them are deleted
+    intfs = find_intfs(state, leases)
+    print(f"-- Interfaces: {len(intfs)}")
+    for name in intfs:
+        print(f"  {name}")
+    if not args.dry_run:
+        delete_intfs(intfs)
+
+    paths = find_temp_files()
+    print(f"-- Temporary files: {len(paths)}")
+    for path in paths:
+        print(f"  {path}")
+    if not args.dry_run:
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    print(f"-- Cgroups: {len(cgroups)}")
+    for path in cgroups:
+        print(f"  {path}")
+    if not args.dry_run:
+        for path in cgroups:
+            remove_cgroup(path)
+
+    if not args.dry_run:
+        find_stale_leases(args.alloc_dir, remove=True)
+        if state is not None:
+            try:
+                os.remove(args.state_file)
+            except FileNotFoundError:
+                pass
+
+    return 0
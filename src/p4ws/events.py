@@ -0,0 +1,464 @@
+"""Columnar store of nanolog events of bmv2 switches.
+
+Switches started with `--nanolog` publish binary messages of events, e.g.
+packets in and out, table hits and misses, actions executed. A store keeps
+them in a directory with one file per column, fixed width and appended in
+batches, so events of a run are written without text logging and queried
+after it:
+
+    <store>/meta.json     Columns, switches, names of ids, number of rows
+    <store>/<column>.col  Values of a column, native byte order
+
+Each event has the time it was received, the switch, its type, context, and
+the signature, id and copy id of its packet, which trace a packet through a
+switch, and up to two fields depending on its type, e.g. `port` of
+`packet_in`, `table` and `entry` of `table_hit`. Ids of tables, actions and
+other objects are resolved to names by the bmv2 JSON of switches.
+
+The `events` subcommand queries a store written by `loadmn --events`. This
+module does not import Mininet.
+
+Typical usage example:
+
+    store = EventStore("/tmp/events")
+    for event in store.select(switch="s1", types=["table_hit"]):
+        print(event["table"], event["entry"])
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple, Union
+
+from p4ws.state import write_state
+
+# Version of the store format
+STORE_FORMAT = 1
+
+META_FILE = "meta.json"
+
+# Column -> typecode of array
+COLUMNS = {
+    "time": "d",
+    "switch": "H",
+    "type": "H",
+    "cxt": "i",
+    "sig": "Q",
+    "id": "Q",
+    "copy": "Q",
+    "arg0": "q",
+    "arg1": "q",
+}
+
+# Header of messages, `msg_hdr_t` of bmv2 event logger:
+# type, switch id, context id, packet signature, packet id, copy id
+MESSAGE_HEADER = struct.Struct("<iiiQQQ")
+
+# Type of message -> (name, struct of fields, names of fields)
+MESSAGE_TYPES: Dict[int, Tuple[str, struct.Struct, Tuple[str, ...]]] = {
+    0: ("packet_in", struct.Struct("<i"), ("port",)),
+    1: ("packet_out", struct.Struct("<i"), ("port",)),
+    2: ("parser_start", struct.Struct("<i"), ("parser",)),
+    3: ("parser_done", struct.Struct("<i"), ("parser",)),
+    4: ("parser_extract", struct.Struct("<i"), ("header",)),
+    5: ("deparser_start", struct.Struct("<i"), ("deparser",)),
+    6: ("deparser_done", struct.Struct("<i"), ("deparser",)),
+    7: ("deparser_emit", struct.Struct("<i"), ("header",)),
+    8: ("checksum_update", struct.Struct("<i"), ("checksum",)),
+    9: ("pipeline_start", struct.Struct("<i"), ("pipeline",)),
+    10: ("pipeline_done", struct.Struct("<i"), ("pipeline",)),
+    11: ("condition_eval", struct.Struct("<i?"), ("condition", "result")),
+    12: ("table_hit", struct.Struct("<ii"), ("table", "entry")),
+    13: ("table_miss", struct.Struct("<i"), ("table",)),
+    14: ("action_execute", struct.Struct("<i"), ("action",)),
+    999: ("config_change", struct.Struct("<"), ()),
+}
+
+TYPE_NAMES = dict((name, code) for code, (name, _, _) in MESSAGE_TYPES.items())
+
+# Field -> key of names, whose ids are resolved
+_NAMED_FIELDS = {
+    "parser": "parsers", "deparser": "deparsers", "header": "headers",
+    "checksum": "checksums", "pipeline": "pipelines", "condition": "conditionals",
+    "table": "tables", "action": "actions",
+}
+
+# Value of arguments not present
+NO_ARG = -1
+
+
+def decode_message(msg: bytes):
+    """Decode a nanolog message.
+
+    Parameters
+    ----------
+    msg : bytes
+        The message.
+
+    Returns
+    -------
+    row : tuple
+        Type, context id, signature, packet id, copy id and two fields,
+        `NO_ARG` for fields not present, as columns of the store from `type`.
+
+    Raises
+    ------
+    ValueError
+        The message is truncated.
+    """
+
+    try:
+        type_, _, cxt, sig, id_, copy = MESSAGE_HEADER.unpack_from(msg)
+        args = ()
+        if type_ in MESSAGE_TYPES:
+            args = MESSAGE_TYPES[type_][1].unpack_from(msg, MESSAGE_HEADER.size)
+    except struct.error as e:
+        raise ValueError(f"Truncated nanolog message: {e}")
+    args = tuple(int(a) for a in args) + (NO_ARG,) * (2 - len(args))
+    return (type_, cxt, sig, id_, copy) + args
+
+
+def load_names(p4_json: Union[str, None]):
+    """Load names of objects of a bmv2 JSON, by their ids.
+
+    Parameters
+    ----------
+    p4_json : str | None
+        Path to the bmv2 JSON, None for no names.
+
+    Returns
+    -------
+    names : dict
+        Key like `tables` -> id as str -> name, empty if the JSON cannot be read.
+    """
+
+    if p4_json is None:
+        return {}
+    try:
+        with open(p4_json) as f:
+            conf = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(conf, dict):
+        return {}
+
+    def named(objects):
+        return dict((str(o["id"]), o["name"]) for o in objects
+                    if isinstance(o, dict) and "id" in o and "name" in o)
+
+    names = {}
+    for key in ("parsers", "deparsers", "headers", "checksums", "actions", "pipelines"):
+        names[key] = named(conf.get(key, []))
+    names["tables"], names["conditionals"] = {}, {}
+    for pipeline in conf.get("pipelines", []):
+        if isinstance(pipeline, dict):
+            names["tables"].update(named(pipeline.get("tables", [])))
+            names["conditionals"].update(named(pipeline.get("conditionals", [])))
+    return names
+
+
+class EventWriter:
+    """Writer of a store, appending events in batches.
+
+    Not thread-safe, events of all switches should be appended by one thread.
+
+    Attributes
+    ----------
+    path : str
+        Path to the store.
+    switches : List[str]
+        Names of switches, indexed by column `switch`.
+    rows : int
+        Number of events written.
+    """
+
+    def __init__(self, path: str, switches: List[str],
+                 names: Union[Dict[str, dict], None] = None):
+        """Create a store.
+
+        Parameters
+        ----------
+        path : str
+            Path to the store, a directory without a store.
+        switches : List[str]
+            Names of switches.
+        names : Dict[str, dict] | None
+            Name of switch -> names of its objects, see `load_names`.
+
+        Raises
+        ------
+        FileExistsError
+            A store exists in `path`.
+        OSError
+            The store cannot be created.
+        """
+
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, META_FILE)):
+            raise FileExistsError(f"Event store exists: {path}")
+        self.path = path
+        self.switches = list(switches)
+        self.names = dict(names or {})
+        self.rows = 0
+        self._pending = dict((column, array(code)) for column, code in COLUMNS.items())
+        self._files = dict((column, open(os.path.join(path, f"{column}.col"), "wb"))
+                           for column in COLUMNS)
+        self._write_meta()
+
+    def append(self, switch: int, time: float, rows: Iterable[tuple]):
+        """Append events of a switch received at once.
+
+        Parameters
+        ----------
+        switch : int
+            Index of the switch.
+        time : float
+            Time the events were received, by `time.time`.
+        rows : Iterable[tuple]
+            Events, see `decode_message`.
+        """
+
+        pending = self._pending
+        for row in rows:
+            pending["time"].append(time)
+            pending["switch"].append(switch)
+            for column, value in zip(("type", "cxt", "sig", "id", "copy", "arg0", "arg1"), row):
+                pending[column].append(value)
+
+    def flush(self):
+        """Write events appended, and then the number of rows.
+
+        Returns
+        -------
+        count : int
+            Number of events written.
+        """
+
+        count = len(self._pending["time"])
+        if not count:
+            return 0
+        for column, values in self._pending.items():
+            values.tofile(self._files[column])
+            self._files[column].flush()
+            del values[:]
+        self.rows += count
+        self._write_meta()
+        return count
+
+    def close(self):
+        self.flush()
+        for f in self._files.values():
+            f.close()
+
+    def _write_meta(self):
+        write_state(os.path.join(self.path, META_FILE), {
+            "format": STORE_FORMAT,
+            "byteorder": sys.byteorder,
+            "columns": COLUMNS,
+            "types": dict((str(code), name) for code, (name, _, _) in MESSAGE_TYPES.items()),
+            "switches": self.switches,
+            "names": self.names,
+            "rows": self.rows
+        })
+
+
+class EventStore:
+    """Reader of a store.
+
+    Attributes
+    ----------
+    path : str
+        Path to the store.
+    switches : List[str]
+        Names of switches.
+    columns : Dict[str, array]
+        Column -> values, of all events in order of writing per switch.
+    """
+
+    def __init__(self, path: str):
+        """Load a store.
+
+        Raises
+        ------
+        OSError
+            The store cannot be read.
+        ValueError
+            The store is incorrect.
+        """
+
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        if meta.get("format") != STORE_FORMAT:
+            raise ValueError(f"Unknown format of event store: {meta.get('format')}")
+        self.path = path
+        self.switches: List[str] = meta["switches"]
+        self.names: Dict[str, dict] = meta["names"]
+        self.rows: int = meta["rows"]
+        self.columns: Dict[str, array] = {}
+        for column, code in meta["columns"].items():
+            values = array(code)
+            with open(os.path.join(path, f"{column}.col"), "rb") as f:
+                try:
+                    values.fromfile(f, self.rows)
+                except EOFError:
+                    raise ValueError(f"Column `{column}` of event store is truncated")
+            if meta["byteorder"] != sys.byteorder:
+                values.byteswap()
+            self.columns[column] = values
+
+    def __len__(self):
+        return self.rows
+
+    def event(self, index: int):
+        """Get an event as dict, with fields named by its type and ids resolved."""
+
+        c = self.columns
+        type_ = c["type"][index]
+        switch = self.switches[c["switch"][index]]
+        name, _, fields = MESSAGE_TYPES.get(type_, (str(type_), None, ()))
+        event = {
+            "time": c["time"][index],
+            "switch": switch,
+            "type": name,
+            "cxt": c["cxt"][index],
+            "sig": c["sig"][index],
+            "id": c["id"][index],
+            "copy": c["copy"][index],
+        }
+        names = self.names.get(switch, {})
+        for field, value in zip(fields, (c["arg0"][index], c["arg1"][index])):
+            if field == "result":
+                value = bool(value)
+            elif field in _NAMED_FIELDS:
+                value = names.get(_NAMED_FIELDS[field], {}).get(str(value), value)
+            event[field] = value
+        return event
+
+    def indices(self, switch: Union[str, None] = None,
+                types: Union[Iterable[str], None] = None,
+                packet: Union[int, None] = None):
+        """Get indices of events selected.
+
+        Parameters
+        ----------
+        switch : str | None
+            Name of the switch, None for all.
+        types : Iterable[str] | None
+            Names of types, None for all.
+        packet : int | None
+            Id of the packet, None for all.
+
+        Raises
+        ------
+        ValueError
+            Switch or type not exists.
+        """
+
+        checks = []
+        if switch is not None:
+            if switch not in self.switches:
+                raise ValueError(f"Switch not in event store: {switch}")
+            checks.append((self.columns["switch"], {self.switches.index(switch)}))
+        if types is not None:
+            codes = set()
+            for name in types:
+                if name not in TYPE_NAMES:
+                    raise ValueError(f"Unknown event type `{name}`, should be one of {', '.join(TYPE_NAMES)}")
+                codes.add(TYPE_NAMES[name])
+            checks.append((self.columns["type"], codes))
+        if packet is not None:
+            checks.append((self.columns["id"], {packet}))
+        return [i for i in range(self.rows) if all(column[i] in values for column, values in checks)]
+
+    def select(self, switch: Union[str, None] = None,
+               types: Union[Iterable[str], None] = None,
+               packet: Union[int, None] = None):
+        """Get events selected, see `indices` and `event`."""
+
+        return [self.event(i) for i in self.indices(switch, types, packet)]
+
+    def count(self):
+        """Count events by switch and type.
+
+        Returns
+        -------
+        counts : dict
+            Name of switch -> name of type -> number of events.
+        """
+
+        counts: Dict[str, Dict[str, int]] = {}
+        for (switch, type_), n in sorted(Counter(zip(self.columns["switch"], self.columns["type"])).items()):
+            name = MESSAGE_TYPES[type_][0] if type_ in MESSAGE_TYPES else str(type_)
+            counts.setdefault(self.switches[switch], {})[name] = n
+        return counts
+
+
+def make_events_subparser(parser: argparse._SubParsersAction):
+    """Make subparser of events.
+
+    Parameters
+    ----------
+    parser : argparse._SubParsersAction
+        An ArgumentParser.
+
+    Returns
+    -------
+    arg_parser : argparse.ArgumentParser
+    """
+
+    subparser = parser.add_parser(
+        "events", help="Query nanolog events of switches written by loadmn --events.")
+    subparser.add_argument("store", type=str, help="event store", metavar="STORE")
+    subparser.add_argument("-s", "--switch", type=str, required=False,
+                           help="name of switch (default: all)", metavar="SWITCH")
+    subparser.add_argument("-t", "--type", dest="types", action="append", required=False,
+                           choices=list(TYPE_NAMES), help="type of events, can be repeated (default: all)",
+                           metavar="TYPE")
+    subparser.add_argument("-p", "--packet", type=int, required=False,
+                           help="id of packet, to trace it (default: all)", metavar="ID")
+    subparser.add_argument("-c", "--count", action="store_true", required=False,
+                           help="output numbers of events by switch and type")
+    subparser.add_argument("--json", action="store_true", required=False,
+                           help="output events as json lines")
+    return subparser
+
+
+def main_events(args: argparse.Namespace):
+    """Main of events executable."""
+
+    try:
+        store = EventStore(args.store)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Cannot read event store: {e}", file=sys.stderr)
+        return 1
+
+    if args.count:
+        counts = store.count()
+        if args.json:
+            json.dump(counts, sys.stdout)
+            sys.stdout.write("\n")
+        else:
+            for switch, types in counts.items():
+                for name, n in types.items():
+                    print(f"{switch} {name} {n}")
+        return 0
+
+    try:
+        indices = store.indices(args.switch, args.types, args.packet)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    for i in indices:
+        event = store.event(i)
+        if args.json:
+            sys.stdout.write(json.dumps(event) + "\n")
+            continue
+        fields = " ".join(f"{k}={v}" for k, v in list(event.items())[7:])
+        print(f"{event['time']:.6f} {event['switch']} {event['type']} "
+              f"cxt={event['cxt']} sig={event['sig']:#x} id={event['id']} copy={event['copy']}"
+              f"{' ' + fields if fields else ''}")
+    return 0
@@ -0,0 +1,224 @@
+"""Run commands in nodes of a running network.
+
+Nodes are found in the state file written by `loadmn --state-file`, and
+namespaces of a node are entered by setns(2), in this process which then execs
+the command, or in forked children for batches, so a command costs one
+process, instead of `sudo`, `env`, `mnexec` and a shell.
+"""
+
+import argparse
+import ctypes
+import json
+import os
+import shlex
+import subprocess
+import sys
+
+from p4ws.state import STATE_ENV, get_node_pid, read_state
+
+# Namespaces entered, in order, like `mnexec -a`
+NAMESPACES = ("net", "mnt")
+
+_libc = None
+
+
+def setns(fd: int, nstype: int = 0):
+    """Reassociate the calling thread with a namespace, see setns(2)."""
+
+    global _libc
+    if hasattr(os, "setns"):
+        return os.setns(fd, nstype)
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+    if _libc.setns(fd, nstype) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+class NodeNamespaces:
+    """Namespaces of a node, opened once and entered by each command.
+
+    Namespaces shared with the calling process, e.g. of switches not in a
+    namespace, are not entered.
+
+    Attributes
+    ----------
+    pid : int
+        PID of the node.
+    fds : list
+        Descriptors of namespaces to enter.
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.fds = []
+        try:
+            for ns in NAMESPACES:
+                path = f"/proc/{pid}/ns/{ns}"
+                if os.stat(path).st_ino == os.stat(f"/proc/self/ns/{ns}").st_ino:
+                    continue
+                self.fds.append(os.open(path, os.O_RDONLY | os.O_CLOEXEC))
+        except BaseException:
+            self.close()
+            raise
+
+    def enter(self):
+        """Enter namespaces, called in the child before exec."""
+        for fd in self.fds:
+            setns(fd)
+
+    def run(self, args: list, **kwargs):
+        """Run a command in namespaces of the node.
+
+        Parameters
+        ----------
+        args : list
+            Command and its arguments.
+        **kwargs
+            Keyword arguments of `subprocess.run`.
+
+        Returns
+        -------
+        result : subprocess.CompletedProcess
+        """
+
+        return subprocess.run(args, preexec_fn=self.enter if self.fds else None, **kwargs)
+
+    def close(self):
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = []
+
+
+class NodeNamespacesCache:
+    """Namespaces of nodes in a state file, opened on first use."""
+
+    def __init__(self, state: dict):
+        self.state = state
+        self.namespaces = {}
+
+    def get(self, name: str):
+        """Get namespaces of a node.
+
+        Raises
+        ------
+        KeyError
+            Node not found.
+        ProcessLookupError
+            Process of the node exited.
+        """
+
+        if name not in self.namespaces:
+            self.namespaces[name] = NodeNamespaces(get_node_pid(self.state, name))
+        return self.namespaces[name]
+
+    def close(self):
+        for ns in self.namespaces.values():
+            ns.close()
+        self.namespaces.clear()
+
+
+def make_exec_subparser(parser: argparse._SubParsersAction):
+    """Make subparser of exec.
+
+    Parameters
+    ----------
+    parser : argparse._SubParsersAction
+        An ArgumentParser.
+
+    Returns
+    -------
+    arg_parser : argparse.ArgumentParser
+    """
+
+    subparser = parser.add_parser(
+        "exec", help="Run a command in a node of a running network.")
+    subparser.add_argument("-s", "--state-file", type=str, required=False,
+                           default=os.environ.get(STATE_ENV),
+                           help=f"state file written by loadmn --state-file (default: ${STATE_ENV})",
+                           metavar="STATE")
+    subparser.add_argument("-b", "--batch", type=argparse.FileType(), required=False,
+                           help="run commands read from FILE, one `NODE COMMAND` per line, and output results as json lines",
+                           metavar="FILE")
+    subparser.add_argument("node", type=str, nargs="?",
+                           help="name of node", metavar="NODE")
+    subparser.add_argument("command", nargs=argparse.REMAINDER,
+                           help="command to run, default to $SHELL", metavar="COMMAND")
+    return subparser
+
+
+def run_batch(cache: NodeNamespacesCache, lines, out):
+    """Run commands of a batch.
+
+    Each line is `NODE COMMAND`, split by shell rules; empty lines and lines
+    starting with `#` are skipped. Use `sh -c '...'` for pipes or redirects.
+    A json object with node, command, returncode, stdout and stderr is
+    written for each command, returncode is None if it cannot run.
+
+    Returns
+    -------
+    failed : int
+        Number of commands not run or exited with non-zero code.
+    """
+
+    failed = 0
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        node, _, command = line.partition(" ")
+        result = {"node": node, "command": command.strip()}
+        try:
+            completed = cache.get(node).run(
+                shlex.split(command), stdin=subprocess.DEVNULL,
+                capture_output=True, text=True, errors="replace")
+            result.update(returncode=completed.returncode,
+                          stdout=completed.stdout, stderr=completed.stderr)
+        except KeyError:
+            result.update(returncode=None, stdout="", stderr=f"Node {node} not found.")
+        except (OSError, ValueError, subprocess.SubprocessError) as e:
+            result.update(returncode=None, stdout="", stderr=str(e))
+        if result["returncode"] != 0:
+            failed += 1
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+    return failed
+
+
+def main_exec(args: argparse.Namespace):
+    """Main of exec executable."""
+
+    if not args.state_file:
+        print(f"No state file, use --state-file or ${STATE_ENV}.", file=sys.stderr)
+        return 1
+    if os.geteuid() != 0:
+        print("exec must run as root.", file=sys.stderr)
+        return 1
+    try:
+        state = read_state(args.state_file)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read state: {e}", file=sys.stderr)
+        return 1
+
+    cache = NodeNamespacesCache(state)
+    try:
+        if args.batch:
+            return 1 if run_batch(cache, args.batch, sys.stdout) else 0
+
+        if args.node is None:
+            print("Available nodes: " + ", ".join(state["nodes"]) + ".", file=sys.stderr)
+            return 1
+        command = args.command[1:] if args.command[:1] == ["--"] else args.command
+        command = command or [os.environ.get("SHELL", "bash")]
+        try:
+            # Replace this process, so signals and tty go to the command
+            cache.get(args.node).enter()
+            os.execvp(command[0], command)
+        except KeyError:
+            print(f"Node {args.node} not found.", file=sys.stderr)
+            return 1
+        except OSError as e:
+            print(f"Cannot run in {args.node}: {e}", file=sys.stderr)
+            return 127
+    finally:
+        cache.close()
@@ -0,0 +1,360 @@
+"""Run a command on many nodes at once.
+
+A command is started in every selected node as a separate process, at most
+`MAX_RUNNING` at a time, and outputs of all processes are read by one
+selector loop, so no node waits for another. Nodes are selected by name
+patterns and classes.
+
+Processes are spawned by `node.popen` of Mininet nodes, or, for the `fanout`
+subcommand, in namespaces entered by setns from the state file written by
+`loadmn --state-file`. This module does not import Mininet.
+
+Typical usage example:
+
+    result = fanout(net, "iperf -s -D", classes=["host"])
+    for name in result.failed():
+        print(name, result[name].stderr)
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import selectors
+import sys
+import time
+from subprocess import DEVNULL, PIPE, Popen, SubprocessError
+from typing import Callable, Dict, Iterable, List, Union
+
+from p4ws.exec import NodeNamespaces
+from p4ws.state import STATE_ENV, get_node_pid, read_state
+from p4ws.utils import get_class_names
+
+# Max number of processes running at the same time
+MAX_RUNNING = 256
+
+# Bytes to read at a time
+_READ_SIZE = 1 << 16
+
+
+class NodeResult:
+    """Result of a command on a node.
+
+    Attributes
+    ----------
+    name : str
+        Name of the node.
+    returncode : int | None
+        Exit code, None if the command was not started or timed out.
+    stdout : str
+    stderr : str
+    start : float | None
+        Time the command started, by `time.monotonic`.
+    elapsed : float | None
+        Seconds the command took.
+    error : str | None
+        Why the command was not started or finished, e.g. `timeout`.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.returncode = None
+        self.stdout = ""
+        self.stderr = ""
+        self.start = None
+        self.elapsed = None
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+    def to_json(self):
+        return {
+            "returncode": self.returncode,
+            "stdout": self.stdout,
+            "stderr": self.stderr,
+            "elapsed": self.elapsed,
+            "error": self.error
+        }
+
+
+class FanoutResult:
+    """Results of a command on nodes, indexed by name of node.
+
+    Attributes
+    ----------
+    results : dict
+        Name of node -> NodeResult, in order of selection.
+    elapsed : float
+        Seconds all commands took.
+    """
+
+    def __init__(self, results: Dict[str, NodeResult], elapsed: float):
+        self.results = results
+        self.elapsed = elapsed
+
+    def __getitem__(self, name: str):
+        return self.results[name]
+
+    def __iter__(self):
+        return iter(self.results.values())
+
+    def __len__(self):
+        return len(self.results)
+
+    @property
+    def ok(self):
+        return all(r.ok for r in self.results.values())
+
+    def failed(self):
+        """Get names of nodes whose command failed."""
+        return [name for name, r in self.results.items() if not r.ok]
+
+    def to_json(self):
+        return {
+            "elapsed": self.elapsed,
+            "nodes": dict((name, r.to_json()) for name, r in self.results.items())
+        }
+
+
+def match_node(name: str, class_names: Iterable[str],
+               patterns: Union[List[str], None] = None,
+               classes: Union[List[str], None] = None):
+    """Check whether a node is selected.
+
+    Parameters
+    ----------
+    name : str
+        Name of the node.
+    class_names : Iterable[str]
+        Names of classes of the node, see `get_class_names`, and its kind,
+        `host` or `switch`.
+    patterns : List[str] | None
+        Shell-style patterns of names, e.g. `h*`, any of them matches, None for all.
+    classes : List[str] | None
+        Names of classes, any of them matches, None for all.
+    """
+
+    if patterns and not any(fnmatch.fnmatchcase(name, p) for p in patterns):
+        return False
+    if classes and not set(classes).intersection(class_names):
+        return False
+    return True
+
+
+def run_fanout(spawners: Dict[str, Callable[..., Popen]],
+               timeout: Union[float, None] = None,
+               max_running: int = MAX_RUNNING):
+    """Run processes and collect their outputs.
+
+    Parameters
+    ----------
+    spawners : Dict[str, Callable[..., Popen]]
+        Name of node -> function starting the command, called with keyword
+        arguments of `Popen` for stdin, stdout and stderr.
+    timeout : float | None
+        Seconds to wait for all commands, remaining ones are killed, None to
+        wait forever.
+    max_running : int
+        Max number of processes running at the same time.
+
+    Returns
+    -------
+    result : FanoutResult
+    """
+
+    start = time.monotonic()
+    deadline = start + timeout if timeout is not None else None
+    results = dict((name, NodeResult(name)) for name in spawners)
+    pending = list(spawners.items())
+    pending.reverse()
+    # Popen -> [result, stdout chunks, stderr chunks, open pipes]
+    running = {}
+    selector = selectors.DefaultSelector()
+
+    def finish(proc: Popen, error: Union[str, None] = None):
+        result, out, err, pipes = running.pop(proc)
+        for pipe in pipes:
+            selector.unregister(pipe)
+            pipe.close()
+        if error is None:
+            result.returncode = proc.wait()
+        else:
+            proc.kill()
+            proc.wait()
+            result.error = error
+        result.elapsed = time.monotonic() - result.start
+        result.stdout = b"".join(out).decode(errors="replace")
+        result.stderr = b"".join(err).decode(errors="replace")
+
+    try:
+        while pending or running:
+            while pending and len(running) < max_running:
+                name, spawn = pending.pop()
+                result = results[name]
+                result.start = time.monotonic()
+                try:
+                    proc = spawn(stdin=DEVNULL, stdout=PIPE, stderr=PIPE)
+                except (OSError, ValueError, SubprocessError) as e:
+                    result.error = str(e)
+                    continue
+                running[proc] = [result, [], [], {proc.stdout, proc.stderr}]
+                selector.register(proc.stdout, selectors.EVENT_READ, (proc, 1))
+                selector.register(proc.stderr, selectors.EVENT_READ, (proc, 2))
+
+            if not running:
+                continue
+            wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+            for key, _ in selector.select(wait):
+                proc, index = key.data
+                entry = running[proc]
+                chunk = os.read(key.fd, _READ_SIZE)
+                if chunk:
+                    entry[index].append(chunk)
+                    continue
+                selector.unregister(key.fileobj)
+                key.fileobj.close()
+                entry[3].remove(key.fileobj)
+                if not entry[3]:
+                    finish(proc)
+
+            if deadline is not None and time.monotonic() >= deadline:
+                for proc in list(running):
+                    finish(proc, "timeout")
+                for name, _ in pending:
+                    results[name].error = "timeout"
+                pending.clear()
+    finally:
+        for proc in list(running):
+            finish(proc, "interrupted")
+        selector.close()
+
+    return FanoutResult(results, time.monotonic() - start)
+
+
+def fanout(net, cmd: Union[str, List[str]],
+           patterns: Union[List[str], None] = None,
+           classes: Union[List[str], None] = None,
+           timeout: Union[float, None] = None,
+           max_running: int = MAX_RUNNING):
+    """Run a command on nodes of a network concurrently.
+
+    Parameters
+    ----------
+    net : mininet.net.Mininet
+        The network.
+    cmd : str | List[str]
+        A shell command, or a command and its arguments.
+    patterns : List[str] | None
+        Shell-style patterns of names of nodes, None for all.
+    classes : List[str] | None
+        Names of classes of nodes, short or full, or `host` or `switch`,
+        None for all.
+    timeout : float | None
+        Seconds to wait, None to wait forever.
+    max_running : int
+        Max number of processes running at the same time.
+
+    Returns
+    -------
+    result : FanoutResult
+    """
+
+    spawners = {}
+    for kind, nodes in (("host", net.hosts), ("switch", net.switches)):
+        for node in nodes:
+            if match_node(node.name, get_class_names(node) + [kind], patterns, classes):
+                # Not `shell=True`, which needs $SHELL
+                spawners[node.name] = lambda node=node, **kwargs: node.popen(
+                    ["sh", "-c", cmd] if isinstance(cmd, str) else cmd, **kwargs)
+    return run_fanout(spawners, timeout, max_running)
+
+
+def make_fanout_subparser(parser: argparse._SubParsersAction):
+    """Make subparser of fanout.
+
+    Parameters
+    ----------
+    parser : argparse._SubParsersAction
+        An ArgumentParser.
+
+    Returns
+    -------
+    arg_parser : argparse.ArgumentParser
+    """
+
+    subparser = parser.add_parser(
+        "fanout", help="Run a command on many nodes of a running network at once.")
+    subparser.add_argument("-s", "--state-file", type=str, required=False,
+                           default=os.environ.get(STATE_ENV),
+                           help=f"state file written by loadmn --state-file (default: ${STATE_ENV})",
+                           metavar="STATE")
+    subparser.add_argument("-n", "--node", action="append", required=False,
+                           help="shell-style pattern of names of nodes, can be repeated (default: all)",
+                           metavar="PATTERN")
+    subparser.add_argument("-c", "--class", dest="classes", action="append", required=False,
+                           help="class of nodes, short or full name, or 'host' or 'switch', can be repeated",
+                           metavar="CLASS")
+    subparser.add_argument("-t", "--timeout", type=float, required=False,
+                           help="seconds to wait, remaining commands are killed", metavar="SECONDS")
+    subparser.add_argument("-j", "--max-running", type=int, default=MAX_RUNNING, required=False,
+                           help="max number of commands running at the same time (default: %(default)s)",
+                           metavar="N")
+    subparser.add_argument("--json", action="store_true", required=False,
+                           help="output results as json")
+    subparser.add_argument("command", nargs=argparse.REMAINDER,
+                           help="command to run", metavar="COMMAND")
+    return subparser
+
+
+def main_fanout(args: argparse.Namespace):
+    """Main of fanout executable."""
+
+    if args.command[:1] == ["--"]:
+        args.command = args.command[1:]
+    if not args.command:
+        print("No command.", file=sys.stderr)
+        return 1
+    if not args.state_file:
+        print(f"No state file, use --state-file or ${STATE_ENV}.", file=sys.stderr)
+        return 1
+    if os.geteuid() != 0:
+        print("fanout must run as root.", file=sys.stderr)
+        return 1
+    try:
+        state = read_state(args.state_file)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read state: {e}", file=sys.stderr)
+        return 1
+
+    def make_spawner(name: str):
+        def spawn(**kwargs):
+            # Namespaces are entered by the child, and closed once it is started
+            ns = NodeNamespaces(get_node_pid(state, name))
+            try:
+                return Popen(args.command, preexec_fn=ns.enter if ns.fds else None, **kwargs)
+            finally:
+                ns.close()
+        return spawn
+
+    spawners = {}
+    for name, node in state["nodes"].items():
+        if match_node(name, node.get("classes", []) + [node["kind"]], args.node, args.classes):
+            spawners[name] = make_spawner(name)
+    result = run_fanout(spawners, args.timeout, args.max_running)
+
+    if args.json:
+        json.dump(result.to_json(), sys.stdout)
+        sys.stdout.write("\n")
+    else:
+        for r in result:
+            status = r.error if r.error is not None else f"exit {r.returncode}"
+            elapsed = f"{r.elapsed:.3f}s" if r.elapsed is not None else "-"
+            print(f"*** {r.name}: {status}, {elapsed}")
+            if r.stdout:
+                sys.stdout.write(r.stdout if r.stdout.endswith("\n") else r.stdout + "\n")
+            if r.stderr:
+                sys.stderr.write(r.stderr if r.stderr.endswith("\n") else r.stderr + "\n")
+        print(f"*** {len(result) - len(result.failed())}/{len(result)} succeeded in {result.elapsed:.3f}s")
+    return 0 if result.ok else 1
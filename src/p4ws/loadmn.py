@@ -1,10 +1,16 @@
 """Run a Mininet instance."""
 
 import argparse
+import io
 import json
 import os
+import shutil
+import signal
 import sys
+import tempfile
+import threading
 from logging import _nameToLevel, basicConfig
+from typing import Callable, Dict, List, TextIO, Union
 
 from mininet.cli import CLI
 from mininet.link import Intf, Link
@@ -12,9 +18,33 @@ from mininet.log import LEVELS, OUTPUT, info, setLogLevel
 from mininet.moduledeps import pathCheck
 from mininet.net import Mininet
 from mininet.node import Controller, Host, Switch
-
-from .mnhlp import JsonTopo, ParserError
-from .utils import get_type, get_type_name
+from mininet.topo import Topo
+
+from .mnhlp import (BatchLink, ParserError, SimpleSwitch, TofinoModel,
+                    flush_links)
+from .mnhlp.allocator import (DEFAULT_ALLOC_DIR, ResourceAllocator,
+                              get_node_ports)
+from .mnhlp.batchconf import (apply_node_scripts, compile_host_config,
+                              compile_switch_config)
+from .mnhlp.cache import (DEFAULT_CACHE_DIR, find_artifacts, load_cache,
+                          make_cache_key, store_cache)
+from .mnhlp.cgroup import CgroupManager
+from .mnhlp.generators import parse_generator_uri
+from .mnhlp.linkprofile import LinkShaper
+from .mnhlp.logdrain import (DEFAULT_BUFFER_SIZE, DEFAULT_SPILL_SIZE, LogDrain,
+                             get_log_drain, set_log_drain)
+from .mnhlp.nanolog import NanologSubscriber
+from .mnhlp.nodes.TofinoModel import DRU_SIM_PORTS
+from .mnhlp.placement import apply_placement, make_topo_placement
+from .mnhlp.plan import DEFAULT_IP_BASE, get_default_type, make_plan
+from .mnhlp.readiness import get_startup_latencies, latency_histogram
+from .mnhlp.rpc import RpcServer
+from .mnhlp.shard import ShardedNet
+from .mnhlp.staticarp import STATIC_ARP_SCOPES, populate_static_arp
+from .mnhlp.supervisor import Supervisor
+from .mnhlp.teardown import stop_net
+from .state import get_run, make_state, write_state
+from .utils import get_type_name
 
 
 def make_loadmn_subparser(parser: argparse._SubParsersAction):
@@ -29,7 +59,20 @@ def make_loadmn_subparser(parser: argparse._SubParsersAction):
 
     loadmn_parser = parser.add_parser("loadmn", help="Run a Mininet instance.")
     loadmn_parser.add_argument(
-        "--topo-file", type=str, required=True, help="A file contains topology.")
+        "--topo-file", type=str, required=True,
+        help="A file contains topology, or a generator like `gen:fat-tree?k=4`.")
+    loadmn_parser.add_argument("--stream-topo",
+                               action="store_true",
+                               required=False,
+                               help="Read the topology file item by item, for very large files.")
+    loadmn_parser.add_argument("--cache",
+                               metavar="DIR",
+                               nargs="?",
+                               const=DEFAULT_CACHE_DIR,
+                               default=None,
+                               type=str,
+                               required=False,
+                               help=f"Reuse topology parsed by previous runs if files are unchanged, cached in DIR (default: {DEFAULT_CACHE_DIR}).")
     loadmn_parser.add_argument("--net-file",
                                type=argparse.FileType(),
                                required=False,
@@ -38,10 +81,18 @@ def make_loadmn_subparser(parser: argparse._SubParsersAction):
                                type=argparse.FileType("w"),
                                required=False,
                                help="A json file to output.")
+    loadmn_parser.add_argument("--summary-file",
+                               type=argparse.FileType("w"),
+                               required=False,
+                               help="A json file to write CPU and memory usage of nodes in `cgroups`, and restarts of switches by `supervisor` at stop.")
     loadmn_parser.add_argument("--shell-file",
                                type=argparse.FileType("w"),
                                required=False,
                                help="A file to write terminal entry.")
+    loadmn_parser.add_argument("--state-file",
+                               type=str,
+                               required=False,
+                               help="A json file to write PIDs of nodes, used by `p4ws exec`, removed at stop.")
     loadmn_parser.add_argument("--mnexec",
                                default="mnexec",
                                type=str,
@@ -53,105 +104,120 @@ def make_loadmn_subparser(parser: argparse._SubParsersAction):
                                choices=LEVELS.keys(),
                                required=False,
                                help="Output log level.")
+    loadmn_parser.add_argument("--startup-timeout",
+                               default=None,
+                               type=float,
+                               required=False,
+                               help="Seconds to wait for all switches to start, default to wait forever.")
+    loadmn_parser.add_argument("--daemon",
+                               metavar="SOCKET",
+                               default=None,
+                               type=str,
+                               required=False,
+                               help="Serve JSON-RPC on a Unix socket instead of starting CLI.")
+    loadmn_parser.add_argument("--shards",
+                               metavar="N",
+                               default=1,
+                               type=int,
+                               required=False,
+                               help="Run the network by N worker processes, each owns a part of nodes, until SIGINT or SIGTERM instead of starting CLI.")
+    loadmn_parser.add_argument("--allocate",
+                               metavar="DIR",
+                               nargs="?",
+                               const=DEFAULT_ALLOC_DIR,
+                               default=None,
+                               type=str,
+                               required=False,
+                               help=f"Reserve switch ports not given and a prefix of BatchLink interfaces, not used by other networks started with this option, leased in DIR (default: {DEFAULT_ALLOC_DIR}).")
+    loadmn_parser.add_argument("--log-buffer",
+                               metavar="MB",
+                               default=DEFAULT_BUFFER_SIZE / (1 << 20),
+                               type=float,
+                               required=False,
+                               help=f"Megabytes kept in memory of stdout and stderr of each switch piped (default: {DEFAULT_BUFFER_SIZE / (1 << 20):g}).")
+    loadmn_parser.add_argument("--log-spill",
+                               metavar="DIR",
+                               default=None,
+                               type=str,
+                               required=False,
+                               help="Also write stdout and stderr of switches piped to DIR, rotated by --log-spill-size and compressed.")
+    loadmn_parser.add_argument("--log-spill-size",
+                               metavar="MB",
+                               default=DEFAULT_SPILL_SIZE / (1 << 20),
+                               type=float,
+                               required=False,
+                               help=f"Megabytes of a spill file before rotated (default: {DEFAULT_SPILL_SIZE / (1 << 20):g}).")
+    loadmn_parser.add_argument("--events",
+                               metavar="DIR",
+                               default=None,
+                               type=str,
+                               required=False,
+                               help="Subscribe nanolog events of SimpleSwitch switches, and write them to an event store DIR, queried by `p4ws events`. Requires nnpy.")
+    loadmn_parser.add_argument("--plan",
+                               action="store_true",
+                               required=False,
+                               help="Only check files and output the plan of network to --out-file or stdout, root is not required.")
     return loadmn_parser
 
 
-def config_intf(intf: Intf, conf):
-    """Config an interface.
+def make_net_output(net: Mininet):
+    """Make output of a running network.
 
     Args:
-        intf: A mininet.link.Intf to configured.
-        conf: The configuration.
-    """
-
-    if isinstance(conf, list):
-        # [("10.0.0.1", 16), ...]
-        if (len(conf) > 0):
-            intf.setIP(*conf.pop())
-        # [("10.0.0.1", 16), "aa:bb:cc:dd:ee:ff"]
-        if (len(conf) > 0):
-            intf.setMAC(conf.pop())
-        if conf:
-            raise ParserError(f"Unsupported `Intf`: {conf}")
-    elif isinstance(conf, dict):
-        # { "ip" : ["...", 16], "name" : "...", "mac" : "..." }
-        if "ip" in conf:
-            intf.setIP(*conf.pop("ip"))
-        if "mac" in conf:
-            intf.setMAC(conf.pop("mac"))
-        if "name" in conf:
-            intf.rename(conf.pop("name"))
-        if conf:
-            raise ParserError(f"Unsupported `Intf`: {conf}")
-    else:
-        raise ParserError(f"Unsupported `Intf`: {conf}")
-
-
-def main_loadmn(args: argparse.Namespace):
-    """Main of loadmn executable."""
-
-    # Set logging for mininet
-    basicConfig(level=_nameToLevel[args.log_level.upper(
-    )] if args.log_level != "output" else OUTPUT)
-    setLogLevel(args.log_level)
-
-    # Load topology
-    info("*** Loading topology\n")
-    topo_ext = os.path.splitext(args.topo_file)[1]
-    if topo_ext == ".json":
-        topo_file = open(args.topo_file, "r")
-        topo = JsonTopo(topo_file)
-    else:
-        print(f"Unknwon type of topology file: {topo_ext}", file=sys.stderr)
-        exit(1)
+        net: The network.
 
-    # Load network
-    info("*** Loading network\n")
-    try:
-        if (args.net_file):
-            net_config = json.load(args.net_file)
-        else:
-            net_config = {}
-    except Exception as e:
-        print(f"Cannot load network file: {e}", file=sys.stderr)
-        exit(1)
+    Returns:
+        Interfaces and CPUs of hosts and switches, TCP ports and startup
+        latencies of switches.
+    """
 
-    # Default type
-    def get_default_type(spec, name: str, base_type: type):
-        if spec is not None:
-            if not isinstance(spec, str):
-                raise ParserError(
-                    f"`{name}-type` should be str, not {get_type_name(spec)}")
-            t = get_type(spec)
-            assert t is not None
-        else:
-            t = base_type
-        if not issubclass(t, base_type):
-            raise ParserError(
-                f"`{name}-type` should be derived of {get_type_name(base_type)}")
-        return t
+    startup_latencies = get_startup_latencies(net.switches)
+    return {
+        "hosts":
+        dict((host.name, {
+            "intfs":
+            dict((port, {
+                "name": intf.name,
+                "ip": [intf.ip, intf.prefixLen],
+                "mac": intf.mac
+            }) for port, intf in host.intfs.items()),
+            "cpus": getattr(host, "cpus", None)
+        }) for host in net.hosts),
+        "switches":
+        dict((switch.name, {
+            "intfs":
+            dict((port, {
+                "name": intf.name,
+                "ip": [intf.ip, intf.prefixLen],
+                "mac": intf.mac
+            }) for port, intf in switch.intfs.items()),
+            "ports": get_node_ports(switch),
+            "cpus": getattr(switch, "cpus", None),
+            "startup-latency": startup_latencies.get(switch.name)
+        }) for switch in net.switches),
+        "startup-latency-histogram": [
+            [bound, count] for bound, count in latency_histogram(startup_latencies.values())]
+    }
+
+
+def configure_nodes(net: Mininet, net_config: dict, own_only: bool = False):
+    """Configure hosts and switches by the net file.
+
+    Each node is configured by one `ip -batch` script, and nodes are
+    configured in parallel.
 
-    host_type = get_default_type(net_config.get("host-type"), "host", Host)
-    switch_type = get_default_type(
-        net_config.get("switch-type"), "switch", Switch)
-    controller_type = get_default_type(net_config.get(
-        "controller-type"), "controller", Controller) if ("controller-type" not in net_config or net_config["controller-type"] is not None) else None
-    link_type = get_default_type(net_config.get("link-type"), "link", Link)
-    intf_type = get_default_type(net_config.get("intf-type"), "intf", Intf)
+    Args:
+        net: The network.
+        net_config: Content of the net file.
+        own_only: Skip nodes not in the network, e.g. of other shards.
 
-    net = Mininet(topo=topo,
-                  switch=switch_type,
-                  host=host_type,
-                  controller=controller_type,
-                  link=link_type,
-                  intf=intf_type,
-                  **net_config.get("net-config", {}))
+    Raises:
+        ParserError: Format of the net file is incorrect.
+        RuntimeError: Some commands failed.
+    """
 
-    # Start network
-    info("Starting network\n")
-    net.start()
+    scripts = []
 
-    # Init config
     # Init hosts
     info("*** Configuring hosts\n")
     if "hosts" in net_config:
@@ -160,98 +226,12 @@ def main_loadmn(args: argparse.Namespace):
 
         for host_name, config in net_config["hosts"].items():
             assert isinstance(host_name, str), "Host name should be str"
-            if not isinstance(config, dict):
-                raise ParserError(
-                    f"`Host` should be object, not {get_type_name(config)}")
+            if own_only and host_name not in net:
+                continue
 
             h = net.get(host_name)
             assert isinstance(h, Host)
-
-            # Intfs
-            if "intfs" in config:
-                if isinstance(config["intfs"], list):
-                    # [("10.0.0.1", 16), ...]
-                    intf = h.defaultIntf()
-                    if intf is None:
-                        raise ValueError(
-                            f"No default interface in {host_name}")
-                    config_intf(intf, config["intfs"])
-                elif isinstance(config["intfs"], dict):
-                    # { "0" : ?, "1" : ? }
-                    for port_, c in config["intfs"].items():
-                        assert isinstance(port_, str)
-                        try:
-                            port = int(port_)
-                        except ValueError:
-                            raise ParserError(
-                                f"Port number should be str of int, not {port_}")
-
-                        if port not in h.intfs:
-                            raise RuntimeError(
-                                f"Port not found: {host_name}.{port}")
-                        config_intf(h.intfs[port], c)
-                else:
-                    raise ParserError(
-                        f"Unsupported `intfs` type: {get_type_name(config['intfs'])}")
-
-            # Static ARPs
-            if "arps" in config:
-                if isinstance(config["arps"], list):
-                    # [["10.0.0.1", "aa:bb:cc:dd:ee:ff"], [...], ...]
-                    for item in config["arps"]:
-                        if not isinstance(item, list) or len(item) == 2:
-                            raise ParserError(
-                                f"`arp` should be a pair of IP address and MAC address, not {item}")
-                        ip, mac = item
-                        h.setARP(ip, mac)
-                elif isinstance(config["arps"], dict):
-                    # { "10.0.0.1" : "aa:bb:cc:dd:ee:ff", ...}
-                    for ip, mac in config["arps"].items():
-                        h.setARP(ip, mac)
-                else:
-                    raise ParserError(
-                        f"Unsupported `arps` type: {get_type_name(config['arps'])}")
-
-            # Default route
-            # 1 | "default"
-            if "default-route" in config:
-                if config["default-route"] == "default":
-                    h.setDefaultRoute(h.defaultIntf())
-                elif config["default-route"] in h.intfs:
-                    h.setDefaultRoute(h.intfs[config["default-route"]])
-                elif config["default-route"] in h.nameToIntf:
-                    h.setDefaultRoute(h.nameToIntf[config["default-route"]])
-                else:
-                    raise ParserError(
-                        f"Unknown `default-route`: {config['default-route']}")
-
-            # Static Route
-            if "routes" in config:
-                if isinstance(config["routes"], list):
-                    # [["10.0.0.1", 1], [...], ...]
-                    for route in config["routes"]:
-                        if not isinstance(route, list) or len(route) != 2 or not isinstance(route[0], str) or not isinstance(route[1], (int, str)):
-                            raise ParserError(
-                                f"`Host::Route` should be pair of str and int/str, not {route}")
-                        ip, port = route
-                        if isinstance(port, int):
-                            h.setHostRoute(ip, h.intfs[port].name)
-                        else:
-                            h.setHostRoute(ip, port)
-                elif isinstance(config["routes"], dict):
-                    # { "10.0.0.1" : 1, ...}
-                    for ip, port in config["routes"].items():
-                        assert isinstance(ip, str), "IP address should be str"
-                        if not isinstance(port, (int, str)):
-                            raise ParserError(
-                                f"`Host::Route::intf` should be int/str, not {get_type_name(port)}")
-                        if isinstance(port, int):
-                            h.setHostRoute(ip, h.intfs[port].name)
-                        else:
-                            h.setHostRoute(ip, port)
-                else:
-                    raise ParserError(
-                        f"Unknown `routes`: {config['routes']}")
+            scripts.append(compile_host_config(h, config))
 
     # Init switches
     info("*** Configuring switches\n")
@@ -262,112 +242,543 @@ def main_loadmn(args: argparse.Namespace):
 
         for switch_name, config in net_config["switches"].items():
             assert isinstance(switch_name, str), "Switch name should be str"
-            if not isinstance(config, dict):
-                raise ParserError(
-                    f"`Switch` should be object, not {get_type_name(config)}")
+            if own_only and switch_name not in net:
+                continue
 
             s = net.get(switch_name)
             assert isinstance(s, Switch)
+            scripts.append(compile_switch_config(s, config))
+
+    apply_node_scripts(scripts)
+
+
+def get_static_arp_scope(net_config: dict):
+    """Get scope of static ARP population in the net file.
+
+    Args:
+        net_config: Content of the net file, `populate-static-arp` may be
+            true, `all` or `subnet`.
+
+    Returns:
+        One of `STATIC_ARP_SCOPES`, or False if disabled.
+
+    Raises:
+        ParserError: Scope is incorrect.
+    """
+
+    populate_static_arp_scope = net_config.get("populate-static-arp", False)
+    if populate_static_arp_scope is True:
+        populate_static_arp_scope = "all"
+    if populate_static_arp_scope is not False and populate_static_arp_scope not in STATIC_ARP_SCOPES:
+        raise ParserError(
+            f"`populate-static-arp` should be bool or one of {STATIC_ARP_SCOPES}, not {populate_static_arp_scope}")
+    return populate_static_arp_scope
+
+
+def write_shell_file(shell_file: TextIO, pids: Dict[str, int]):
+    """Write terminal entry of nodes.
+
+    Args:
+        shell_file: File to write, closed after written.
+        pids: Name of node -> PID of its shell, hosts first.
+    """
+
+    pathCheck("mnexec", moduleName='Mininet')
+
+    shell = os.environ.get("SHELL", "bash")
+    shell_file.writelines([
+        f"#!{shell}\n",
+        f"\n",
+        f"# This file is created by mininet tool `loadmn` of P4 Workshop, do not modify it.\n",
+        f"\n",
+        f"function print_usage {{\n",
+        f"  echo \"Usage: $0 [switch_name|host_name]\"\n",
+        f"  echo \"Available nodes: " + ", ".join(pids) + ".\"\n"
+        f"}}\n",
+        f"\n",
+        f"if [ $# -ne 1 ]; then\n",
+        f"  print_usage\n",
+        f"  exit 1\n",
+        f"fi\n",
+        f"\n",
+        f"case $1 in\n"] + [
+        f"  {name}) PID={pid};;\n" for name, pid in pids.items()] + [
+        f"  ?)\n",
+        f"    print_usage\n",
+        f"    exit 0;;\n",
+        f"  *)\n",
+        f"    print_usage\n",
+        f"    exit 1;;\n",
+        f"esac\n",
+        f"\n",
+        f"sudo -E env PATH={os.environ.get('PATH', '')} mnexec -a ${{PID}} {shell}"
+    ])
+    os.chmod(shell_file.fileno(), 0o775)
+    shell_file.close()
+
+
+def reserve_resources(directory: str, topo: Topo):
+    """Reserve ports of switches and names of this network, see `ResourceAllocator`.
+
+    Ports given explicitly in the topology are recorded first, so they are
+    not reserved for other switches of this or other networks.
+
+    Args:
+        directory: Directory of lease files.
+        topo: The topology.
+
+    Returns:
+        The allocator, released at stop.
+
+    Raises:
+        RuntimeError: Ports given are reserved by another network.
+    """
+
+    allocator = ResourceAllocator(directory)
+    ports = []
+    for name in topo.switches():
+        params = topo.nodeInfo(name)
+        for key, count in (("listenPort", 1), ("grpc_server_port", 1), ("cli_port", 1),
+                           ("dru_sim_tcp_port_base", DRU_SIM_PORTS)):
+            if isinstance(params.get(key), int):
+                ports.extend(range(params[key], params[key] + count))
+    try:
+        allocator.reserve_ports(ports)
+    except RuntimeError:
+        allocator.release()
+        raise
+    name = allocator.reserve_name("net", "p")
+    BatchLink.intf_prefix = f"{name}-"
+    SimpleSwitch.port_allocator = allocator
+    TofinoModel.port_allocator = allocator
+    info(f"*** Resources reserved as {name}\n")
+    return allocator
+
+
+def replay_switch_config(switch: Switch, net_config: dict):
+    """Apply configuration of a restarted switch in the net file again.
+
+    Args:
+        switch: The switch.
+        net_config: Content of the net file.
+    """
+
+    config = net_config.get("switches", {}).get(switch.name)
+    if config is not None:
+        apply_node_scripts([compile_switch_config(switch, config)])
+
+
+def report_summary(summary_file: Union[TextIO, None] = None,
+                   cgroups: Union[CgroupManager, None] = None,
+                   supervisor: Union[Supervisor, None] = None):
+    """Log resource usage and restarts of stopped nodes, and remove cgroups.
+
+    Args:
+        summary_file: A file to write the summary as json, or None.
+        cgroups: Cgroups of nodes, or None.
+        supervisor: Supervisor of switches, or None.
+    """
+
+    def fmt(value, unit: str, scale: float = 1):
+        return "-" if value is None else f"{value / scale:.3f}{unit}"
+
+    summary: Dict[str, dict] = {}
+    if cgroups is not None:
+        usages = cgroups.collect()
+        cgroups.remove()
+        if usages:
+            info("*** Resource usage of nodes\n")
+        for name, usage in usages.items():
+            info(f"{name}: cpu {fmt(usage['cpu-time'], 's')}, "
+                 f"throttled {fmt(usage['throttled-time'], 's')} in {usage['throttled-periods'] or 0} periods, "
+                 f"memory peak {fmt(usage['memory-peak'], 'MiB', 1 << 20)}, "
+                 f"oom kills {usage['oom-kills'] or 0}\n")
+            summary.setdefault(name, {}).update(usage)
+    if supervisor is not None:
+        statuses = supervisor.to_json()
+        if statuses:
+            info("*** Restarts of switches\n")
+        for name, status in statuses.items():
+            info(f"{name}: {status['state']}, {status['restarts']} restarts of "
+                 f"{status['crashes']} crashes, down {status['downtime']:.3f}s\n")
+            summary.setdefault(name, {})["supervisor"] = status
+    if summary_file:
+        json.dump(summary, summary_file)
+        summary_file.close()
+
+
+def run_shards(args: argparse.Namespace, topo: Topo, net_config: dict,
+               make_net: Callable[[int], Mininet],
+               allocator: Union[ResourceAllocator, None] = None,
+               placement: Union[Dict[str, List[int]], None] = None,
+               cgroups: Union[CgroupManager, None] = None,
+               switch_type: Union[type, None] = None):
+    """Run a network by shards until SIGINT or SIGTERM, see `ShardedNet`.
+
+    Args:
+        args: Arguments of loadmn.
+        topo: The topology.
+        net_config: Content of the net file.
+        make_net: Function makes an empty Mininet for a shard by its index.
+        allocator: Allocator of ports and names, or None.
+        placement: Name of node -> CPUs, or None.
+        cgroups: Cgroups of nodes, or None.
+        switch_type: Default class of switches.
 
-            # Intfs
-            if "intfs" in config:
-                if isinstance(config["intfs"], list):
-                    # [("10.0.0.1", 16), ...]
-                    intf = s.defaultIntf()
-                    if intf is None:
-                        raise ValueError(
-                            f"No default interface in {switch_name}")
-                    config_intf(intf, config["intfs"])
-                elif isinstance(config["intfs"], dict):
-                    # { "0" : ?, "1" : ? }
-                    for port_, c in config["intfs"].items():
-                        assert isinstance(port_, str)
-                        try:
-                            port = int(port_)
-                        except ValueError:
-                            raise ParserError(
-                                f"Port number should be str of int, not {port_}")
-
-                        if port not in s.intfs:
-                            raise RuntimeError(
-                                f"Port not found: {switch_name}.{port}")
-                        config_intf(s.intfs[port], c)
-                else:
-                    raise ParserError(
-                        f"Unsupported `intfs` type: {get_type_name(config['intfs'])}")
-
-    # Use static ARP
-    if "populate-static-arp" in net_config and net_config["populate-static-arp"] is True:
-        info("*** Setup static ARPs\n")
-        net.staticArp()
+    Returns:
+        Exit code.
+    """
+
+    if args.daemon:
+        print("--daemon is not supported with --shards.", file=sys.stderr)
+        return 1
+    if net_config.get("supervisor") is not None:
+        print("`supervisor` is not supported with --shards.", file=sys.stderr)
+        return 1
+    if args.events:
+        print("--events is not supported with --shards.", file=sys.stderr)
+        return 1
+
+    net_params = net_config.get("net-config", {})
+    try:
+        sharded = ShardedNet(topo, args.shards, make_net,
+                             lambda net: configure_nodes(net, net_config, own_only=True),
+                             make_net_output,
+                             get_static_arp_scope(net_config),
+                             net_params.get("ipBase", DEFAULT_IP_BASE),
+                             net_params.get("autoSetMacs", False),
+                             placement, cgroups, switch_type)
+        sharded.start()
+    except (ParserError, RuntimeError) as e:
+        print(e, file=sys.stderr)
+        return 1
 
     # Output
     if args.out_file:
-        out = {
-            "hosts":
-            dict((host.name, {
-                "intfs":
-                dict((port, {
-                    "name": intf.name,
-                    "ip": [intf.ip, intf.prefixLen],
-                    "mac": intf.mac
-                }) for port, intf in host.intfs.items())
-            }) for host in net.hosts),
-            "switches":
-            dict((switch.name, {
-                "intfs":
-                dict((port, {
-                    "name": intf.name,
-                    "ip": [intf.ip, intf.prefixLen],
-                    "mac": intf.mac
-                }) for port, intf in switch.intfs.items())
-            }) for switch in net.switches)
-        }
+        out = sharded.output
+        if allocator is not None:
+            out["allocation"] = allocator.lease()
         json.dump(out, args.out_file)
         args.out_file.close()
         info("*** Configuration output writed\n")
-
-    # Shell support
-    node_names = [host.name for host in net.hosts
-                  ] + [switch.name for switch in net.switches]
     if args.shell_file and args.mnexec:
-        pathCheck("mnexec", moduleName='Mininet')
-
-        shell = os.environ.get("SHELL", "bash")
-        args.shell_file.writelines([
-            f"#!{shell}\n",
-            f"\n",
-            f"# This file is created by mininet tool `loadmn` of P4 Workshop, do not modify it.\n",
-            f"\n",
-            f"function print_usage {{\n",
-            f"  echo \"Usage: $0 [switch_name|host_name]\"\n",
-            f"  echo \"Available nodes: " + ", ".join(node_names) + ".\"\n"
-            f"}}\n",
-            f"\n",
-            f"if [ $# -ne 1 ]; then\n",
-            f"  print_usage\n",
-            f"  exit 1\n",
-            f"fi\n",
-            f"\n",
-            f"case $1 in\n"] + [
-            f"  {host.name}) PID={host.pid};;\n" for host in net.hosts] + [
-            f"  {switch.name}) PID={switch.pid};;\n" for switch in net.switches] + [
-            f"  ?)\n",
-            f"    print_usage\n",
-            f"    exit 0;;\n",
-            f"  *)\n",
-            f"    print_usage\n",
-            f"    exit 1;;\n",
-            f"esac\n",
-            f"\n",
-            f"sudo -E env PATH={os.environ.get('PATH', '')} mnexec -a ${{PID}} {shell}"
-        ])
-        os.chmod(args.shell_file.fileno(), 0o775)
-        args.shell_file.close()
+        write_shell_file(args.shell_file, sharded.pids)
         info("*** Shell helper writed\n")
+    if args.state_file:
+        write_state(args.state_file, {
+            "pid": os.getpid(), "daemon": None, "nodes": sharded.nodes})
+        info("*** State writed\n")
+
+    # Serve until stopped
+    signals = {signal.SIGINT, signal.SIGTERM}
+    signal.pthread_sigmask(signal.SIG_BLOCK, signals)
+    info(f"*** Running {sharded.shards} shards, send SIGINT or SIGTERM to stop\n")
+    signal.sigwait(signals)
+
+    if args.state_file:
+        try:
+            os.remove(args.state_file)
+        except FileNotFoundError:
+            pass
+    info("*** Stopping shards\n")
+    sharded.stop()
+    if cgroups is not None:
+        report_summary(args.summary_file, cgroups)
+    if allocator is not None:
+        allocator.release()
+    return 0
+
+
+def run_net(args: argparse.Namespace, topo: Topo, net_config: dict,
+            make_net: Callable[[], Mininet],
+            allocator: Union[ResourceAllocator, None] = None,
+            placement: Union[Dict[str, List[int]], None] = None,
+            cgroups: Union[CgroupManager, None] = None):
+    """Run a network until CLI exits or the JSON-RPC server stops.
+
+    Nodes are stopped at exit, also on errors.
 
-    # Start CLI
-    CLI(net)
-    net.stop()
+    Args:
+        args: Arguments of loadmn.
+        topo: The topology.
+        net_config: Content of the net file.
+        make_net: Function makes a Mininet of the topology, not built.
+        allocator: Allocator of ports and names, or None.
+        placement: Name of node -> CPUs, or None.
+        cgroups: Cgroups of nodes, or None.
+
+    Returns:
+        Exit code.
+    """
+
+    # Supervisor of switches, handling crashes from startup
+    supervisor = None
+    if net_config.get("supervisor") is not None:
+        try:
+            supervisor = Supervisor(net_config["supervisor"],
+                                    lambda switch: replay_switch_config(switch, net_config))
+        except ParserError as e:
+            print(e, file=sys.stderr)
+            return 1
+
+    net = make_net()
+    subscriber = None
+    try:
+        net.build()
+
+        # Create veth pairs still queued by batched links
+        flush_links()
+
+        # Shape links by their profiles, one `tc -batch` per node
+        shaper = LinkShaper(topo.link_profiles)
+        try:
+            if shaper.apply(net.links):
+                info("*** Link profiles applied\n")
+        except (ParserError, RuntimeError) as e:
+            print(e, file=sys.stderr)
+            return 1
+
+        # Pin switches and hosts to their CPUs
+        if placement and apply_placement(net.hosts + net.switches, placement):
+            info("*** Nodes placed on CPUs\n")
+        if cgroups is not None and cgroups.add_nodes(net.hosts, net.switches):
+            info("*** Nodes put in cgroups\n")
+
+        # Subscribed before switches are started, so no events are missed
+        if args.events:
+            subscriber = NanologSubscriber(args.events, dict(
+                (s.name, (s.nanolog_sock, s.p4_target_conf)) for s in net.switches
+                if getattr(s, "nanolog_sock", None) is not None))
+            try:
+                subscriber.start()
+            except RuntimeError as e:
+                print(e, file=sys.stderr)
+                return 1
+            info(f"*** Subscribed events of {len(subscriber.switches)} switches\n")
+
+        # Start network
+        # Switches are spawned first, then waited for concurrently
+        info("Starting network\n")
+        if supervisor is not None:
+            supervisor.start()
+        net.start()
+
+        startup_latencies = get_startup_latencies(net.switches)
+        if startup_latencies:
+            info("*** Switch startup latency\n")
+            for name, latency in startup_latencies.items():
+                info(f"{name}: {latency:.3f}s\n")
+            info("*** Switch startup latency histogram\n")
+            lower = 0.0
+            for bound, count in latency_histogram(startup_latencies.values()):
+                if count:
+                    info(f"({lower:g}s, {f'{bound:g}s' if bound is not None else 'inf'}]: {count}\n")
+                lower = bound
+
+        # Init config
+        configure_nodes(net, net_config)
+
+        # Use static ARP
+        populate_static_arp_scope = get_static_arp_scope(net_config)
+        if populate_static_arp_scope is not False:
+            info("*** Setup static ARPs\n")
+            populate_static_arp(net.hosts, populate_static_arp_scope)
+
+        # Output
+        if args.out_file:
+            out = make_net_output(net)
+            if allocator is not None:
+                out["allocation"] = allocator.lease()
+            json.dump(out, args.out_file)
+            args.out_file.close()
+            info("*** Configuration output writed\n")
+
+        # Shell support
+        if args.shell_file and args.mnexec:
+            write_shell_file(args.shell_file, dict(
+                (node.name, node.pid) for node in net.hosts + net.switches))
+            info("*** Shell helper writed\n")
+
+        if args.state_file:
+            write_state(args.state_file, make_state(net, args.daemon))
+            info("*** State writed\n")
+
+        # Start CLI, or serve until stopped
+        if args.daemon:
+            try:
+                server = RpcServer(args.daemon, net, lambda: make_net_output(net), shaper,
+                                   supervisor)
+            except OSError as e:
+                print(f"Cannot serve on {args.daemon}: {e}", file=sys.stderr)
+                return 1
+            signal.signal(signal.SIGTERM, lambda *_: threading.Thread(
+                target=server.shutdown, daemon=True).start())
+            info(f"*** Serving on {args.daemon}\n")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.server_close()
+        else:
+            CLI(net)
+    finally:
+        if args.state_file:
+            try:
+                os.remove(args.state_file)
+            except FileNotFoundError:
+                pass
+        if supervisor is not None:
+            supervisor.stop()
+        stop_net(net)
+        get_log_drain().close()
+        if subscriber is not None:
+            info(f"*** {subscriber.stop()} events written to {args.events}\n")
+        if cgroups is not None or supervisor is not None:
+            report_summary(args.summary_file, cgroups, supervisor)
 
     return 0
+
+
+def main_loadmn(args: argparse.Namespace):
+    """Main of loadmn executable."""
+
+    # Set logging for mininet
+    basicConfig(level=_nameToLevel[args.log_level.upper(
+    )] if args.log_level != "output" else OUTPUT)
+    setLogLevel(args.log_level)
+
+    generator_spec = parse_generator_uri(args.topo_file)
+    topo_ext = os.path.splitext(args.topo_file)[1]
+    if generator_spec is None and topo_ext != ".json":
+        print(f"Unknwon type of topology file: {topo_ext}", file=sys.stderr)
+        exit(1)
+
+    def open_topo_file():
+        if generator_spec is not None:
+            return io.StringIO(json.dumps({"generators": [generator_spec]}))
+        return open(args.topo_file, "r")
+
+    # Load network
+    info("*** Loading network\n")
+    try:
+        if (args.net_file):
+            net_source = args.net_file.read()
+            net_config = json.loads(net_source)
+        else:
+            net_source = None
+            net_config = {}
+    except Exception as e:
+        print(f"Cannot load network file: {e}", file=sys.stderr)
+        exit(1)
+
+    # Unchanged files are not parsed again
+    cache_key, cached = None, None
+    if args.cache:
+        cache_key = make_cache_key(
+            args.topo_file.encode() if generator_spec is not None else args.topo_file,
+            net_source.encode() if net_source is not None else None,
+            str(args.stream_topo).encode())
+        cached = load_cache(args.cache, cache_key)
+
+    if cached is not None:
+        info("*** Topology loaded from cache\n")
+        topo, plan = cached
+    else:
+        # Check all files offline, before anything is started
+        info("*** Loading topology\n")
+        with open_topo_file() as topo_file:
+            topo, plan, errors = make_plan(topo_file, net_config, args.stream_topo)
+        for e in errors:
+            print(e, file=sys.stderr)
+        if errors:
+            if args.plan and plan is not None:
+                json.dump(plan, args.out_file or sys.stdout, indent=2)
+            exit(1)
+        if cache_key is not None:
+            store_cache(args.cache, cache_key, (topo, plan), find_artifacts(topo))
+
+    if args.plan:
+        json.dump(plan, args.out_file or sys.stdout, indent=2)
+        return 0
+
+    # Default type
+    host_type = get_default_type(net_config.get("host-type"), "host", Host)
+    switch_type = get_default_type(
+        net_config.get("switch-type"), "switch", Switch)
+    controller_type = get_default_type(net_config.get(
+        "controller-type"), "controller", Controller) if ("controller-type" not in net_config or net_config["controller-type"] is not None) else None
+    link_type = get_default_type(net_config.get("link-type"), "link", Link)
+    intf_type = get_default_type(net_config.get("intf-type"), "intf", Intf)
+
+    SimpleSwitch.startup_timeout = args.startup_timeout
+    TofinoModel.startup_timeout = args.startup_timeout
+
+    # Outputs of switches piped are drained, and kept or spilled
+    try:
+        set_log_drain(LogDrain(int(args.log_buffer * (1 << 20)), args.log_spill,
+                               int(args.log_spill_size * (1 << 20))))
+    except (OSError, ValueError) as e:
+        print(f"Cannot drain outputs of switches: {e}", file=sys.stderr)
+        exit(1)
+
+    # Nodes are marked as of this run, also in shards forked later
+    get_run()
+
+    # Resources of the run, released at exit, also on errors
+    nanolog_dir, allocator, cgroups = None, None, None
+    try:
+        # Switches without nanolog sockets publish events in a directory of the run
+        if args.events and args.shards <= 1:
+            nanolog_dir = tempfile.mkdtemp(prefix="p4ws-nanolog-")
+            SimpleSwitch.nanolog_dir = nanolog_dir
+
+        # Ports and names not given are reserved before nodes are created
+        if args.allocate:
+            try:
+                allocator = reserve_resources(args.allocate, topo)
+            except RuntimeError as e:
+                print(e, file=sys.stderr)
+                return 1
+
+        # CPUs of nodes, applied before switches are spawned
+        placement = None
+        if net_config.get("placement") is not None:
+            try:
+                placement = make_topo_placement(net_config["placement"], topo)
+            except ParserError as e:
+                print(e, file=sys.stderr)
+                return 1
+
+        # Cgroups of nodes, created before switches are spawned
+        if net_config.get("cgroups") is not None:
+            try:
+                cgroups = CgroupManager(net_config["cgroups"], f"loadmn-{os.getpid()}")
+                cgroups.setup()
+            except (ParserError, RuntimeError) as e:
+                print(e, file=sys.stderr)
+                return 1
+
+        def make_net(index: int = 0):
+            # Only the first shard runs controllers
+            return Mininet(topo=topo if args.shards <= 1 else None,
+                           switch=switch_type,
+                           host=host_type,
+                           controller=controller_type if index == 0 else None,
+                           link=link_type,
+                           intf=intf_type,
+                           build=False,
+                           **net_config.get("net-config", {}))
+
+        if args.shards > 1:
+            return run_shards(args, topo, net_config, make_net, allocator, placement, cgroups,
+                              switch_type)
+        return run_net(args, topo, net_config, make_net, allocator, placement, cgroups)
+    finally:
+        if nanolog_dir is not None:
+            shutil.rmtree(nanolog_dir, ignore_errors=True)
+        # Already removed by `report_summary`, unless the run failed
+        if cgroups is not None:
+            cgroups.remove()
+        if allocator is not None:
+            allocator.release()
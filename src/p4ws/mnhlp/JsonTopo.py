@@ -7,31 +7,93 @@ Typical usage example:
 """
 
 import json
-from typing import TextIO
+from contextlib import contextmanager
+from typing import Iterator, List, TextIO, Tuple, Union
 
 from mininet.node import Host, OVSSwitch
 from mininet.topo import Topo
 
-from p4ws.utils import get_type, get_type_name
+from p4ws.utils import get_type, get_type_name, warm_type_cache
 
 from .error import ParserError
+from .generators import generate
+from .jsonstream import JsonStreamReader
+from .linkprofile import parse_link_profile
+from .template import expand_link_template, expand_range
+
+# Sections of topology file, in order of loading
+SECTIONS = ("classes", "link-profiles", "hosts", "switches", "generators", "links")
+
+# Sections to load before a section
+_SECTION_DEPS = {
+    "classes": (),
+    "link-profiles": (),
+    "hosts": ("classes",),
+    "switches": ("classes",),
+    "generators": ("classes", "link-profiles"),
+    "links": ("classes", "link-profiles", "hosts", "switches", "generators")
+}
+
+
+class _Section:
+    """Value of a section, with its items iterated lazily.
+
+    Attributes
+    ----------
+    type_name : str
+        Type name of the value, `dict` for objects and `list` for arrays.
+    items : Iterator[tuple] | None
+        Keys or indexes with values, for objects and arrays.
+    value : object
+        The value, if neither object nor array.
+    """
+
+    def __init__(self, type_name: str, items: Union[Iterator[Tuple], None] = None, value=None):
+        self.type_name = type_name
+        self.items = items
+        self.value = value
+
+    @classmethod
+    def of_value(cls, value):
+        if isinstance(value, dict):
+            return cls("dict", iter(value.items()))
+        if isinstance(value, list):
+            return cls("list", enumerate(value))
+        return cls(get_type_name(value), value=value)
+
+    @classmethod
+    def of_stream(cls, reader: JsonStreamReader):
+        c = reader.peek()
+        if c == "{":
+            return cls("dict", ((k, reader.read_value()) for k in reader.iter_object()))
+        if c == "[":
+            return cls("list", ((i, reader.read_value()) for i in reader.iter_array()))
+        value = reader.read_value()
+        return cls(get_type_name(value), value=value)
 
 
 class JsonTopo(Topo):
     """Json topology.
 
-    Read topology from a json file.
+    Read topology from a json file. Besides `hosts`, `switches` and `links`,
+    nodes and links may be built by `generators`, see `p4ws.mnhlp.generators`.
     Typical usage example:
 
         with open("topo.json") as f:
             topo = JsonTopo(f)
     """
 
-    def __init__(self, fp: TextIO, **kwargs):
+    def __init__(self, fp: TextIO, errors: Union[List[ParserError], None] = None,
+                 stream: bool = False, **kwargs):
         """Read topology from a json file.
 
         Args:
             fp: File object to be read.
+            errors: List to collect errors of classes, nodes and links, which
+                are skipped instead of raising, None to raise the first error.
+            stream: Read the file incrementally, item by item, instead of
+                loading it at once. Sections in order of `SECTIONS` are read
+                in one pass, others need the file to be seekable.
 
         Kwargs:
             **kwargs: Keyword arguments for construct class Topo.
@@ -41,7 +103,7 @@ class JsonTopo(Topo):
 
         Raises:
             json.decoder.JSONDecodeError: Format of json is incorrect.
-            ParserError: Format of topology is incorrect.
+            ParserError: Format of topology is incorrect, with JSON path of the error.
             ModuleNotFoundError: Module of specified class type (`cls`) not found.
             AttributeError: Specified class type (`cls`) not found.
             ValueError: Specified class type (`cls`) is not name of a type.
@@ -50,13 +112,12 @@ class JsonTopo(Topo):
         # Init topology and default options
         Topo.__init__(self, **kwargs)
 
-        conf = json.load(fp)
-
-        if not isinstance(conf, dict):
-            raise ParserError("Top-level should be object")
+        self._topo_kwargs = kwargs
+        self._errors = errors
+        warm_type_cache()
 
         # Init classes
-        classes = {
+        self._classes = {
             "host": {
                 "cls": Host
             },
@@ -65,12 +126,148 @@ class JsonTopo(Topo):
             }
         }
 
-        if "classes" in conf:
-            if not isinstance(conf["classes"], dict):
-                raise ParserError(
-                    f"`classes` should be object, not {get_type_name(conf['classes'])}")
+        # Link profiles, name -> profile
+        self.link_profiles = {}
+
+        if stream:
+            self._load_stream(fp)
+        else:
+            conf = json.load(fp)
+
+            if not isinstance(conf, dict):
+                raise ParserError("Top-level should be object", "$")
+
+            for section in SECTIONS:
+                if section in conf:
+                    self._load_section(section, _Section.of_value(conf[section]))
+
+    def _load_stream(self, fp: TextIO):
+        """Load sections from a file incrementally.
+
+        Sections are loaded in order of the file, assuming absent sections not
+        seen yet. If a section turns out to be needed by a section already
+        loaded, the topology is reset and the file is read again, and each
+        section is loaded once sections it depends on are loaded.
+        """
+
+        init_state = (dict(self._classes), len(self._errors) if self._errors is not None else 0)
+        loaded = set()
+        present = None
+        while True:
+            reader = JsonStreamReader(fp)
+            if reader.peek() != "{":
+                raise ParserError("Top-level should be object", "$")
+
+            keys = set()
+            deferred = restart = False
+            for key in reader.iter_object():
+                keys.add(key)
+                if key not in SECTIONS or key in loaded:
+                    reader.skip_value()
+                elif present is None and any(key in _SECTION_DEPS[l] for l in loaded):
+                    restart = True
+                    break
+                elif present is None or all(d in loaded or d not in present for d in _SECTION_DEPS[key]):
+                    self._load_section(key, _Section.of_stream(reader))
+                    loaded.add(key)
+                else:
+                    reader.skip_value()
+                    deferred = True
 
-            for name, spec in conf["classes"].items():
+            if not restart and not deferred:
+                return
+            if not fp.seekable():
+                raise ParserError(
+                    f"Sections should be in order of {', '.join(SECTIONS)} to stream", "$")
+            fp.seek(0)
+
+            if restart:
+                # Find all sections, then load them again in order
+                reader = JsonStreamReader(fp)
+                present = set()
+                for key in reader.iter_object():
+                    present.add(key)
+                    reader.skip_value()
+                fp.seek(0)
+                Topo.__init__(self, **self._topo_kwargs)
+                self._classes = dict(init_state[0])
+                if self._errors is not None:
+                    del self._errors[init_state[1]:]
+                loaded = set()
+            else:
+                present = keys
+
+    @contextmanager
+    def _collect(self, path: str):
+        """Add JSON path to errors, and collect them if `errors` is given."""
+
+        try:
+            yield
+        except (ParserError, ImportError, AttributeError, ValueError, AssertionError) as e:
+            # The file itself is broken, nothing after it can be read
+            if isinstance(e, json.JSONDecodeError):
+                raise
+            if isinstance(e, ParserError):
+                if e.path is None:
+                    e = ParserError(e.msg, path)
+            elif self._errors is not None:
+                e = ParserError(str(e), path)
+            if self._errors is None:
+                raise e
+            self._errors.append(e)
+
+    def _load_section(self, section: str, value: _Section):
+        try:
+            with self._collect(f"$.{section}"):
+                getattr(self, f"_load_{section.replace('-', '_')}")(value)
+        finally:
+            # Drain unread items, so a stream is positioned after the section
+            if value.items is not None:
+                for _ in value.items:
+                    pass
+
+    def _get_style_from_spec(self, spec: dict, t: str):
+        classes = self._classes
+        if "class" in spec:
+            cn = spec.pop("class")
+            if not isinstance(cn, str):
+                raise ParserError(
+                    f"Class name should be str, not {get_type_name(cn)}")
+            if cn not in classes:
+                raise ParserError(f"Class `{cn}` not exists")
+
+            style = classes[cn].copy()
+        else:
+            style = classes.get(t, {}).copy()
+
+        # Get real type
+        if "cls" in spec:
+            spec["cls"] = get_type(spec["cls"])
+
+        style.update(spec)
+
+        # Link profiles are checked at use, as classes are loaded before them
+        if t == "link" and "profile" in style and style["profile"] not in self.link_profiles:
+            raise ParserError(f"Link profile `{style['profile']}` undefined")
+        return style
+
+    def _load_link_profiles(self, value: _Section):
+        if value.type_name != "dict":
+            raise ParserError(
+                f"`link-profiles` should be object, not {value.type_name}")
+
+        for name, spec in value.items:
+            with self._collect(f"$.link-profiles.{name}"):
+                self.link_profiles[name] = parse_link_profile(spec)
+
+    def _load_classes(self, value: _Section):
+        classes = self._classes
+        if value.type_name != "dict":
+            raise ParserError(
+                f"`classes` should be object, not {value.type_name}")
+
+        for name, spec in value.items:
+            with self._collect(f"$.classes.{name}"):
                 assert isinstance(name, str), "Class name should be str"
                 assert (name in {"host", "switch", "link"}
                         ) or (name not in classes), f"Class `{name}` exists"
@@ -100,153 +297,157 @@ class JsonTopo(Topo):
 
                 classes[name] = style
 
-        def get_style_from_spec(spec: dict, t: str):
-            if "class" in spec:
-                cn = spec.pop("class")
-                if not isinstance(cn, str):
-                    raise ParserError(
-                        f"Class name should be str, not {get_type_name(cn)}")
-                if cn not in classes:
-                    raise ParserError(f"Class `{cn}` not exists")
-
-                style = classes[cn].copy()
-            else:
-                style = classes.get(t, {}).copy()
-
-            # Get real type
-            if "cls" in spec:
-                spec["cls"] = get_type(spec["cls"])
-
-            style.update(spec)
-            return style
-
-        # init hosts
-        if "hosts" in conf:
-            hosts = conf["hosts"]
-            if isinstance(hosts, dict):
-                # { "h1" : { opts, ...}, "h2" : { opts, ...}, ...}
-                for h, spec in hosts.items():
+    def _load_hosts(self, value: _Section):
+        if value.type_name == "dict":
+            # { "h1" : { opts, ...}, "h2" : { opts, ...}, ...}
+            for h, spec in value.items:
+                with self._collect(f"$.hosts.{h}"):
                     assert isinstance(h, str), "Host name should be str"
                     if not isinstance(spec, dict):
                         raise ParserError(
                             f"`host` should be object, not {get_type_name(spec)}")
 
-                    style = get_style_from_spec(spec, "hosts")
-                    self.addHost(h, **style)
-            elif (isinstance(hosts, list)):
-                # ["h1", "h2", ...]
-                style = classes.get("host", {}).copy()
-                for h in hosts:
+                    style = self._get_style_from_spec(spec, "host")
+                    for name in expand_range(h):
+                        self.addHost(name, **style)
+        elif value.type_name == "list":
+            # ["h1", "h2", ...]
+            style = self._classes.get("host", {}).copy()
+            for i, h in value.items:
+                with self._collect(f"$.hosts[{i}]"):
                     if not isinstance(h, str):
                         raise ParserError(
                             f"Host name should be str, not {get_type_name(h)}")
-                    self.addHost(h, **style)
-            else:
-                raise ParserError(
-                    f"Unsupported `hosts` type: {get_type_name(hosts)}")
-
-        # Init switches
-        if "switches" in conf:
-            switches = conf["switches"]
-            if isinstance(switches, dict):
-                # { "s1" : { opts, ...}, "s2" : { opts, ...}, ...}
-                for s, spec in switches.items():
+                    for name in expand_range(h):
+                        self.addHost(name, **style)
+        else:
+            raise ParserError(
+                f"Unsupported `hosts` type: {value.type_name}")
+
+    def _load_switches(self, value: _Section):
+        if value.type_name == "dict":
+            # { "s1" : { opts, ...}, "s2" : { opts, ...}, ...}
+            for s, spec in value.items:
+                with self._collect(f"$.switches.{s}"):
                     assert isinstance(s, str), "Switch name should be str"
                     if not isinstance(spec, dict):
                         raise ParserError("`switch` should be object")
 
-                    style = get_style_from_spec(spec, "switch")
-                    self.addSwitch(s, **style)
-            elif (isinstance(switches, list)):
-                # ["s1", "s2", ...]
-                style = classes.get("switch", {}).copy()
-                for s in switches:
+                    style = self._get_style_from_spec(spec, "switch")
+                    for name in expand_range(s):
+                        self.addSwitch(name, **style)
+        elif value.type_name == "list":
+            # ["s1", "s2", ...]
+            style = self._classes.get("switch", {}).copy()
+            for i, s in value.items:
+                with self._collect(f"$.switches[{i}]"):
                     if not isinstance(s, str):
                         raise ParserError(
                             f"Switch name should be str, not {get_type_name(s)}")
-                    self.addSwitch(s, **style)
+                    for name in expand_range(s):
+                        self.addSwitch(name, **style)
+        else:
+            raise ParserError(
+                f"Unsupported `switches` type: {value.type_name}")
+
+    def _load_generators(self, value: _Section):
+        if value.type_name != "list":
+            raise ParserError(
+                f"`generators` should be array, not {value.type_name}")
+
+        for i, spec in value.items:
+            with self._collect(f"$.generators[{i}]"):
+                for item in generate(spec):
+                    kind, cn = item[0], item[-1]
+                    style = self._get_style_from_spec(
+                        {} if cn is None else {"class": cn}, kind)
+                    if kind == "host":
+                        self.addHost(item[1], **style)
+                    elif kind == "switch":
+                        self.addSwitch(item[1], **style)
+                    else:
+                        self.addLink(*item[1:5], **style)
+
+    def _load_links(self, value: _Section):
+        if value.type_name != "list":
+            raise ParserError(
+                f"`links` should be array, not {value.type_name}")
+
+        for i, l in value.items:
+            with self._collect(f"$.links[{i}]"):
+                if isinstance(l, dict) and "for" in l:
+                    # { "for": { "i": "[1-4]" }, "link": ["h{i}", "s1", 0, "{i}"] }
+                    for item in expand_link_template(l):
+                        self._add_link(item)
+                else:
+                    self._add_link(l)
+
+    def _add_link(self, l):
+        if isinstance(l, list):
+            if len(l) == 2:
+                # [node1, nodes]
+                node1, node2 = l
+                port1, port2, spec = None, None, {}
+            elif len(l) == 3:
+                # [node1, nodes, { opts, ... }]
+                node1, node2, spec = l
+                port1, port2 = None, None
+            elif len(l) == 4:
+                # [node1, node2, port1, port2]
+                node1, node2, port1, port2 = l
+                spec = {}
+            elif len(l) == 5:
+                # [node1, node2, port1, port2, { opts, ... }]
+                node1, node2, port1, port2, spec = l
             else:
-                raise ParserError(
-                    f"Unsupported `switches` type: {get_type_name(switches)}")
+                raise ParserError("`link` too long")
 
-        # Init links
-        if "links" in conf:
-            links = conf["links"]
-            if not isinstance(links, list):
+            if not isinstance(node1, str):
                 raise ParserError(
-                    f"`links` should be array, not {get_type_name(links)}")
-
-            for l in links:
-                if isinstance(l, list):
-                    if len(l) == 2:
-                        # [node1, nodes]
-                        node1, node2 = l
-                        port1, port2, spec = None, None, {}
-                    elif len(l) == 3:
-                        # [node1, nodes, { opts, ... }]
-                        node1, node2, spec = l
-                        port1, port2 = None, None
-                    elif len(l) == 4:
-                        # [node1, node2, port1, port2]
-                        node1, node2, port1, port2 = l
-                        spec = {}
-                    elif len(l) == 5:
-                        # [node1, node2, port1, port2, { opts, ... }]
-                        node1, node2, port1, port2, spec = l
-                    else:
-                        raise ParserError("`link` too long")
-
-                    if not isinstance(node1, str):
-                        raise ParserError(
-                            f"`link::node1` should be str, not {get_type_name(node1)}")
-                    if not isinstance(node2, str):
-                        raise ParserError(
-                            f"`link::node2` should be str, not {get_type_name(node2)}")
-                    if not isinstance(spec, dict):
-                        raise ParserError("`link::spec` should be object")
-
-                    # port not in spec has higher priority
-                    port1_ = spec.pop("port1", port1)
-                    if port1 is None:
-                        port1 = port1_
-                    port2_ = spec.pop("port2", port2)
-                    if port2 is None:
-                        port2 = port2_
-
-                    if port1 is not None and not isinstance(port1, int):
-                        raise ParserError(
-                            f"`link::port1` should be int, not {get_type_name(port1)}")
-                    if port2 is not None and not isinstance(port2, int):
-                        raise ParserError(
-                            f"`link::port2` should be int, not {get_type_name(port2)}")
+                    f"`link::node1` should be str, not {get_type_name(node1)}")
+            if not isinstance(node2, str):
+                raise ParserError(
+                    f"`link::node2` should be str, not {get_type_name(node2)}")
+            if not isinstance(spec, dict):
+                raise ParserError("`link::spec` should be object")
+
+            # port not in spec has higher priority
+            port1_ = spec.pop("port1", port1)
+            if port1 is None:
+                port1 = port1_
+            port2_ = spec.pop("port2", port2)
+            if port2 is None:
+                port2 = port2_
+
+        elif isinstance(l, dict):
+            if "node1" not in l or "node2" not in l:
+                raise ParserError(
+                    "Both side of link should not be ignored")
+            node1, node2, port1, port2 = l.pop("node1"), l.pop(
+                "node2"), l.pop("port1", None), l.pop("port2", None)
+            spec = l
 
-                    style = get_style_from_spec(spec, "link")
-                    self.addLink(node1, node2, port1, port2, **style)
+            if not isinstance(node1, str):
+                raise ParserError(
+                    f"`link::node1` should be str, not {get_type_name(node1)}")
+            if not isinstance(node2, str):
+                raise ParserError(
+                    f"`link::node2` should be str, not {get_type_name(node2)}")
 
-                elif isinstance(l, dict):
-                    if "node1" not in l or "node2" not in l:
-                        raise ParserError(
-                            "Both side of link should not be ignored")
-                    node1, node2, port1, port2 = l.pop("node1"), l.pop(
-                        "node2"), l.pop("port1", None), l.pop("port2", None)
-                    spec = l
+        else:
+            raise ParserError(
+                f"Unsupported `link` type: {get_type_name(l)}")
 
-                    if not isinstance(node1, str):
-                        raise ParserError(
-                            f"`link::node1` should be str, not {get_type_name(node1)}")
-                    if not isinstance(node2, str):
-                        raise ParserError(
-                            f"`link::node2` should be str, not {get_type_name(node2)}")
-                    if port1 is not None and not isinstance(port1, int):
-                        raise ParserError(
-                            f"`link::port1` should be int, not {get_type_name(port1)}")
-                    if port2 is not None and not isinstance(port2, int):
-                        raise ParserError(
-                            f"`link::port2` should be int, not {get_type_name(port2)}")
+        if port1 is not None and not isinstance(port1, int):
+            raise ParserError(
+                f"`link::port1` should be int, not {get_type_name(port1)}")
+        if port2 is not None and not isinstance(port2, int):
+            raise ParserError(
+                f"`link::port2` should be int, not {get_type_name(port2)}")
 
-                    style = get_style_from_spec(spec, "link")
-                    self.addLink(node1, node2, port1, port2, **style)
+        for node in (node1, node2):
+            if node not in self.g.node:
+                raise ParserError(f"Node `{node}` not exists")
 
-                else:
-                    raise ParserError(
-                        f"Unsupported `link` type: {get_type_name(l)}")
+        style = self._get_style_from_spec(spec, "link")
+        self.addLink(node1, node2, port1, port2, **style)
@@ -2,6 +2,9 @@
 
 from .error import ParserError
 from .JsonTopo import JsonTopo
+from .links.BatchLink import BatchIntf, BatchLink, flush_links
+from .nodes.NamespaceHost import NamespaceHost
 from .nodes.SimpleSwitch import SimpleSwitch
 from .nodes.SimpleSwitchGrpc import SimpleSwitchGrpc
 from .nodes.TofinoModel import TofinoModel
+from .startup import wait_for_switches
@@ -0,0 +1,238 @@
+"""Allocator of TCP ports and names shared by concurrent networks.
+
+Networks started by `loadmn --allocate` on one machine reserve TCP ports of
+switches (Thrift, gRPC, model CLI and dru_sim) and names, e.g. the prefix of
+interfaces in the root namespace, in a lease file guarded by an exclusive
+lock, so they run side by side without collisions. A lease belongs to a
+process, identified by its PID and start time; it is removed by `release`, or
+dropped as stale once the process exited.
+
+Typical usage example:
+
+    allocator = ResourceAllocator(DEFAULT_ALLOC_DIR)
+    name = allocator.reserve_name("run", "p")
+    allocator.reserve_ports([9559])
+    port = allocator.reserve_port(9090)
+    ...
+    allocator.release()
+"""
+
+import errno
+import fcntl
+import json
+import os
+import socket
+from contextlib import contextmanager
+from typing import Dict, Iterable, Union
+
+from p4ws.state import get_start_time, write_state
+
+# Default directory of lock and lease files
+DEFAULT_ALLOC_DIR = "/tmp/p4ws-alloc"
+
+LOCK_FILE = "lock"
+LEASE_FILE = "leases.json"
+
+# Largest TCP port
+MAX_PORT = 65535
+
+
+def is_port_free(port: int):
+    """Check whether a TCP port can be listened on now."""
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(("0.0.0.0", port))
+        except OSError as e:
+            if e.errno in (errno.EADDRINUSE, errno.EACCES):
+                return False
+            raise
+    return True
+
+
+def get_node_ports(node):
+    """Get TCP ports a switch listens on.
+
+    Args:
+        node: The switch.
+
+    Returns:
+        Kind -> port, for ports of `SimpleSwitch`, `SimpleSwitchGrpc` and
+        `TofinoModel`.
+    """
+
+    ports = {}
+    for kind, attr in (("thrift", "listenPort"), ("cli", "cli_port"),
+                       ("dru-sim-base", "dru_sim_tcp_port_base")):
+        port = getattr(node, attr, None)
+        if isinstance(port, int):
+            ports[kind] = port
+    grpc_server_addr = getattr(node, "grpc_server_addr", None)
+    if grpc_server_addr is not None:
+        ports["grpc"] = grpc_server_addr[1]
+    return ports
+
+
+def _is_stale(pid: str, lease) -> bool:
+    return not pid.isdigit() or not isinstance(lease, dict)\
+        or get_start_time(int(pid)) != lease.get("start-time")
+
+
+@contextmanager
+def _locked_leases(directory: str):
+    """Lock and yield all leases, written back at exit."""
+
+    with open(os.path.join(directory, LOCK_FILE), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            path = os.path.join(directory, LEASE_FILE)
+            try:
+                with open(path) as f:
+                    leases = json.load(f)
+                if not isinstance(leases, dict):
+                    leases = {}
+            except (OSError, ValueError):
+                leases = {}
+            yield leases
+            write_state(path, leases)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def find_stale_leases(directory: str = DEFAULT_ALLOC_DIR, remove: bool = False):
+    """Find leases of exited processes, e.g. crashed networks.
+
+    Args:
+        directory: Directory of lock and lease files.
+        remove: Remove the leases found.
+
+    Returns:
+        PID -> lease, with ports and names, empty if `directory` not exists.
+    """
+
+    if not os.path.isdir(directory):
+        return {}
+    with _locked_leases(directory) as leases:
+        stale = dict((pid, lease) for pid, lease in leases.items()
+                     if _is_stale(pid, lease) and isinstance(lease, dict))
+        if remove:
+            for pid in [pid for pid, lease in leases.items() if _is_stale(pid, lease)]:
+                del leases[pid]
+    return stale
+
+
+class ResourceAllocator:
+    """Allocator of TCP ports and names, leased by a process.
+
+    Each reservation locks the lease file, so reservations of forked children,
+    e.g. shards, are added to the lease of the process creating the allocator.
+
+    Attributes:
+        directory: Directory of lock and lease files.
+        pid: PID owning the lease.
+        start_time: Start time of the owner, see `get_start_time`.
+    """
+
+    def __init__(self, directory: str = DEFAULT_ALLOC_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.pid = os.getpid()
+        self.start_time = get_start_time(self.pid)
+
+    @contextmanager
+    def _leases(self):
+        """Lock and yield leases of live processes, written back at exit."""
+
+        with _locked_leases(self.directory) as leases:
+            # Drop leases of exited processes, whose PIDs may be reused
+            for pid in [pid for pid, lease in leases.items() if _is_stale(pid, lease)]:
+                del leases[pid]
+            yield leases
+
+    def _own(self, leases: dict):
+        return leases.setdefault(str(self.pid), {
+            "start-time": self.start_time, "ports": [], "names": {}})
+
+    def reserve_port(self, base: int, count: int = 1):
+        """Reserve free consecutive TCP ports.
+
+        Args:
+            base: Lowest port to try.
+            count: Number of consecutive ports.
+
+        Returns:
+            The first port reserved.
+
+        Raises:
+            RuntimeError: No free ports from `base`.
+        """
+
+        with self._leases() as leases:
+            used = set()
+            for lease in leases.values():
+                used.update(lease.get("ports", []))
+            port = base
+            while port + count - 1 <= MAX_PORT:
+                busy = next((p for p in range(port, port + count)
+                             if p in used or not is_port_free(p)), None)
+                if busy is None:
+                    self._own(leases)["ports"].extend(range(port, port + count))
+                    return port
+                port = busy + 1
+        raise RuntimeError(f"No free TCP ports from {base}")
+
+    def reserve_ports(self, ports: Iterable[int]):
+        """Record TCP ports given explicitly, so other networks do not reserve them.
+
+        Args:
+            ports: The ports, used as given even if not free now.
+
+        Raises:
+            RuntimeError: A port is reserved by another network.
+        """
+
+        ports = set(ports)
+        with self._leases() as leases:
+            for pid, lease in leases.items():
+                taken = ports.intersection(lease.get("ports", []))
+                if pid != str(self.pid) and taken:
+                    raise RuntimeError(
+                        f"TCP ports {sorted(taken)} are reserved by process {pid}")
+            own = self._own(leases)["ports"]
+            own.extend(sorted(ports.difference(own)))
+
+    def reserve_name(self, kind: str, prefix: str):
+        """Reserve a name not used by other networks.
+
+        Args:
+            kind: Kind of the name, names of different kinds do not collide.
+            prefix: Prefix of the name, followed by the smallest free number.
+
+        Returns:
+            The name.
+        """
+
+        with self._leases() as leases:
+            used = set()
+            for lease in leases.values():
+                used.update(lease.get("names", {}).get(kind, []))
+            i = 0
+            while f"{prefix}{i}" in used:
+                i += 1
+            name = f"{prefix}{i}"
+            self._own(leases)["names"].setdefault(kind, []).append(name)
+            return name
+
+    def lease(self) -> Dict[str, Union[list, dict]]:
+        """Get ports and names reserved by this allocator and its children."""
+
+        with self._leases() as leases:
+            lease = leases.get(str(self.pid), {})
+            return {"ports": sorted(lease.get("ports", [])),
+                    "names": lease.get("names", {})}
+
+    def release(self):
+        """Release all ports and names."""
+
+        with self._leases() as leases:
+            leases.pop(str(self.pid), None)
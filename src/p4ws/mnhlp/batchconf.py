@@ -0,0 +1,411 @@
+"""Batched configuration of nodes.
+
+Configuration of a node in the net file (`intfs`, `arps`, `default-route` and
+`routes`) is compiled into one `ip -batch` script, which is applied with a
+single process per node instead of a shell round trip per item. Scripts of
+different nodes are applied in parallel.
+
+Typical usage example:
+
+    scripts = [compile_host_config(h, config) for h, config in ...]
+    apply_node_scripts(scripts)
+"""
+
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import PIPE
+from typing import Callable, Dict, List, Union
+
+from mininet.link import Intf
+from mininet.node import Node
+
+from p4ws.utils import get_type_name
+
+from .error import ParserError
+
+# Executable of iproute2
+IP_EXEC = "ip"
+
+# Max number of nodes configured at the same time
+MAX_WORKERS = 32
+
+
+class NodeScript:
+    """Compiled configuration of a node.
+
+    Commands are `ip -batch` lines. Interface attributes tracked by Mininet
+    (name, IP and MAC) are updated only after the script is applied.
+    """
+
+    def __init__(self, node: Node):
+        """Init an empty script.
+
+        Args:
+            node: Node to configure.
+        """
+
+        self.node = node
+        self.commands: List[str] = []
+        self._commits: List[Callable[[], None]] = []
+
+        # Pending states of interfaces
+        self._names: Dict[Intf, str] = {}
+        self._ips: Dict[Intf, tuple] = {}
+
+    def add(self, command: str, commit: Union[Callable[[], None], None] = None):
+        """Add an `ip -batch` line.
+
+        Args:
+            command: Command without leading `ip`.
+            commit: Callback to update Mininet states after applied.
+        """
+
+        self.commands.append(command)
+        if commit is not None:
+            self._commits.append(commit)
+
+    def name_of(self, intf: Intf):
+        """Get name of an interface after pending renames."""
+        return self._names.get(intf, intf.name)
+
+    def intf_by_name(self, name: str):
+        """Get interface by its name after pending renames, or None."""
+        for intf in self.node.intfs.values():
+            if self.name_of(intf) == name:
+                return intf
+        return None
+
+    def ip_of(self, intf: Intf):
+        """Get (IP, prefix length) of an interface after pending changes."""
+        return self._ips.get(intf, (intf.ip, intf.prefixLen))
+
+    def set_ip(self, intf: Intf, ip: str, prefix_len: int):
+        """Set IP address of an interface, like `Intf.setIP`."""
+
+        name = self.name_of(intf)
+        self._ips[intf] = (ip, prefix_len)
+
+        def commit():
+            intf.ip, intf.prefixLen = ip, prefix_len
+
+        self.add(f"addr flush dev {name}")
+        self.add(f"addr add {ip}/{prefix_len} dev {name}")
+        self.add(f"link set dev {name} up", commit)
+
+    def set_mac(self, intf: Intf, mac: str):
+        """Set MAC address of an interface, like `Intf.setMAC`."""
+
+        name = self.name_of(intf)
+        self.add(f"link set dev {name} down")
+        self.add(f"link set dev {name} address {mac}")
+        self.add(f"link set dev {name} up", lambda: setattr(intf, "mac", mac))
+
+    def rename(self, intf: Intf, new_name: str):
+        """Rename an interface, like `Intf.rename`."""
+
+        name = self.name_of(intf)
+        self._names[intf] = new_name
+
+        def commit():
+            if intf.node and intf.name in intf.node.nameToIntf:
+                intf.node.nameToIntf[new_name] = intf.node.nameToIntf.pop(
+                    intf.name)
+            intf.name = new_name
+
+        self.add(f"link set dev {name} down")
+        self.add(f"link set dev {name} name {new_name}")
+        self.add(f"link set dev {new_name} up", commit)
+
+    def set_arp(self, ip: str, mac: str, intf: Union[Intf, None] = None):
+        """Add a static ARP entry, like `Node.setARP`.
+
+        If interface not specified, the entry is bound to the interface whose
+        subnet contains the IP address, or to the default interface.
+        """
+
+        if intf is None:
+            intf = self.intf_for(ip)
+        if intf is None:
+            raise ValueError(f"No interface for ARP entry {ip} in {self.node.name}")
+        self.add(f"neigh replace {ip} lladdr {mac} nud permanent dev {self.name_of(intf)}")
+
+    def set_default_route(self, intf: Intf):
+        """Set default route, like `Node.setDefaultRoute`."""
+        self.add(f"route replace default dev {self.name_of(intf)}")
+
+    def set_host_route(self, ip: str, intf: str):
+        """Add route to host, like `Node.setHostRoute`."""
+        self.add(f"route replace {ip}/32 dev {intf}")
+
+    def networks(self):
+        """Get subnets of interfaces after pending changes.
+
+        Returns:
+            A list of (network, Intf), in order of interfaces.
+        """
+
+        networks = []
+        for intf in self.node.intfs.values():
+            intf_ip, prefix_len = self.ip_of(intf)
+            if intf_ip is None or prefix_len is None:
+                continue
+            networks.append((ipaddress.ip_interface(f"{intf_ip}/{prefix_len}").network, intf))
+        return networks
+
+    def intf_for(self, ip: Union[str, ipaddress.IPv4Address, ipaddress.IPv6Address],
+                 fallback: bool = True, networks: Union[list, None] = None):
+        """Get interface to reach an IP address directly.
+
+        Args:
+            ip: The IP address, as str or parsed.
+            fallback: Use the default interface if no subnet contains the address.
+            networks: Subnets of interfaces by `networks`, to look up many
+                addresses without parsing them again, None to get them now.
+
+        Returns:
+            An Intf, or None if not found.
+        """
+
+        addr = ipaddress.ip_address(ip) if isinstance(ip, str) else ip
+        for network, intf in self.networks() if networks is None else networks:
+            if addr in network:
+                return intf
+        return self.node.defaultIntf() if fallback else None
+
+    def commit(self):
+        """Update Mininet states after applied."""
+
+        for commit in self._commits:
+            commit()
+        self._commits.clear()
+
+
+def compile_intf(script: NodeScript, intf: Intf, conf):
+    """Compile configuration of an interface.
+
+    Args:
+        script: Script of the node owning the interface.
+        intf: A mininet.link.Intf to configured.
+        conf: The configuration.
+    """
+
+    if isinstance(conf, list):
+        conf = list(conf)
+        # [("10.0.0.1", 16), ...]
+        if (len(conf) > 0):
+            script.set_ip(intf, *conf.pop(0))
+        # [("10.0.0.1", 16), "aa:bb:cc:dd:ee:ff"]
+        if (len(conf) > 0):
+            script.set_mac(intf, conf.pop(0))
+        if conf:
+            raise ParserError(f"Unsupported `Intf`: {conf}")
+    elif isinstance(conf, dict):
+        conf = dict(conf)
+        # { "ip" : ["...", 16], "name" : "...", "mac" : "..." }
+        if "name" in conf:
+            script.rename(intf, conf.pop("name"))
+        if "ip" in conf:
+            script.set_ip(intf, *conf.pop("ip"))
+        if "mac" in conf:
+            script.set_mac(intf, conf.pop("mac"))
+        if conf:
+            raise ParserError(f"Unsupported `Intf`: {conf}")
+    else:
+        raise ParserError(f"Unsupported `Intf`: {conf}")
+
+
+def compile_intfs(script: NodeScript, intfs):
+    """Compile `intfs` of a node.
+
+    Args:
+        script: Script of the node.
+        intfs: A list for the default interface, or an object maps port numbers to configurations.
+    """
+
+    node = script.node
+    if isinstance(intfs, list):
+        # [("10.0.0.1", 16), ...]
+        intf = node.defaultIntf()
+        if intf is None:
+            raise ValueError(
+                f"No default interface in {node.name}")
+        compile_intf(script, intf, intfs)
+    elif isinstance(intfs, dict):
+        # { "0" : ?, "1" : ? }
+        for port_, c in intfs.items():
+            assert isinstance(port_, str)
+            try:
+                port = int(port_)
+            except ValueError:
+                raise ParserError(
+                    f"Port number should be str of int, not {port_}")
+
+            if port not in node.intfs:
+                raise RuntimeError(
+                    f"Port not found: {node.name}.{port}")
+            compile_intf(script, node.intfs[port], c)
+    else:
+        raise ParserError(
+            f"Unsupported `intfs` type: {get_type_name(intfs)}")
+
+
+def compile_host_config(host: Node, config: dict):
+    """Compile configuration of a host.
+
+    Args:
+        host: The host.
+        config: Configuration of the host in net file.
+
+    Returns:
+        A NodeScript.
+
+    Raises:
+        ParserError: Format of configuration is incorrect.
+        RuntimeError: Port not found.
+        ValueError: Default interface not found.
+    """
+
+    if not isinstance(config, dict):
+        raise ParserError(
+            f"`Host` should be object, not {get_type_name(config)}")
+
+    script = NodeScript(host)
+
+    # Intfs
+    if "intfs" in config:
+        compile_intfs(script, config["intfs"])
+
+    # Static ARPs
+    if "arps" in config:
+        if isinstance(config["arps"], list):
+            # [["10.0.0.1", "aa:bb:cc:dd:ee:ff"], [...], ...]
+            for item in config["arps"]:
+                if not isinstance(item, list) or len(item) != 2:
+                    raise ParserError(
+                        f"`arp` should be a pair of IP address and MAC address, not {item}")
+                ip, mac = item
+                script.set_arp(ip, mac)
+        elif isinstance(config["arps"], dict):
+            # { "10.0.0.1" : "aa:bb:cc:dd:ee:ff", ...}
+            for ip, mac in config["arps"].items():
+                script.set_arp(ip, mac)
+        else:
+            raise ParserError(
+                f"Unsupported `arps` type: {get_type_name(config['arps'])}")
+
+    # Default route
+    # 1 | "default"
+    if "default-route" in config:
+        default_route = config["default-route"]
+        if default_route == "default":
+            script.set_default_route(host.defaultIntf())
+        elif default_route in host.intfs:
+            script.set_default_route(host.intfs[default_route])
+        elif isinstance(default_route, str) and script.intf_by_name(default_route) is not None:
+            script.set_default_route(script.intf_by_name(default_route))
+        else:
+            raise ParserError(
+                f"Unknown `default-route`: {default_route}")
+
+    # Static Route
+    if "routes" in config:
+        if isinstance(config["routes"], list):
+            # [["10.0.0.1", 1], [...], ...]
+            for route in config["routes"]:
+                if not isinstance(route, list) or len(route) != 2 or not isinstance(route[0], str) or not isinstance(route[1], (int, str)):
+                    raise ParserError(
+                        f"`Host::Route` should be pair of str and int/str, not {route}")
+                ip, port = route
+                if isinstance(port, int):
+                    script.set_host_route(ip, script.name_of(host.intfs[port]))
+                else:
+                    script.set_host_route(ip, port)
+        elif isinstance(config["routes"], dict):
+            # { "10.0.0.1" : 1, ...}
+            for ip, port in config["routes"].items():
+                assert isinstance(ip, str), "IP address should be str"
+                if not isinstance(port, (int, str)):
+                    raise ParserError(
+                        f"`Host::Route::intf` should be int/str, not {get_type_name(port)}")
+                if isinstance(port, int):
+                    script.set_host_route(ip, script.name_of(host.intfs[port]))
+                else:
+                    script.set_host_route(ip, port)
+        else:
+            raise ParserError(
+                f"Unknown `routes`: {config['routes']}")
+
+    return script
+
+
+def compile_switch_config(switch: Node, config: dict):
+    """Compile configuration of a switch.
+
+    Args:
+        switch: The switch.
+        config: Configuration of the switch in net file.
+
+    Returns:
+        A NodeScript.
+
+    Raises:
+        ParserError: Format of configuration is incorrect.
+        RuntimeError: Port not found.
+        ValueError: Default interface not found.
+    """
+
+    if not isinstance(config, dict):
+        raise ParserError(
+            f"`Switch` should be object, not {get_type_name(config)}")
+
+    script = NodeScript(switch)
+
+    # Intfs
+    if "intfs" in config:
+        compile_intfs(script, config["intfs"])
+
+    return script
+
+
+def apply_node_script(script: NodeScript):
+    """Apply a script in its node by one `ip -batch` process.
+
+    Args:
+        script: Script to apply.
+
+    Raises:
+        RuntimeError: Some commands failed.
+    """
+
+    if not script.commands:
+        return
+    proc = script.node.popen([IP_EXEC, "-force", "-batch", "-"],
+                             stdin=PIPE, stdout=PIPE, stderr=PIPE)
+    _, err = proc.communicate("\n".join(script.commands).encode() + b"\n")
+    if proc.returncode != 0:
+        raise RuntimeError(
+            f"Cannot configure {script.node.name}: {err.decode(errors='replace').strip()}")
+    script.commit()
+
+
+def apply_node_scripts(scripts: List[NodeScript], max_workers: int = MAX_WORKERS):
+    """Apply scripts of nodes in parallel.
+
+    Args:
+        scripts: Scripts to apply.
+        max_workers: Max number of nodes configured at the same time.
+
+    Raises:
+        RuntimeError: Some commands failed.
+    """
+
+    scripts = [s for s in scripts if s.commands]
+    if not scripts:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(scripts)),
+                            thread_name_prefix="p4ws.mnhlp.batchconf") as executor:
+        errors = [f.exception() for f in [executor.submit(
+            apply_node_script, s) for s in scripts]]
+    errors = [e for e in errors if e is not None]
+    if errors:
+        raise RuntimeError("\n".join(str(e) for e in errors))
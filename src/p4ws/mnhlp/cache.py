@@ -0,0 +1,178 @@
+"""On-disk cache of parsed topologies.
+
+Parsing a topology file, resolving its classes and checking it against the
+net file are skipped if nothing changed since the last run. An entry is
+keyed by a hash of the topology file, the net file, the working directory
+and the sources of the parser, and is valid as long as files referenced by
+parameters of nodes, e.g. `p4_target_conf`, have the same size and
+modification time.
+
+Entries are pickles, so they are only loaded if the cache directory and the
+entry are owned by the effective user and not writable by group or others,
+and neither is a symbolic link; the directory is created with mode 0700.
+
+Typical usage example:
+
+    key = make_cache_key(topo_source, net_source)
+    entry = load_cache(cache_dir, key)
+    if entry is None:
+        entry = parse()
+        store_cache(cache_dir, key, entry, find_artifacts(topo))
+"""
+
+import hashlib
+import importlib
+import os
+import pickle
+import stat
+import sys
+import tempfile
+from typing import Dict, List, Tuple, Union
+
+from mininet.log import debug, warn
+from mininet.topo import Topo
+
+# Default directory of cache
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get(
+    "XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "p4ws", "topo")
+
+# Format of entries, increased on incompatible changes
+CACHE_FORMAT = 1
+
+# Bytes to hash at a time
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+def _stat(path: str) -> Union[Tuple[int, int], None]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _parser_sources():
+    """Get paths to sources of the parser, an entry is invalid once they change.
+
+    All modules of this package are included, as the plan is checked by many of
+    them, and `p4ws.utils`, which resolves classes.
+    """
+
+    package = os.path.dirname(os.path.abspath(__file__))
+    paths = [importlib.import_module("p4ws.utils").__file__]
+    for root, dirs, files in os.walk(package):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        paths.extend(os.path.join(root, f) for f in sorted(files) if f.endswith(".py"))
+    return paths
+
+
+def make_cache_key(*sources: Union[str, bytes, None]):
+    """Make key of an entry.
+
+    Args:
+        *sources: Paths to files, which are hashed by content, bytes which are
+            hashed as is, or None for absent sources.
+
+    Returns:
+        A hex string.
+    """
+
+    h = hashlib.sha256()
+    h.update(f"{CACHE_FORMAT}\0{sys.version}\0{os.getcwd()}\0".encode())
+    for path in _parser_sources():
+        h.update(f"{path}\0{_stat(path)}\0".encode())
+    for source in sources:
+        if source is None:
+            h.update(b"\1")
+        elif isinstance(source, bytes):
+            h.update(b"\2" + len(source).to_bytes(8, "little") + source)
+        else:
+            h.update(b"\3")
+            with open(source, "rb") as f:
+                while chunk := f.read(_HASH_CHUNK_SIZE):
+                    h.update(chunk)
+            h.update(b"\0")
+    return h.hexdigest()
+
+
+def find_artifacts(topo: Topo):
+    """Find files referenced by parameters of nodes.
+
+    Args:
+        topo: The topology.
+
+    Returns:
+        Paths to files, in order.
+    """
+
+    paths = set()
+    for name in topo.nodes(sort=False):
+        for value in topo.nodeInfo(name).values():
+            if isinstance(value, str) and value not in paths and os.path.isfile(value):
+                paths.add(value)
+    return sorted(paths)
+
+
+def _is_trusted(path: str, is_dir: bool):
+    """Check whether a path is owned by the effective user, and not writable by others."""
+
+    st = os.lstat(path)
+    if not (stat.S_ISDIR(st.st_mode) if is_dir else stat.S_ISREG(st.st_mode)):
+        return False
+    return st.st_uid == os.geteuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def load_cache(cache_dir: str, key: str):
+    """Load an entry.
+
+    Args:
+        cache_dir: Directory of cache.
+        key: Key of the entry.
+
+    Returns:
+        The value stored, or None if not found or invalid.
+    """
+
+    path = os.path.join(cache_dir, key)
+    try:
+        # Pickles of others may run code as this user
+        if not _is_trusted(cache_dir, True) or not _is_trusted(path, False):
+            warn(f"*** Cache {path} is not owned by this user or writable by others, ignored\n")
+            return None
+        with open(path, "rb") as f:
+            artifacts: Dict[str, Union[Tuple[int, int], None]] = pickle.load(f)
+            for artifact, recorded in artifacts.items():
+                if _stat(artifact) != recorded:
+                    debug(f"load_cache: {artifact} changed\n")
+                    return None
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        debug(f"load_cache: {path}: {e}\n")
+        return None
+
+
+def store_cache(cache_dir: str, key: str, value, artifacts: List[str]):
+    """Store an entry, atomically.
+
+    Args:
+        cache_dir: Directory of cache.
+        key: Key of the entry.
+        value: Value to store, pickled.
+        artifacts: Paths to files the entry depends on.
+    """
+
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    if not _is_trusted(cache_dir, True):
+        warn(f"*** Cache directory {cache_dir} is not owned by this user or writable by others, not stored\n")
+        return
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix=".tmp.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(dict((a, _stat(a)) for a in artifacts), f)
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, os.path.join(cache_dir, key))
+    except BaseException:
+        os.remove(tmp)
+        raise
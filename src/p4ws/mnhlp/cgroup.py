@@ -0,0 +1,388 @@
+"""Per-node cgroup v2 accounting and limits.
+
+`cgroups` of the net file puts each switch, and optionally each host, in its
+own cgroup under a parent of the run, e.g. `/sys/fs/cgroup/p4ws/loadmn-1234/s1`:
+
+    "cgroups": {
+        "parent": "p4ws",
+        "hosts": false,
+        "limits": { "cpu": 1.5, "memory": "2G" },
+        "nodes": { "s1": { "memory": "4G" } }
+    }
+
+- `parent`: Parent of cgroups of runs, relative to the cgroup v2 mount
+  (default: p4ws).
+- `hosts`: Put hosts in cgroups too (default: false).
+- `limits`: Limits of every node, with keys in `LIMIT_KEYS`:
+    - `cpu`: Number of CPUs, written to `cpu.max`.
+    - `memory`: Bytes, or str like `512M`, written to `memory.max`.
+    - `pids`: Max number of processes, written to `pids.max`.
+- `nodes`: Limits of nodes, override `limits`.
+
+Switch processes join their cgroups before exec, so all their memory is
+accounted, and shells of nodes are moved into them, so commands run by
+shells are accounted too. CPU time, throttling and peak memory of each node
+are read when the network is stopped.
+
+Typical usage example:
+
+    cgroups = CgroupManager(net_config["cgroups"], f"loadmn-{os.getpid()}")
+    cgroups.setup()
+    cgroups.add_nodes(net.hosts, net.switches)
+    ...
+    stop_net(net)
+    summary = cgroups.collect()
+    cgroups.remove()
+"""
+
+import os
+import re
+from typing import Dict, Iterable, List, Union
+
+from mininet.log import warn
+
+from p4ws.utils import get_type_name
+
+from .error import ParserError
+from .placement import affinity_setter
+
+# Keys of limits -> controller
+LIMIT_KEYS = {"cpu": "cpu", "memory": "memory", "pids": "pids"}
+
+# Controllers enabled for accounting if available
+CONTROLLERS = ("cpu", "memory", "pids")
+
+# Period of `cpu.max` in microseconds
+CPU_PERIOD = 100000
+
+DEFAULT_PARENT = "p4ws"
+
+_size_pattern = re.compile(r"^(\d+)([KMGT]?)$", re.IGNORECASE)
+_run_pattern = re.compile(r"^loadmn-\d+$")
+_size_units = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+def find_cgroup2_mount():
+    """Get mount point of cgroup v2, or None if not mounted."""
+
+    try:
+        with open("/proc/self/mounts") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) > 2 and fields[2] == "cgroup2":
+                    return fields[1]
+    except OSError:
+        pass
+    return None
+
+
+def _parse_limit(key: str, value):
+    if key == "cpu":
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value <= 0:
+            raise ParserError(f"`cpu` should be positive number of CPUs, not {value!r}")
+        return f"{max(1000, int(value * CPU_PERIOD))} {CPU_PERIOD}"
+    if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+        return str(value)
+    if key == "memory" and isinstance(value, str):
+        m = _size_pattern.match(value.strip())
+        if m:
+            return str(int(m.group(1)) * _size_units[m.group(2).upper()])
+    raise ParserError(
+        f"`{key}` should be positive int{' or str like `512M`' if key == 'memory' else ''}, not {value!r}")
+
+
+def parse_limits(spec: dict):
+    """Parse limits of nodes.
+
+    Returns:
+        Name of interface file of cgroup -> content.
+
+    Raises:
+        ParserError: Limits are incorrect.
+    """
+
+    if not isinstance(spec, dict):
+        raise ParserError(f"Limits should be object, not {get_type_name(spec)}")
+    limits = {}
+    for key, value in spec.items():
+        if key not in LIMIT_KEYS:
+            raise ParserError(
+                f"Unknown limit `{key}`, should be one of {', '.join(LIMIT_KEYS)}")
+        if value is not None:
+            limits[f"{LIMIT_KEYS[key]}.max"] = _parse_limit(key, value)
+    return limits
+
+
+def parse_cgroups(spec: dict):
+    """Parse `cgroups` of the net file.
+
+    Raises:
+        ParserError: `cgroups` is incorrect.
+    """
+
+    if not isinstance(spec, dict):
+        raise ParserError(f"`cgroups` should be object, not {get_type_name(spec)}")
+    for key in spec:
+        if key not in ("parent", "hosts", "limits", "nodes"):
+            raise ParserError(
+                f"Unknown key `{key}` of `cgroups`, should be one of parent, hosts, limits, nodes")
+    parent = spec.get("parent", DEFAULT_PARENT)
+    if not isinstance(parent, str) or not parent.strip("/") or ".." in parent.split("/"):
+        raise ParserError(f"`parent` should be relative path, not {parent!r}")
+    nodes = spec.get("nodes", {})
+    if not isinstance(nodes, dict):
+        raise ParserError(f"`nodes` of `cgroups` should be object, not {get_type_name(nodes)}")
+    return {
+        "parent": parent.strip("/"),
+        "hosts": bool(spec.get("hosts", False)),
+        "limits": parse_limits(spec.get("limits", {})),
+        "nodes": dict((name, parse_limits(limits)) for name, limits in nodes.items())
+    }
+
+
+def spawn_preexec(cpus: Union[Iterable[int], None] = None, cgroup: Union[str, None] = None):
+    """Get `preexec_fn` of `Popen` pinning the child to CPUs and moving it into
+    a cgroup, None if neither.
+    """
+
+    pin = affinity_setter(cpus)
+    if cgroup is None:
+        return pin
+    procs = os.path.join(cgroup, "cgroup.procs")
+
+    def preexec():
+        if pin is not None:
+            pin()
+        with open(procs, "w") as f:
+            f.write("0")
+    return preexec
+
+
+def _read_keyed(path: str):
+    """Read a flat keyed file like `cpu.stat`, empty if not exists."""
+
+    try:
+        with open(path) as f:
+            return dict((k, int(v)) for k, v in (line.split() for line in f if line.strip()))
+    except (OSError, ValueError):
+        return {}
+
+
+def _read_int(path: str):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def find_stale_cgroups(parent: str = DEFAULT_PARENT):
+    """Find cgroups of runs whose loadmn exited, e.g. crashed.
+
+    Args:
+        parent: Parent of cgroups of runs, relative to the cgroup v2 mount.
+
+    Returns:
+        Paths to cgroups of runs.
+    """
+
+    mount = find_cgroup2_mount()
+    if mount is None:
+        return []
+    root = os.path.join(mount, parent.strip("/"))
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return []
+    return sorted(os.path.join(root, name) for name in names
+                  if _run_pattern.match(name) and not os.path.exists(f"/proc/{name[7:]}")
+                  and os.path.isdir(os.path.join(root, name)))
+
+
+def get_cgroup_pids(path: str):
+    """Get PIDs of processes in cgroups of nodes of a run, and in the run."""
+
+    pids = []
+    try:
+        names = [e.name for e in os.scandir(path) if e.is_dir()]
+    except OSError:
+        return pids
+    for name in names + [""]:
+        try:
+            with open(os.path.join(path, name, "cgroup.procs")) as f:
+                pids.extend(int(pid) for pid in f.read().split())
+        except (OSError, ValueError):
+            pass
+    return pids
+
+
+def remove_cgroup(path: str):
+    """Remove cgroups of nodes of a run and the run, which should have no
+    processes.
+
+    Returns:
+        True if removed.
+    """
+
+    try:
+        names = [e.name for e in os.scandir(path) if e.is_dir()]
+    except OSError:
+        return False
+    removed = True
+    for name in names + [""]:
+        child = os.path.join(path, name) if name else path
+        try:
+            os.rmdir(child)
+        except OSError as e:
+            warn(f"*** Cannot remove cgroup {child}: {e}\n")
+            removed = False
+    return removed
+
+
+class CgroupManager:
+    """Cgroups of nodes of a run.
+
+    Attributes:
+        spec: Parsed `cgroups` of the net file.
+        path: Path to cgroup of the run.
+        controllers: Controllers enabled for cgroups of nodes.
+    """
+
+    def __init__(self, spec: dict, name: str):
+        """Parse `cgroups`.
+
+        Args:
+            spec: `cgroups` of the net file.
+            name: Name of cgroup of the run.
+
+        Raises:
+            ParserError: `cgroups` is incorrect.
+            RuntimeError: cgroup v2 is not mounted.
+        """
+
+        self.spec = parse_cgroups(spec)
+        mount = find_cgroup2_mount()
+        if mount is None:
+            raise RuntimeError("cgroup v2 is not mounted")
+        self.mount = mount
+        self.path = os.path.join(mount, self.spec["parent"], name)
+        self.controllers: List[str] = []
+
+    def setup(self):
+        """Create cgroup of the run, and enable controllers for its children.
+
+        Raises:
+            RuntimeError: Cgroups cannot be created, or controllers used by
+                limits are not available.
+        """
+
+        needed = set(LIMIT_KEYS[key.split(".")[0]]
+                     for limits in [self.spec["limits"]] + list(self.spec["nodes"].values())
+                     for key in limits)
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            # Controllers are enabled from the mount down to the run
+            relative = os.path.relpath(self.path, self.mount).split(os.sep)
+            path = self.mount
+            for part in [""] + relative:
+                path = os.path.join(path, part) if part else path
+                with open(os.path.join(path, "cgroup.controllers")) as f:
+                    available = f.read().split()
+                enabled = []
+                for controller in CONTROLLERS:
+                    if controller not in available:
+                        continue
+                    try:
+                        with open(os.path.join(path, "cgroup.subtree_control"), "w") as f:
+                            f.write(f"+{controller}")
+                        enabled.append(controller)
+                    except OSError as e:
+                        if controller in needed:
+                            raise RuntimeError(f"Cannot enable {controller} of {path}: {e}")
+                self.controllers = enabled
+        except OSError as e:
+            raise RuntimeError(f"Cannot create cgroup {self.path}: {e}")
+        missing = needed.difference(self.controllers)
+        if missing:
+            self.remove()
+            raise RuntimeError(
+                f"Controllers not available for limits: {', '.join(sorted(missing))}")
+
+    def add_node(self, node, is_switch: bool):
+        """Create cgroup of a node, and move its shell into it.
+
+        Sets `cgroup` of the node, joined by processes of switches at spawn.
+
+        Returns:
+            Path to cgroup of the node, or None for hosts not in cgroups.
+
+        Raises:
+            OSError: Cgroup cannot be created or limited.
+        """
+
+        if not is_switch and not self.spec["hosts"]:
+            return None
+        path = os.path.join(self.path, node.name)
+        os.makedirs(path, exist_ok=True)
+        limits = dict(self.spec["limits"])
+        limits.update(self.spec["nodes"].get(node.name, {}))
+        for file, value in limits.items():
+            with open(os.path.join(path, file), "w") as f:
+                f.write(value)
+        node.cgroup = path
+        if node.shell is not None:
+            try:
+                with open(os.path.join(path, "cgroup.procs"), "w") as f:
+                    f.write(str(node.pid))
+            except OSError as e:
+                warn(f"*** Cannot move {node.name} into cgroup: {e}\n")
+        return path
+
+    def add_nodes(self, hosts: Iterable, switches: Iterable):
+        """Create cgroups of nodes, see `add_node`.
+
+        Returns:
+            Number of nodes in cgroups.
+        """
+
+        count = 0
+        for nodes, is_switch in ((hosts, False), (switches, True)):
+            for node in nodes:
+                if self.add_node(node, is_switch) is not None:
+                    count += 1
+        return count
+
+    def collect(self):
+        """Read resource usage of nodes, also after they are stopped.
+
+        Returns:
+            Name of node -> usage, None for values not accounted:
+                - `cpu-time`: CPU time in seconds.
+                - `throttled-time`: Seconds throttled by `cpu.max`.
+                - `throttled-periods`: Number of periods throttled.
+                - `memory-peak`: Peak memory usage in bytes.
+                - `oom-kills`: Number of processes killed by `memory.max`.
+        """
+
+        summary: Dict[str, dict] = {}
+        try:
+            names = sorted(e.name for e in os.scandir(self.path) if e.is_dir())
+        except OSError:
+            return summary
+        for name in names:
+            path = os.path.join(self.path, name)
+            cpu = _read_keyed(os.path.join(path, "cpu.stat"))
+            events = _read_keyed(os.path.join(path, "memory.events"))
+            summary[name] = {
+                "cpu-time": cpu["usage_usec"] / 1e6 if "usage_usec" in cpu else None,
+                "throttled-time": cpu["throttled_usec"] / 1e6 if "throttled_usec" in cpu else None,
+                "throttled-periods": cpu.get("nr_throttled"),
+                "memory-peak": _read_int(os.path.join(path, "memory.peak")),
+                "oom-kills": events.get("oom_kill")
+            }
+        return summary
+
+    def remove(self):
+        """Remove cgroups of nodes and the run, which should have no processes."""
+
+        remove_cgroup(self.path)
@@ -2,11 +2,17 @@
 
 
 class ParserError(ValueError):
-    """Error raised when format of file is incorrect."""
+    """Error raised when format of file is incorrect.
 
-    def __init__(self, msg):
-        ValueError.__init__(self, msg)
+    Attributes:
+        msg: Message of the error.
+        path: JSON path to the incorrect value, e.g. `$.links[3]`, or None.
+    """
+
+    def __init__(self, msg, path=None):
+        ValueError.__init__(self, msg if path is None else f"{path}: {msg}")
         self.msg = msg
+        self.path = path
 
     def __reduce__(self):
-        return self.__class__, (self.msg)
+        return self.__class__, (self.msg, self.path)
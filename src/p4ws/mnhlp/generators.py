@@ -0,0 +1,252 @@
+"""Parametric topology generators.
+
+Generators build hosts, switches and links of common fabrics, so large
+topologies need no large files. Each generator yields items lazily, nodes
+first and then links, with deterministic names and port numbers:
+
+- `("host", name, role)`
+- `("switch", name, role)`
+- `("link", node1, node2, port1, port2)`
+
+Hosts use port 0, like Mininet, and switches count ports from 1. Names of
+nodes are numbered from 1 in order of generation, and prefixed by `prefix`.
+
+Typical usage example, in the topology file:
+
+    "generators": [
+        { "type": "fat-tree", "k": 4, "switch-class": "simple-switch" }
+    ]
+
+or as `--topo-file gen:fat-tree?k=4` of loadmn.
+"""
+
+from typing import Dict, Iterator
+from urllib.parse import parse_qsl, urlsplit
+
+from p4ws.utils import get_type_name
+
+from .error import ParserError
+
+# Prefix of `--topo-file` to use a generator
+GENERATOR_URI_SCHEME = "gen"
+
+
+def _get_int(args: dict, name: str, default=None, minimum: int = 1):
+    """Get an int argument of a generator."""
+
+    value = args.pop(name, default)
+    if value is None:
+        raise ParserError(f"`{name}` is required")
+    if not isinstance(value, int) or isinstance(value, bool) or value < minimum:
+        raise ParserError(
+            f"`{name}` should be int not less than {minimum}, not {value}")
+    return value
+
+
+def _check_no_args(args: dict):
+    if args:
+        raise ParserError(f"Unknown arguments: {', '.join(args)}")
+
+
+def fat_tree(args: dict, prefix: str = "") -> Iterator[tuple]:
+    """Generate a k-ary fat-tree.
+
+    There are k pods, each of k/2 edge switches (`e`) and k/2 aggregation
+    switches (`a`), and (k/2)^2 core switches (`c`). Each edge switch has
+    k/2 hosts (`h`).
+
+    Ports of edge and aggregation switches: 1 to k/2 down, k/2+1 to k up.
+    Port p+1 of a core switch is linked to pod p.
+
+    Args:
+        args: `k` (even, default 4).
+        prefix: Prefix of node names.
+    """
+
+    k = _get_int(args, "k", 4, 2)
+    if k % 2:
+        raise ParserError(f"`k` should be even, not {k}")
+    _check_no_args(args)
+    half = k // 2
+
+    def core(i): return f"{prefix}c{i + 1}"
+    def agg(pod, j): return f"{prefix}a{pod * half + j + 1}"
+    def edge(pod, j): return f"{prefix}e{pod * half + j + 1}"
+    def host(pod, j, m): return f"{prefix}h{(pod * half + j) * half + m + 1}"
+
+    for i in range(half * half):
+        yield ("switch", core(i), "core")
+    for pod in range(k):
+        for j in range(half):
+            yield ("switch", agg(pod, j), "agg")
+        for j in range(half):
+            yield ("switch", edge(pod, j), "edge")
+    for pod in range(k):
+        for j in range(half):
+            for m in range(half):
+                yield ("host", host(pod, j, m), "host")
+
+    for pod in range(k):
+        for j in range(half):
+            for m in range(half):
+                yield ("link", host(pod, j, m), edge(pod, j), 0, m + 1)
+        for j in range(half):
+            for m in range(half):
+                yield ("link", edge(pod, j), agg(pod, m), half + m + 1, j + 1)
+        for j in range(half):
+            for m in range(half):
+                yield ("link", agg(pod, j), core(j * half + m), half + m + 1, pod + 1)
+
+
+def leaf_spine(args: dict, prefix: str = "") -> Iterator[tuple]:
+    """Generate a leaf-spine fabric.
+
+    Every leaf switch (`l`) is linked to every spine switch (`s`), and has
+    hosts (`h`).
+
+    Ports of a leaf switch: 1 to hosts down, hosts+1 to hosts+spines up.
+    Port l+1 of a spine switch is linked to leaf l.
+
+    Args:
+        args: `leaves` (default 4), `spines` (default 2), `hosts` per leaf (default 1).
+        prefix: Prefix of node names.
+    """
+
+    leaves = _get_int(args, "leaves", 4)
+    spines = _get_int(args, "spines", 2)
+    hosts = _get_int(args, "hosts", 1, 0)
+    _check_no_args(args)
+
+    def spine(i): return f"{prefix}s{i + 1}"
+    def leaf(i): return f"{prefix}l{i + 1}"
+    def host(i, m): return f"{prefix}h{i * hosts + m + 1}"
+
+    for i in range(spines):
+        yield ("switch", spine(i), "spine")
+    for i in range(leaves):
+        yield ("switch", leaf(i), "leaf")
+    for i in range(leaves):
+        for m in range(hosts):
+            yield ("host", host(i, m), "host")
+
+    for i in range(leaves):
+        for m in range(hosts):
+            yield ("link", host(i, m), leaf(i), 0, m + 1)
+        for j in range(spines):
+            yield ("link", leaf(i), spine(j), hosts + j + 1, i + 1)
+
+
+def torus(args: dict, prefix: str = "") -> Iterator[tuple]:
+    """Generate a 2D torus of x * y switches.
+
+    Switch (i, j) is named `t{i * y + j + 1}`, and is linked to its east
+    (i, j+1) and south (i+1, j) neighbors, with wrap-around. A dimension of
+    size 1 has no links.
+
+    Ports of a switch: 1 to hosts down, then east, west, south and north.
+
+    Args:
+        args: `x` (default 4), `y` (default 4), `hosts` per switch (default 1).
+        prefix: Prefix of node names.
+    """
+
+    x = _get_int(args, "x", 4)
+    y = _get_int(args, "y", 4)
+    hosts = _get_int(args, "hosts", 1, 0)
+    _check_no_args(args)
+    east, west, south, north = hosts + 1, hosts + 2, hosts + 3, hosts + 4
+
+    def switch(i, j): return f"{prefix}t{(i % x) * y + (j % y) + 1}"
+    def host(i, j, m): return f"{prefix}h{(i * y + j) * hosts + m + 1}"
+
+    for i in range(x):
+        for j in range(y):
+            yield ("switch", switch(i, j), "switch")
+    for i in range(x):
+        for j in range(y):
+            for m in range(hosts):
+                yield ("host", host(i, j, m), "host")
+
+    for i in range(x):
+        for j in range(y):
+            for m in range(hosts):
+                yield ("link", host(i, j, m), switch(i, j), 0, m + 1)
+            if y > 1:
+                yield ("link", switch(i, j), switch(i, j + 1), east, west)
+            if x > 1:
+                yield ("link", switch(i, j), switch(i + 1, j), south, north)
+
+
+# Generators by name
+GENERATORS = {
+    "fat-tree": fat_tree,
+    "leaf-spine": leaf_spine,
+    "torus": torus
+}
+
+
+def generate(spec: dict) -> Iterator[tuple]:
+    """Generate items of a generator spec.
+
+    Args:
+        spec: `type`, `prefix`, style keys `host-class`, `switch-class`,
+            `link-class` and `{role}-class`, and arguments of the generator.
+
+    Returns:
+        An iterator of items, see module docs, with role of nodes replaced by
+        name of class, and name of class appended to links, None for default.
+
+    Raises:
+        ParserError: Format of spec is incorrect.
+    """
+
+    if not isinstance(spec, dict):
+        raise ParserError(
+            f"`generator` should be object, not {get_type_name(spec)}")
+    args = dict(spec)
+    t = args.pop("type", None)
+    if t not in GENERATORS:
+        raise ParserError(
+            f"Unknown generator `{t}`, should be one of {', '.join(GENERATORS)}")
+    prefix = args.pop("prefix", "")
+    if not isinstance(prefix, str):
+        raise ParserError(
+            f"`prefix` should be str, not {get_type_name(prefix)}")
+    styles: Dict[str, str] = {}
+    for key in list(args):
+        if key.endswith("-class"):
+            styles[key[:-len("-class")]] = args.pop(key)
+
+    for item in GENERATORS[t](args, prefix):
+        if item[0] == "link":
+            yield item + (styles.get("link"),)
+        else:
+            kind, name, role = item
+            yield (kind, name, styles.get(role, styles.get(kind)))
+
+
+def parse_generator_uri(uri: str):
+    """Parse a generator URI, e.g. `gen:fat-tree?k=8`.
+
+    Values of int are converted, others, `prefix` and classes are kept as str.
+
+    Args:
+        uri: The URI.
+
+    Returns:
+        A generator spec, or None if not a generator URI.
+    """
+
+    parts = urlsplit(uri)
+    if parts.scheme != GENERATOR_URI_SCHEME:
+        return None
+    spec = {"type": parts.path}
+    for key, value in parse_qsl(parts.query, keep_blank_values=True):
+        if key == "prefix" or key.endswith("-class"):
+            spec[key] = value
+            continue
+        try:
+            spec[key] = int(value)
+        except ValueError:
+            spec[key] = value
+    return spec
@@ -0,0 +1,175 @@
+"""Incremental reading of large json files.
+
+`JsonStreamReader` walks objects and arrays of a json document key by key and
+item by item, and decodes only one item at a time by `json.JSONDecoder`, so
+memory is bounded by the largest item instead of the whole document.
+
+Typical usage example:
+
+    reader = JsonStreamReader(fp)
+    for key in reader.iter_object():
+        if key == "hosts":
+            for index in reader.iter_array():
+                print(reader.read_value())
+        else:
+            reader.skip_value()
+"""
+
+import json
+from typing import Iterator, TextIO, Union
+
+# Characters to read at a time
+CHUNK_SIZE = 1 << 16
+
+_whitespace = " \t\n\r"
+
+# Characters continuing a number, e.g. `1.` and `1e` are decoded as 1
+_number_chars = "0123456789+-.eE"
+
+
+class JsonStreamReader:
+    """Incremental reader of a json document.
+
+    Keys and indexes yielded by `iter_object` and `iter_array` must be
+    followed by reading their values by `read_value`, `skip_value`, or
+    nested iterations, before iterating on.
+    """
+
+    def __init__(self, fp: TextIO, chunk_size: int = CHUNK_SIZE):
+        """Read a json document from a file.
+
+        Args:
+            fp: File object to be read.
+            chunk_size: Characters to read at a time.
+        """
+
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        # Characters dropped before `buf`
+        self.offset = 0
+        self.eof = False
+
+    def _fill(self, size: int):
+        """Read more characters, and drop consumed ones."""
+
+        if self.pos:
+            self.offset += self.pos
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        chunk = self.fp.read(size)
+        if not chunk:
+            self.eof = True
+        self.buf += chunk
+
+    def _error(self, msg: str, pos: Union[int, None] = None):
+        """Make a decode error, positioned by characters from the beginning of file."""
+
+        pos = self.offset + (self.pos if pos is None else pos)
+        e = json.JSONDecodeError(msg, self.buf, 0)
+        e.args = (f"{msg}: char {pos}",)
+        e.pos, e.lineno, e.colno = pos, None, None
+        return e
+
+    def peek(self):
+        """Get the next non-whitespace character, or "" at the end."""
+
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _whitespace:
+                self.pos += 1
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._fill(self.chunk_size)
+
+    def _expect(self, chars: str):
+        c = self.peek()
+        if not c or c not in chars:
+            raise self._error(f"Expecting one of {chars!r}")
+        self.pos += 1
+        return c
+
+    def read_value(self):
+        """Decode the next value.
+
+        Returns:
+            The value.
+
+        Raises:
+            json.decoder.JSONDecodeError: Format of json is incorrect.
+        """
+
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise self._error(e.msg, e.pos) from None
+            else:
+                # A number may continue in the next chunk
+                if (end < len(self.buf) and self.buf[end] not in _number_chars) or self.eof:
+                    self.pos = end
+                    return value
+            # Grow reads, so a large value is not decoded too many times
+            self._fill(size)
+            size *= 2
+
+    def skip_value(self):
+        """Skip the next value, item by item for objects and arrays."""
+
+        c = self.peek()
+        if c == "{":
+            for _ in self.iter_object():
+                self.skip_value()
+        elif c == "[":
+            for _ in self.iter_array():
+                self.skip_value()
+        else:
+            self.read_value()
+
+    def iter_object(self) -> Iterator[str]:
+        """Iterate keys of the next object.
+
+        Returns:
+            An iterator of keys.
+
+        Raises:
+            json.decoder.JSONDecodeError: Format of json is incorrect.
+        """
+
+        self._expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != "\"":
+                raise self._error("Expecting property name enclosed in double quotes")
+            key = self.read_value()
+            self._expect(":")
+            yield key
+            if self._expect(",}") == "}":
+                return
+
+    def iter_array(self) -> Iterator[int]:
+        """Iterate indexes of the next array.
+
+        Returns:
+            An iterator of indexes.
+
+        Raises:
+            json.decoder.JSONDecodeError: Format of json is incorrect.
+        """
+
+        self._expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self._expect(",]") == "]":
+                return
@@ -0,0 +1,241 @@
+"""Link emulation profiles.
+
+A profile names link properties (bandwidth, delay, jitter, loss and queue
+length), defined in `link-profiles` of the topology file and referred by
+`profile` of links or link classes:
+
+    "link-profiles": {
+        "wan": { "bw": 100, "delay": "10ms", "jitter": "1ms", "loss": 0.1 }
+    },
+    "links": [ [ "h1", "s1", { "profile": "wan" } ] ]
+
+Both interfaces of a link are shaped by one netem qdisc. Qdiscs of a node are
+changed by one `tc -batch` process, and nodes are changed in parallel. The
+applied profile of each interface is tracked, so changing a profile only
+touches interfaces whose profile changed.
+
+Typical usage example:
+
+    shaper = LinkShaper(topo.link_profiles)
+    shaper.apply(net.links)
+    shaper.set_profile("wan", {"delay": "20ms"}, net.links)
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import PIPE
+from typing import Dict, Iterable, List, Union
+
+from mininet.link import Intf, Link
+from mininet.log import debug
+from mininet.node import Node
+
+from p4ws.utils import get_type_name
+
+from .error import ParserError
+
+# Executable of tc
+TC_EXEC = "tc"
+
+# Max number of nodes changed at the same time
+MAX_WORKERS = 32
+
+# Handle of root qdisc added
+QDISC_HANDLE = "10:"
+
+# Keys of a profile, same as options of `mininet.link.TCIntf`
+PROFILE_KEYS = ("bw", "delay", "jitter", "loss", "max_queue_size")
+
+_time_pattern = re.compile(r"^\d+(\.\d+)?(us|ms|s)$")
+
+
+def _parse_time(key: str, value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0:
+        return f"{value:g}ms"
+    if isinstance(value, str) and _time_pattern.match(value):
+        return value
+    raise ParserError(
+        f"`{key}` should be milliseconds or str like `10ms`, not {value!r}")
+
+
+def parse_link_profile(spec: dict):
+    """Parse a profile.
+
+    Args:
+        spec: The profile, with keys in `PROFILE_KEYS`:
+            - `bw`: Bandwidth in Mbit/s.
+            - `delay`: Delay, milliseconds or str like `10ms`.
+            - `jitter`: Jitter of delay, like `delay`.
+            - `loss`: Loss in percent.
+            - `max_queue_size`: Queue length in packets.
+
+    Returns:
+        The profile, with times as str.
+
+    Raises:
+        ParserError: Profile is incorrect.
+    """
+
+    if not isinstance(spec, dict):
+        raise ParserError(
+            f"`link-profile` should be object, not {get_type_name(spec)}")
+    profile = {}
+    for key, value in spec.items():
+        if key not in PROFILE_KEYS:
+            raise ParserError(
+                f"Unknown key `{key}` of `link-profile`, should be one of {', '.join(PROFILE_KEYS)}")
+        if value is None:
+            continue
+        if key in ("delay", "jitter"):
+            value = _parse_time(key, value)
+        elif key == "max_queue_size":
+            if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+                raise ParserError(
+                    f"`max_queue_size` should be positive int, not {value!r}")
+        elif not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+            raise ParserError(f"`{key}` should be non-negative number, not {value!r}")
+        elif key == "loss" and value > 100:
+            raise ParserError(f"`loss` should be percent, not {value!r}")
+        profile[key] = value
+    if "jitter" in profile and "delay" not in profile:
+        raise ParserError("`jitter` needs `delay`")
+    return profile
+
+
+def tc_commands(intf: str, profile: Union[dict, None], applied: Union[dict, None] = None):
+    """Get `tc -batch` lines changing an interface to a profile.
+
+    Args:
+        intf: Name of the interface.
+        profile: Profile to apply, None or empty to remove shaping.
+        applied: Profile applied now, None if not shaped.
+
+    Returns:
+        Lines without leading `tc`.
+    """
+
+    if not profile:
+        return [f"qdisc del dev {intf} root"] if applied else []
+    args = [f"qdisc replace dev {intf} root handle {QDISC_HANDLE} netem"]
+    if "max_queue_size" in profile:
+        args.append(f"limit {profile['max_queue_size']}")
+    if "delay" in profile:
+        args.append(f"delay {profile['delay']}")
+        if "jitter" in profile:
+            args.append(profile["jitter"])
+    if "loss" in profile:
+        args.append(f"loss {profile['loss']:g}%")
+    if "bw" in profile:
+        args.append(f"rate {profile['bw']:g}mbit")
+    return [" ".join(args)]
+
+
+def apply_tc_commands(node: Node, commands: List[str]):
+    """Run `tc -batch` lines in a node.
+
+    Raises:
+        RuntimeError: Some commands failed.
+    """
+
+    proc = node.popen([TC_EXEC, "-force", "-batch", "-"],
+                      stdin=PIPE, stdout=PIPE, stderr=PIPE)
+    _, err = proc.communicate("\n".join(commands).encode() + b"\n")
+    if proc.returncode != 0:
+        raise RuntimeError(
+            f"Cannot shape links of {node.name}: {err.decode(errors='replace').strip()}")
+
+
+class LinkShaper:
+    """Applier of link profiles, tracking profiles applied to interfaces.
+
+    Attributes:
+        profiles: Name -> profile.
+        applied: Interface -> profile applied.
+    """
+
+    def __init__(self, profiles: Union[Dict[str, dict], None] = None):
+        self.profiles = dict(profiles or {})
+        self.applied: Dict[Intf, dict] = {}
+
+    def desired(self, link: Link):
+        """Get profile of a link, or None."""
+
+        name = getattr(link, "profile", None)
+        if name is None:
+            return None
+        if name not in self.profiles:
+            raise ParserError(f"Link profile `{name}` undefined")
+        return self.profiles[name]
+
+    def apply(self, links: Iterable[Link], max_workers: int = MAX_WORKERS):
+        """Apply profiles to interfaces of links whose profile changed.
+
+        Args:
+            links: Links, e.g. `net.links`.
+            max_workers: Max number of nodes changed at the same time.
+
+        Returns:
+            Number of interfaces changed.
+
+        Raises:
+            ParserError: Profile of a link undefined.
+            RuntimeError: Some commands failed.
+        """
+
+        commands: Dict[Node, List[str]] = {}
+        changes: Dict[Node, List[tuple]] = {}
+        for link in links:
+            profile = self.desired(link)
+            for intf in (link.intf1, link.intf2):
+                # Ends owned by other processes, see `StitchedLink`
+                if intf is None:
+                    continue
+                applied = self.applied.get(intf)
+                if (profile or None) == applied:
+                    continue
+                lines = tc_commands(intf.name, profile, applied)
+                commands.setdefault(intf.node, []).extend(lines)
+                changes.setdefault(intf.node, []).append((intf, profile or None))
+        if not changes:
+            return 0
+
+        debug(f"*** Shaping {sum(len(c) for c in changes.values())} interfaces\n")
+        nodes = [node for node in changes if commands.get(node)]
+        errors = []
+        if nodes:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(nodes)),
+                                    thread_name_prefix="p4ws.mnhlp.linkprofile") as executor:
+                futures = dict((node, executor.submit(
+                    apply_tc_commands, node, commands[node])) for node in nodes)
+            for node, future in futures.items():
+                if future.exception() is not None:
+                    errors.append(future.exception())
+                    changes.pop(node)
+
+        count = 0
+        for node_changes in changes.values():
+            for intf, profile in node_changes:
+                if profile is None:
+                    self.applied.pop(intf, None)
+                else:
+                    self.applied[intf] = profile
+                count += 1
+        if errors:
+            raise RuntimeError("\n".join(str(e) for e in errors))
+        return count
+
+    def set_profile(self, name: str, spec: Union[dict, None], links: Iterable[Link]):
+        """Define or change a profile, and apply it to links using it.
+
+        Args:
+            name: Name of the profile.
+            spec: The profile, see `parse_link_profile`, None to remove shaping
+                of links using it.
+            links: Links, e.g. `net.links`.
+
+        Returns:
+            Number of interfaces changed.
+        """
+
+        self.profiles[name] = parse_link_profile(spec) if spec is not None else {}
+        return self.apply(links)
@@ -0,0 +1,164 @@
+"""Mininet Link of batched veth pairs.
+
+`mininet.link.Link` creates each veth pair by a shell round trip, and brings
+each interface up by another one. `BatchLink` queues veth pairs instead, and
+creates, names, moves into namespaces and brings up all of them by one
+`ip -batch` process, when any interface is first used or `flush_links` is
+called.
+
+Nodes may name their interfaces at creation by providing `intf_name(port)`,
+e.g. `TofinoModel` names them `veth{N}`. Other interfaces are prefixed by
+`BatchLink.intf_prefix`, so concurrent networks do not collide in the root
+namespace.
+
+Typical usage example:
+
+    net = Mininet(topo, link=BatchLink, intf=BatchIntf)
+    flush_links()
+"""
+
+import subprocess
+from typing import List, Union
+
+from mininet.link import Intf, Link
+from mininet.log import debug
+from mininet.node import Node
+
+# Executable of iproute2
+IP_EXEC = "ip"
+
+# Commands of veth pairs not created yet
+_pending_commands: List[str] = []
+# Names of interfaces not created yet
+_pending_intfs = set()
+
+
+def _veth_end(name: str, addr: Union[str, None], node: Union[Node, None]):
+    """Get arguments of an end of a veth pair."""
+
+    args = f"name {name}"
+    if addr is not None:
+        args += f" address {addr}"
+    if node is not None:
+        args += f" netns {node.pid}"
+    return args + " up"
+
+
+def queue_veth_pair(intf1: str, intf2: str,
+                    addr1: Union[str, None] = None, addr2: Union[str, None] = None,
+                    node1: Union[Node, None] = None, node2: Union[Node, None] = None):
+    """Queue a veth pair to create.
+
+    Args:
+        intf1: Name for interface 1.
+        intf2: Name for interface 2.
+        addr1: MAC address for interface 1 (optional).
+        addr2: MAC address for interface 2 (optional).
+        node1: Home node for interface 1, None for root namespace.
+        node2: Home node for interface 2, None for root namespace.
+    """
+
+    _pending_commands.append(
+        f"link add {_veth_end(intf1, addr1, node1)} type veth peer {_veth_end(intf2, addr2, node2)}")
+    _pending_intfs.update((intf1, intf2))
+
+
+def flush_links():
+    """Create all queued veth pairs by one `ip -batch` process.
+
+    Raises:
+        Exception: Failed to create interface pairs, like `mininet.util.makeIntfPair`.
+    """
+
+    if not _pending_commands:
+        return
+    script = "\n".join(_pending_commands) + "\n"
+    debug(f"*** Creating {len(_pending_commands)} veth pairs\n")
+    _pending_commands.clear()
+    _pending_intfs.clear()
+    result = subprocess.run([IP_EXEC, "-batch", "-"], input=script.encode(),
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    if result.returncode != 0:
+        raise Exception(
+            f"Error creating interface pairs: {result.stdout.decode(errors='replace')}")
+
+
+def is_pending(intf: str):
+    """Check whether an interface is queued but not created yet."""
+    return intf in _pending_intfs
+
+
+class BatchIntf(Intf):
+    """Interface of `BatchLink`.
+
+    Queued veth pairs are created before the interface is first used, and
+    interfaces are already up at creation.
+    """
+
+    def config(self, up=True, **params):
+        """Configure the interface, see `Intf.config`."""
+
+        # Brought up at creation
+        if up is True and is_pending(self.name):
+            up = None
+        return super().config(up=up, **params)
+
+    def cmd(self, *args, **kwargs):
+        """Run a command in the owning node after queued veth pairs created."""
+
+        flush_links()
+        return super().cmd(*args, **kwargs)
+
+
+class BatchLink(Link):
+    """Link of batched veth pairs.
+
+    Typical usage example:
+
+        net = Mininet(topo, link=BatchLink, intf=BatchIntf)
+        flush_links()
+    """
+
+    # Prefix of names of interfaces, e.g. reserved by `ResourceAllocator`
+    intf_prefix = ""
+
+    def __init__(self, node1, node2, intf=BatchIntf, cls1=None, cls2=None,
+                 profile=None, **params):
+        """Create a veth link, see `Link.__init__`.
+
+        Interfaces of class `Intf` are replaced with `BatchIntf`, and `fast`
+        is always enabled, since interfaces are created in namespaces.
+        The pair is created immediately if any interface is not a `BatchIntf`.
+
+        Args:
+            profile: Name of link profile, applied by `LinkShaper`, or None.
+        """
+
+        self.profile = profile
+
+        if intf is Intf:
+            intf = BatchIntf
+        self.batched = all(isinstance(c, type) and issubclass(c, BatchIntf)
+                           for c in (cls1 or intf, cls2 or intf))
+        params["fast"] = True
+        super().__init__(node1, node2, intf=intf, cls1=cls1, cls2=cls2, **params)
+
+    def intfName(self, node, n):
+        """Get name of interface of port n, `intf_name` of node is preferred."""
+
+        if hasattr(node, "intf_name"):
+            return node.intf_name(n)
+        return BatchLink.intf_prefix + super().intfName(node, n)
+
+    def makeIntfPair(self, intfname1, intfname2, addr1=None, addr2=None,
+                     node1=None, node2=None, deleteIntfs=True):
+        """Queue a veth pair, see `Link.makeIntfPair`.
+
+        Pairs that replace existing interfaces are created immediately.
+        """
+
+        if deleteIntfs or not self.batched:
+            flush_links()
+            return Link.makeIntfPair(intfname1, intfname2, addr1, addr2,
+                                     node1, node2, deleteIntfs)
+        queue_veth_pair(intfname1, intfname2, addr1, addr2, node1, node2)
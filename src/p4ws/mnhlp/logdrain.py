@@ -0,0 +1,321 @@
+"""Non-blocking drain of outputs of switch processes.
+
+Outputs of switches piped to `PIPE` (the default of `sw_stdout` and
+`sw_stderr`) are read by one selector thread for all switches, so a model
+never blocks on a full pipe. The last bytes of each stream are kept in a ring
+buffer, and optionally spilled to files, rotated by size and compressed by
+gzip in the background:
+
+    <spill_dir>/<node>.<stream>.log
+    <spill_dir>/<node>.<stream>.log.1.gz
+    ...
+
+Reading only appends to buffers and files. When a spill file cannot be
+written fast enough, the operating system buffers the writes; the drain never
+stops reading pipes, and errors of spill files only disable spilling.
+
+Typical usage example:
+
+    set_log_drain(LogDrain(buffer_size=4 << 20, spill_dir="/tmp/logs"))
+    drain_process("s1", proc)
+    print(get_log_drain().tail("s1", "stderr"))
+"""
+
+import gzip
+import os
+import queue
+import selectors
+import shutil
+import threading
+from typing import Dict, Tuple, Union
+
+from mininet.log import error
+
+# Default bytes kept of each stream
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+# Default bytes of a spill file before rotated
+DEFAULT_SPILL_SIZE = 64 << 20
+
+# Default number of compressed spill files kept
+DEFAULT_SPILL_BACKUPS = 4
+
+# Bytes to read at a time
+_READ_SIZE = 1 << 16
+
+
+class RingBuffer:
+    """Bytes buffer keeping the last `capacity` bytes written.
+
+    The buffer grows as bytes are written, and wraps once it is full, so
+    quiet streams take little memory.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.buffer = bytearray()
+        # Total bytes written
+        self.written = 0
+
+    def write(self, data: bytes):
+        data = memoryview(data)[-self.capacity:] if self.capacity else b""
+        grown = min(len(data), self.capacity - len(self.buffer))
+        self.buffer += data[:grown]
+        self.written += grown
+        data = data[grown:]
+        start = self.written % self.capacity if self.capacity else 0
+        first = min(len(data), self.capacity - start)
+        self.buffer[start:start + first] = data[:first]
+        self.buffer[:len(data) - first] = data[first:]
+        self.written += len(data)
+
+    def getvalue(self, size: Union[int, None] = None):
+        """Get the last `size` bytes kept, None for all."""
+
+        kept = min(self.written, self.capacity)
+        size = kept if size is None else min(size, kept)
+        end = self.written % self.capacity if self.capacity else 0
+        start = end - size
+        if start >= 0:
+            return bytes(self.buffer[start:end])
+        return bytes(self.buffer[start:]) + bytes(self.buffer[:end])
+
+
+class SpillFile:
+    """File of a stream, rotated by size and compressed in the background.
+
+    Attributes:
+        path: Path to the current file.
+        max_bytes: Bytes of the current file before rotated.
+        backups: Number of compressed files kept.
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_SPILL_SIZE,
+                 backups: int = DEFAULT_SPILL_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file = open(path, "ab")
+        self.size = self.file.tell()
+        # Rotated files, compressed in order by one thread
+        self._rotated: "queue.Queue[Union[str, None]]" = queue.Queue()
+        self._compressor: Union[threading.Thread, None] = None
+        self._count = 0
+
+    def write(self, data: bytes):
+        self.file.write(data)
+        self.size += len(data)
+        if self.size >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        """Start a new file, the old one is compressed in the background."""
+
+        self.file.close()
+        self._count += 1
+        rotated = f"{self.path}.r{self._count}"
+        os.replace(self.path, rotated)
+        self.file = open(self.path, "ab")
+        self.size = 0
+        self._rotated.put(rotated)
+        if self._compressor is None:
+            self._compressor = threading.Thread(
+                target=self._compress, name="p4ws.mnhlp.logdrain.compress", daemon=True)
+            self._compressor.start()
+
+    def _compress(self):
+        while True:
+            rotated = self._rotated.get()
+            if rotated is None:
+                return
+            try:
+                for i in range(self.backups - 1, 0, -1):
+                    if os.path.exists(f"{self.path}.{i}.gz"):
+                        os.replace(f"{self.path}.{i}.gz", f"{self.path}.{i + 1}.gz")
+                if self.backups > 0:
+                    with open(rotated, "rb") as src, gzip.open(f"{self.path}.gz.tmp", "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+                    os.replace(f"{self.path}.gz.tmp", f"{self.path}.1.gz")
+                if os.path.exists(f"{self.path}.{self.backups + 1}.gz"):
+                    os.remove(f"{self.path}.{self.backups + 1}.gz")
+                os.remove(rotated)
+            except OSError as e:
+                error(f"*** Cannot compress {rotated}: {e}\n")
+
+    def close(self):
+        """Close the file, after rotated files are compressed."""
+
+        self.file.close()
+        if self._compressor is not None:
+            self._rotated.put(None)
+            self._compressor.join()
+            self._compressor = None
+
+
+class LogDrain:
+    """Drain of pipes of many processes by one selector thread.
+
+    Attributes:
+        buffer_size: Bytes kept of each stream.
+        spill_dir: Directory of spill files, None for no spilling.
+        spill_size: Bytes of a spill file before rotated.
+        spill_backups: Number of compressed spill files kept of each stream.
+        buffers: (node, stream) -> RingBuffer, kept after the process exits.
+    """
+
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 spill_dir: Union[str, None] = None,
+                 spill_size: int = DEFAULT_SPILL_SIZE,
+                 spill_backups: int = DEFAULT_SPILL_BACKUPS):
+        """Create the drain, its thread is started by the first `register`.
+
+        Raises:
+            ValueError: Sizes are not positive.
+            OSError: `spill_dir` cannot be created.
+        """
+
+        if buffer_size < 0 or spill_size <= 0:
+            raise ValueError("Sizes of buffers and spill files should be positive")
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+        self.buffer_size = buffer_size
+        self.spill_dir = spill_dir
+        self.spill_size = spill_size
+        self.spill_backups = spill_backups
+        self.buffers: Dict[Tuple[str, str], RingBuffer] = {}
+        self._spills: Dict[Tuple[str, str], SpillFile] = {}
+        self._lock = threading.Lock()
+        # Created by the first register, so a drain set before forking
+        # workers is not shared by them
+        self._selector = None
+        self._wakeup_r = self._wakeup_w = None
+        self._pending = []
+        self._thread = None
+
+    def register(self, node: str, stream: str, pipe):
+        """Drain a pipe, until its end.
+
+        Args:
+            node: Name of the node.
+            stream: Name of the stream, e.g. `stdout`.
+            pipe: Read end of the pipe, owned and closed by the drain.
+        """
+
+        key = (node, stream)
+        with self._lock:
+            if key not in self.buffers:
+                self.buffers[key] = RingBuffer(self.buffer_size)
+            if self.spill_dir is not None and key not in self._spills:
+                try:
+                    self._spills[key] = SpillFile(
+                        os.path.join(self.spill_dir, f"{node}.{stream}.log"),
+                        self.spill_size, self.spill_backups)
+                except OSError as e:
+                    error(f"*** Cannot spill {stream} of {node}: {e}\n")
+            os.set_blocking(pipe.fileno(), False)
+            self._pending.append((pipe, key))
+            if self._thread is None:
+                self._selector = selectors.DefaultSelector()
+                # Wakes the thread to register pipes
+                self._wakeup_r, self._wakeup_w = os.pipe()
+                os.set_blocking(self._wakeup_r, False)
+                os.set_blocking(self._wakeup_w, False)
+                self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+                self._thread = threading.Thread(
+                    target=self._run, name="p4ws.mnhlp.logdrain", daemon=True)
+                self._thread.start()
+        try:
+            os.write(self._wakeup_w, b"\0")
+        except BlockingIOError:
+            pass
+
+    def tail(self, node: str, stream: str, size: Union[int, None] = None):
+        """Get the last bytes of a stream as str.
+
+        Args:
+            node: Name of the node.
+            stream: Name of the stream.
+            size: Bytes to get, None for all kept.
+
+        Raises:
+            KeyError: Stream not drained.
+        """
+
+        with self._lock:
+            data = self.buffers[(node, stream)].getvalue(size)
+        return data.decode(errors="replace")
+
+    def _run(self):
+        while True:
+            for key, _ in self._selector.select():
+                if key.data is None:
+                    try:
+                        while os.read(self._wakeup_r, _READ_SIZE):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    with self._lock:
+                        pending, self._pending = self._pending, []
+                    for pipe, stream_key in pending:
+                        self._selector.register(pipe, selectors.EVENT_READ, stream_key)
+                    continue
+                try:
+                    chunk = os.read(key.fd, _READ_SIZE)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    chunk = b""
+                if not chunk:
+                    self._selector.unregister(key.fileobj)
+                    key.fileobj.close()
+                    continue
+                with self._lock:
+                    self.buffers[key.data].write(chunk)
+                    spill = self._spills.get(key.data)
+                    if spill is not None:
+                        try:
+                            spill.write(chunk)
+                        except OSError as e:
+                            error(f"*** Cannot spill {key.data[1]} of {key.data[0]}: {e}\n")
+                            self._spills.pop(key.data).close()
+
+    def close(self):
+        """Close spill files, pipes are drained until their ends."""
+
+        with self._lock:
+            for spill in self._spills.values():
+                spill.close()
+            self._spills.clear()
+
+
+_log_drain: Union[LogDrain, None] = None
+
+
+def get_log_drain():
+    """Get the drain of switches, created with defaults on first use."""
+
+    global _log_drain
+    if _log_drain is None:
+        _log_drain = LogDrain()
+    return _log_drain
+
+
+def set_log_drain(drain: LogDrain):
+    """Set the drain of switches, before they are started."""
+
+    global _log_drain
+    _log_drain = drain
+
+
+def drain_process(node: str, proc):
+    """Drain outputs of a process piped to `PIPE`, by the drain of switches.
+
+    Args:
+        node: Name of the node.
+        proc: The process, a `subprocess.Popen`.
+    """
+
+    for stream in ("stdout", "stderr"):
+        pipe = getattr(proc, stream)
+        if pipe is not None:
+            get_log_drain().register(node, stream, pipe)
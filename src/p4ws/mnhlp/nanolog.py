@@ -0,0 +1,153 @@
+"""Subscriber of nanolog events of bmv2 switches.
+
+Each switch publishes events on its nanolog IPC socket, by `nanolog_sock`,
+or by `nanolog_dir` of `SimpleSwitch` for switches without one. The
+subscriber connects to all of them before they start, as nanomsg reconnects
+until a switch binds its socket and after it is restarted. Messages are
+received by a thread per switch, decoded and handed over in batches to one
+writer thread, which appends them to an event store, see `p4ws.events`.
+
+Events published while no subscriber is connected are dropped by the switch,
+never waited for, so logging does not slow the switch down.
+
+Requires `nnpy`, the Python binding of nanomsg also used by bmv2 tools.
+
+Typical usage example:
+
+    subscriber = NanologSubscriber("/tmp/events", {"s1": ("ipc:///tmp/s1.ipc", "s1.json")})
+    subscriber.start()
+    ...
+    print(subscriber.stop())
+"""
+
+import queue
+import threading
+import time
+from typing import Dict, List, Tuple, Union
+
+from mininet.log import debug, error
+
+from p4ws.events import EventWriter, decode_message, load_names
+
+# Max number of events of a batch
+BATCH_SIZE = 4096
+
+# Seconds between checks of stopping and flushes of batches not full
+FLUSH_INTERVAL = 0.2
+
+
+class NanologSubscriber:
+    """Subscriber writing events of switches to an event store.
+
+    Attributes:
+        path: Path to the event store.
+        switches: Name of switch -> (address of nanolog socket, path to bmv2 JSON or None).
+        dropped: Number of messages not decoded.
+    """
+
+    def __init__(self, path: str, switches: Dict[str, Tuple[str, Union[str, None]]]):
+        self.path = path
+        self.switches = dict(switches)
+        self.dropped = 0
+        self._batches: "queue.Queue[Union[Tuple[int, float, List[tuple]], None]]" = queue.Queue()
+        self._stopped = threading.Event()
+        self._receivers: List[threading.Thread] = []
+        self._writer_thread = None
+        self._writer = None
+
+    def start(self):
+        """Create the store, and connect to sockets of switches.
+
+        Raises:
+            RuntimeError: `nnpy` is not installed, or the store cannot be created.
+        """
+
+        try:
+            import nnpy
+        except ImportError:
+            raise RuntimeError("nnpy is required to subscribe nanolog events of switches")
+        names = list(self.switches)
+        try:
+            self._writer = EventWriter(self.path, names, dict(
+                (name, load_names(p4_json)) for name, (_, p4_json) in self.switches.items()))
+        except OSError as e:
+            raise RuntimeError(f"Cannot create event store: {e}")
+
+        self._stopped.clear()
+        self._writer_thread = threading.Thread(
+            target=self._write, name="p4ws.mnhlp.nanolog.writer", daemon=True)
+        self._writer_thread.start()
+        for index, name in enumerate(names):
+            sock = nnpy.Socket(nnpy.AF_SP, nnpy.SUB)
+            sock.setsockopt(nnpy.SUB, nnpy.SUB_SUBSCRIBE, "")
+            sock.setsockopt(nnpy.SOL_SOCKET, nnpy.RCVTIMEO, int(FLUSH_INTERVAL * 1000))
+            sock.connect(self.switches[name][0])
+            receiver = threading.Thread(
+                target=self._receive, args=(index, sock), name=f"p4ws.mnhlp.nanolog.{name}",
+                daemon=True)
+            receiver.start()
+            self._receivers.append(receiver)
+
+    def _receive(self, index: int, sock):
+        from nnpy.errors import NNError
+
+        batch: List[tuple] = []
+        received = time.time()
+        try:
+            while not self._stopped.is_set():
+                try:
+                    msg = sock.recv()
+                except NNError:
+                    # Timed out, or interrupted
+                    msg = None
+                if msg is not None:
+                    if not batch:
+                        received = time.time()
+                    try:
+                        batch.append(decode_message(msg))
+                    except ValueError as e:
+                        debug(f"{e}\n")
+                        self.dropped += 1
+                if batch and (msg is None or len(batch) >= BATCH_SIZE):
+                    self._batches.put((index, received, batch))
+                    batch = []
+        finally:
+            if batch:
+                self._batches.put((index, received, batch))
+            sock.close()
+
+    def _write(self):
+        while True:
+            batch = self._batches.get()
+            if batch is None:
+                break
+            self._writer.append(*batch)
+            # Flush what is queued at once
+            if self._batches.empty():
+                try:
+                    self._writer.flush()
+                except OSError as e:
+                    error(f"*** Cannot write events: {e}\n")
+
+    def stop(self):
+        """Disconnect, after switches are stopped, and write events received.
+
+        Returns:
+            Number of events written.
+        """
+
+        self._stopped.set()
+        for receiver in self._receivers:
+            receiver.join()
+        self._receivers = []
+        if self._writer_thread is not None:
+            self._batches.put(None)
+            self._writer_thread.join()
+            self._writer_thread = None
+        if self._writer is None:
+            return 0
+        try:
+            self._writer.close()
+        except OSError as e:
+            error(f"*** Cannot write events: {e}\n")
+        return self._writer.rows
@@ -0,0 +1,221 @@
+"""Mininet Node of NamespaceHost.
+
+This class represents a Mininet host which is only a network namespace with
+its interfaces. It inherits from `mininet.node.Host`, but keeps no interactive
+shell or pty alive: the namespace is held by a `sleep` process, and each
+command runs on demand in a new process attached to the namespace by
+`mnexec -a` (setns).
+
+Typical usage example:
+
+    net.addHost("foo", cls=NamespaceHost)
+
+Notes
+-----
+As each command runs in a new shell, shell states like working directory,
+variables and jobs are not kept between commands.
+"""
+
+import os
+import re
+import select
+import signal
+from subprocess import DEVNULL, PIPE, STDOUT, Popen
+from typing import List, Union
+
+from mininet.log import debug, error
+from mininet.node import Host
+
+from p4ws.mnhlp.cgroup import spawn_preexec
+from p4ws.state import make_node_mark
+from p4ws.utils import NODE_ENV
+
+
+class NamespaceHost(Host):
+    """Mininet Node of NamespaceHost.
+
+    This class represents a Mininet host which is only a network namespace with
+    its interfaces, without a resident shell.
+
+    Typical usage example:
+
+        net.addHost("foo", cls=NamespaceHost)
+
+    Attributes
+    ----------
+    shell : Popen | None
+        Process holding the namespace.
+    proc : Popen | None
+        Process of the running command, None if no command running.
+    cpus : List[int] | None
+        CPUs commands are pinned to, set by `apply_placement`, None for all.
+    cgroup : str | None
+        Path to cgroup commands join, set by `CgroupManager`, None for no cgroup.
+    """
+
+    # Shell to run commands
+    shell_exec = "bash"
+
+    proc: Union[Popen, None] = None
+    cpus: Union[List[int], None] = None
+    cgroup: Union[str, None] = None
+
+    def startShell(self, mnopts=None):
+        """Start a process holding the namespace, instead of a shell.
+
+        Args:
+            mnopts: Options of mnexec, default to close descriptors and detach from tty.
+        """
+
+        if self.shell:
+            error(f"{self.name}: namespace is already held\n")
+            return
+        opts = "-cd" if mnopts is None else mnopts
+        if self.inNamespace:
+            opts += "n"
+        self.shell = self._popen(["mnexec", opts, "env", f"{NODE_ENV}={make_node_mark(self.name)}", "sleep", "infinity"],
+                                 stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL)
+        self.pid = self.shell.pid
+        self.proc = None
+        self.stdin, self.stdout = None, None
+        self.pollOut = select.poll()
+        self.execed = False
+        self.lastCmd = None
+        self.lastPid = None
+        self.readbuf = ""
+        self.waiting = False
+
+    def sendCmd(self, *args, **kwargs):
+        """Run a command in the namespace, without waiting for it to complete.
+
+        Args:
+            args: Command and arguments, or string.
+            printPid: Set `lastPid` to PID of the command (False).
+        """
+
+        assert self.shell and not self.waiting
+        printPid = kwargs.get("printPid", False)
+        # Allow sendCmd( [ list ] )
+        if len(args) == 1 and isinstance(args[0], list):
+            cmd = args[0]
+        # Allow sendCmd( cmd, arg1, arg2... )
+        elif len(args) > 0:
+            cmd = args
+        # Convert to string
+        if not isinstance(cmd, str):
+            cmd = " ".join([str(c) for c in cmd])
+        if not re.search(r"\w", cmd):
+            # Replace empty commands with something harmless
+            cmd = "echo -n"
+        self.lastCmd = cmd
+        self.lastPid = None
+
+        self.background = cmd.rstrip().endswith("&")
+        if self.background:
+            # Detach output of the backgrounded command, and print its PID
+            script = f"exec 3>&1 </dev/null >/dev/null 2>&1; {cmd.rstrip()[:-1]} 3>&- & echo $! >&3"
+        else:
+            script = cmd
+
+        self.proc = self.popen([NamespaceHost.shell_exec, "-c", script],
+                               stdin=PIPE, stdout=PIPE, stderr=STDOUT,
+                               preexec_fn=spawn_preexec(self.cpus, self.cgroup))
+        if printPid and not self.background:
+            self.lastPid = self.proc.pid
+        self.stdin, self.stdout = self.proc.stdin, self.proc.stdout
+        self.pollOut = select.poll()
+        self.pollOut.register(self.stdout)
+        self.outToNode[self.stdout.fileno()] = self
+        self.inToNode[self.stdin.fileno()] = self
+        self.waiting = True
+
+    def sendInt(self, intr=chr(3)):
+        """Interrupt running command."""
+
+        if self.proc is not None and self.proc.poll() is None:
+            debug(f"sendInt: interrupting {self.proc.pid}\n")
+            os.killpg(self.proc.pid, signal.SIGINT)
+
+    def write(self, data):
+        """Write data to running command.
+
+        Args:
+            data: String.
+        """
+
+        if self.proc is not None and self.proc.poll() is None:
+            os.write(self.stdin.fileno(), data.encode())
+
+    def waitReadable(self, timeoutms=None):
+        """Wait until output of running command is readable.
+
+        Args:
+            timeoutms: Timeout in ms or None to wait indefinitely.
+
+        Returns:
+            Result of poll().
+        """
+
+        if len(self.readbuf) == 0:
+            return self.pollOut.poll(timeoutms)
+        return True
+
+    def monitor(self, timeoutms=None, findPid=True):
+        """Monitor and return the output of running command.
+
+        Set `waiting` to False if command has completed.
+
+        Args:
+            timeoutms: Timeout in ms or None to wait indefinitely.
+            findPid: Set `lastPid` for backgrounded commands.
+
+        Returns:
+            Output read.
+        """
+
+        if not self.waiting:
+            return ""
+        ready = self.waitReadable(timeoutms)
+        if not ready:
+            return ""
+        if self.readbuf:
+            data, self.readbuf = self.readbuf, ""
+            return data
+
+        chunk = os.read(self.stdout.fileno(), 1024)
+        data = self.decoder.decode(chunk, final=not chunk)
+        if not chunk:
+            self.__finish_cmd()
+        if self.background:
+            if findPid and data.strip().isdigit():
+                self.lastPid = int(data.strip())
+            return ""
+        return data
+
+    def __finish_cmd(self):
+        """Clean up the completed command."""
+
+        assert self.proc is not None
+        self.proc.wait()
+        self.outToNode.pop(self.stdout.fileno(), None)
+        self.inToNode.pop(self.stdin.fileno(), None)
+        self.pollOut.unregister(self.stdout)
+        self.stdin.close()
+        self.stdout.close()
+        self.proc = None
+        self.waiting = False
+
+    def cleanup(self):
+        """Kill running command and release the namespace."""
+
+        if self.proc is not None:
+            if self.proc.poll() is None:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            self.__finish_cmd()
+        if self.shell:
+            if self.shell.poll() is None:
+                self.shell.kill()
+            if self.waitExited:
+                debug("waiting for", self.pid, "to terminate\n")
+                self.shell.wait()
+        self.shell = None
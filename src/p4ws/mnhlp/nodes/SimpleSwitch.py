@@ -10,16 +10,22 @@ Typical usage example:
 """
 
 import os
-import socket
 import threading
+import time
 from subprocess import PIPE, Popen
-from typing import Literal, TextIO, Union
+from typing import Callable, List, Literal, TextIO, Union
 
 from mininet.link import Intf
 from mininet.log import debug, error, info
 from mininet.node import Switch
 
+from p4ws.mnhlp.cgroup import spawn_preexec
+from p4ws.mnhlp.logdrain import drain_process
+from p4ws.mnhlp.readiness import min_timeout, wait_for_tcp_server
+from p4ws.mnhlp.startup import wait_for_switches
+from p4ws.state import make_node_mark
 from p4ws.targets import bmv2
+from p4ws.utils import NODE_ENV
 
 
 class SimpleSwitch(Switch):
@@ -57,10 +63,43 @@ class SimpleSwitch(Switch):
          Standard output for model, str for a file, see Popen for more details.
     sw_stderr : TextIO | int | None
         Standard error for model, str for a file, see Popen for more details.
+    batch : bool
+        Defer waiting for the Thrift server to `batchStartup`.
+    ready_timeout : float | None
+        Seconds to wait for the server of this switch, None for no deadline.
+    start_time : float | None
+        Monotonic time when the model process was spawned.
+    startup_latency : float | None
+        Seconds from spawning the model until its server is ready.
+    cpus : List[int] | None
+        CPUs the model process is pinned to, set by `apply_placement`, None for all.
+    cgroup : str | None
+        Path to cgroup the model process joins, set by `CgroupManager`, None for no cgroup.
     """
 
     listen_port_base = 9090
 
+    # Allocator of ports not given, a `ResourceAllocator`, None to count from the bases
+    port_allocator = None
+
+    # Overall deadline of batch startup in seconds, None for no deadline
+    startup_timeout: Union[float, None] = None
+
+    # Called with the switch and its exit code, or None if not started in time,
+    # instead of exiting, e.g. `Supervisor.on_crash`
+    on_crash: Union[Callable[["SimpleSwitch", Union[int, None]], None], None] = None
+
+    # Directory of nanolog IPC sockets of switches without `nanolog_sock`,
+    # None to not publish their events
+    nanolog_dir: Union[str, None] = None
+
+    cpus: Union[List[int], None] = None
+    cgroup: Union[str, None] = None
+
+    sw = None
+    _is_killed = False
+    _sw_daemon = None
+
     def __init__(self, name,
                  p4_target_conf: str,
                  *,
@@ -74,6 +113,8 @@ class SimpleSwitch(Switch):
                  pcaps_dir: Union[str, None] = None,
                  sw_stdout: Union[TextIO, int, str, None] = PIPE,
                  sw_stderr: Union[TextIO, int, str, None] = PIPE,
+                 batch: bool = False,
+                 ready_timeout: Union[float, None] = None,
                  **kwargs):
         """Initialize a SimpleSwitch.
 
@@ -84,13 +125,15 @@ class SimpleSwitch(Switch):
 
         ### RPC Parameters
 
-        listenPort : int
-            TCP port on which to run the Thrift runtime server. (default is 9090)
+        listenPort : int | None
+            TCP port on which to run the Thrift runtime server. If None, a port
+            is reserved by `port_allocator`, or counted from 9090 (default: None).
 
         ### Logging Parameters
 
         nanolog_sock : str | None
-            IPC socket to use for nanomsg pub/sub logs. If None, nanolog is disabled (default: None).
+            IPC socket to use for nanomsg pub/sub logs. If None, a socket in `nanolog_dir`, or
+            nanolog is disabled if it is None (default: None).
         log_console : bool
             Log to console (stdout). (default is False)
         log_file : str | None
@@ -107,9 +150,17 @@ class SimpleSwitch(Switch):
         ### Output Parameters
 
         sw_stdout : _FILE | str | None
-            Standard output for model, str for a file, see Popen for more details (default: PIPE).
+            Standard output for model, str for a file, see Popen for more details (default: PIPE, drained by `p4ws.mnhlp.logdrain`).
         sw_stderr : _FILE | str | None
-            Standard error for model, str for a file, see Popen for more details (default: PIPE).
+            Standard error for model, str for a file, see Popen for more details (default: PIPE, drained by `p4ws.mnhlp.logdrain`).
+
+        ### Startup Parameters
+
+        batch : bool
+            Only spawn the model in `start`, and wait for all models concurrently
+            in `batchStartup`. Mininet enables it when building from a topology (default: False).
+        ready_timeout : float | None
+            Seconds to wait for the server of this switch. If None, wait until the overall deadline (default: None).
         """
         super().__init__(name, **kwargs)
 
@@ -117,9 +168,13 @@ class SimpleSwitch(Switch):
         self.p4_target_conf = p4_target_conf
 
         # RPC
-        if self.listenPort is not None:
-            self.listenPort = SimpleSwitch.listen_port_base
-            SimpleSwitch.listen_port_base += 1
+        if self.listenPort is None:
+            if SimpleSwitch.port_allocator is not None:
+                self.listenPort = SimpleSwitch.port_allocator.reserve_port(
+                    SimpleSwitch.listen_port_base)
+            else:
+                self.listenPort = SimpleSwitch.listen_port_base
+                SimpleSwitch.listen_port_base += 1
         if not isinstance(self.listenPort, int) or self.listenPort <= 0 or self.listenPort > 65535:
             raise ValueError(
                 f"Invalid listenPort: {self.listenPort}")
@@ -127,6 +182,8 @@ class SimpleSwitch(Switch):
         # Logging
         if nanolog_sock is not None and not isinstance(nanolog_sock, str):
             raise ValueError("Invalid type of nanolog_sock")
+        if nanolog_sock is None and SimpleSwitch.nanolog_dir is not None:
+            nanolog_sock = f"ipc://{os.path.join(SimpleSwitch.nanolog_dir, name)}.ipc"
         self.nanolog_sock = nanolog_sock
 
         if log_file is not None and not isinstance(log_file, str):
@@ -161,6 +218,14 @@ class SimpleSwitch(Switch):
         self.sw_stdout = sw_stdout
         self.sw_stderr = sw_stderr
 
+        # Startup
+        self.batch = bool(batch)
+        if ready_timeout is not None and (not isinstance(ready_timeout, (int, float)) or ready_timeout <= 0):
+            raise ValueError(f"Invalid ready_timeout: {ready_timeout}")
+        self.ready_timeout = ready_timeout
+        self.start_time = None
+        self.startup_latency = None
+
     @classmethod
     def setup(cls):
         SimpleSwitch.ld_library_path, SimpleSwitch.simple_switch_exec = bmv2.get_bmv2_simple_switch()[
@@ -179,7 +244,8 @@ class SimpleSwitch(Switch):
         # simple_switch args
         # executable
         args = [SimpleSwitch.simple_switch_exec if exec is None else exec]
-        env = {"LD_LIBRARY_PATH": SimpleSwitch.ld_library_path if ld_library_path is None else ld_library_path}
+        env = {"LD_LIBRARY_PATH": SimpleSwitch.ld_library_path if ld_library_path is None else ld_library_path,
+               NODE_ENV: make_node_mark(self.name)}
 
         # Ports
         ports_args = []
@@ -228,7 +294,11 @@ class SimpleSwitch(Switch):
             args.extend(extra_args)
 
         self.sw = self.popen(
-            args, env=env, stdout=sw_stdout, stderr=sw_stderr)
+            args, env=env, stdout=sw_stdout, stderr=sw_stderr,
+            preexec_fn=spawn_preexec(self.cpus, self.cgroup))
+        drain_process(self.name, self.sw)
+        self.start_time = time.monotonic()
+        self.startup_latency = None
 
         debug(f"SimpleSwitch PID is {self.sw.pid}.\n")
 
@@ -238,10 +308,46 @@ class SimpleSwitch(Switch):
             target=self.__sw_daemon_proc, name=f"SimpleSwitch.__switch_daemon", args=(), daemon=True)
         self._sw_daemon.start()
 
-        if not self.wait_for_server_start():
+        # Waited in `batchStartup`
+        if self.batch:
+            return
+
+        if not self.wait_for_server_start(SimpleSwitch.startup_timeout):
             error(
                 f"SimpleSwitch not started successfully.\n")
+            if SimpleSwitch.on_crash is not None:
+                SimpleSwitch.on_crash(self, None)
+                return
             exit(1)
+        self.startup_latency = time.monotonic() - self.start_time
+
+    @classmethod
+    def batchStartup(cls, switches):
+        """Wait for spawned switches concurrently.
+
+        Called by `Mininet.start` after all switches are spawned, so bring-up
+        time depends on the slowest switch instead of the sum of all of them.
+
+        Args:
+            switches: Switches of this class.
+
+        Returns:
+            Switches started.
+        """
+
+        batched = [s for s in switches if s.batch]
+        latencies = wait_for_switches(batched, SimpleSwitch.startup_timeout)
+        failed = [s.name for s, latency in latencies.items()
+                  if latency is None]
+        if failed:
+            error(
+                f"{cls.__name__} not started successfully: {', '.join(failed)}.\n")
+            if SimpleSwitch.on_crash is None:
+                exit(1)
+            for s, latency in latencies.items():
+                if latency is None:
+                    SimpleSwitch.on_crash(s, None)
+        return switches
 
     def stop(self):
         """Shutdown the model.
@@ -260,6 +366,58 @@ class SimpleSwitch(Switch):
         self.sw.wait()
         self._sw_daemon.join()
 
+    def restart(self, timeout: Union[float, None] = None):
+        """Restart the model with the same interfaces and ports.
+
+        Unlike `start`, failures do not exit the program.
+
+        Parameters
+        ----------
+        timeout : float | None
+            Seconds to wait for the server, None for `startup_timeout`.
+
+        Returns
+        -------
+        started : bool
+            True if server available, or False if the model shut down or timed out.
+        """
+
+        if isinstance(self.sw, Popen):
+            self.stop()
+        batch, self.batch = self.batch, True
+        try:
+            self.start([])
+        finally:
+            self.batch = batch
+        if not self.wait_for_server_start(
+                SimpleSwitch.startup_timeout if timeout is None else timeout):
+            return False
+        self.startup_latency = time.monotonic() - self.start_time
+        return True
+
+    @classmethod
+    def batchShutdown(cls, switches):
+        """Shutdown switches concurrently.
+
+        Called by `Mininet.stop`. All models are killed first, and then reaped,
+        so shutdown time does not grow with the number of switches.
+
+        Args:
+            switches: Switches of this class.
+
+        Returns:
+            Switches stopped.
+        """
+
+        started = [s for s in switches if isinstance(s.sw, Popen)]
+        for s in started:
+            s._is_killed = True
+            s.sw.kill()
+        for s in started:
+            s.sw.wait()
+            s._sw_daemon.join()
+        return switches
+
     @staticmethod
     def __do_switch_shutdown(return_code: int, is_killed: bool):
         """Event: switch shutdown.
@@ -284,26 +442,30 @@ class SimpleSwitch(Switch):
         poll = self.sw.poll()
         assert poll is not None
         self.__do_switch_shutdown(poll, self._is_killed)
+        if not self._is_killed and SimpleSwitch.on_crash is not None:
+            SimpleSwitch.on_crash(self, poll)
 
-    def wait_for_server_start(self):
+    def wait_for_server_start(self, timeout: Union[float, None] = None):
         """Waiting until model shell CLI available.
 
         Notes
         -----
         When SimpleSwitch started, Thrift server may be not just available, this function wait until it prepared.
 
+        Parameters
+        ----------
+        timeout : float | None
+            Seconds to wait, None for waiting forever.
+
         Returns
         -------
         available : bool
-            True if server available, or False if SimpleSwitch shut down.
+            True if server available, or False if SimpleSwitch shut down or timed out.
         """
         assert isinstance(self.sw, Popen)
-        while True:
-            if self.sw.poll() is not None:
-                return False
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(0.5)
-            result = sock.connect_ex(("localhost", self.listenPort))
-            if result == 0:
-                sock.close()
-                return True
+        sock = wait_for_tcp_server(self.sw, ("localhost", self.listenPort),
+                                   min_timeout(timeout, self.ready_timeout))
+        if sock is None:
+            return False
+        sock.close()
+        return True
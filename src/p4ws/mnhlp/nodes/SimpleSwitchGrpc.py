@@ -10,11 +10,11 @@ Typical usage example:
 """
 
 import os
-import socket
 from subprocess import Popen
 from typing import Union
 
 from p4ws.mnhlp.nodes.SimpleSwitch import SimpleSwitch
+from p4ws.mnhlp.readiness import min_timeout, wait_for_tcp_server
 from p4ws.targets import bmv2
 
 
@@ -62,8 +62,8 @@ class SimpleSwitchGrpc(SimpleSwitch):
         ### RPC Parameters
 
         grpc_server_port : int | None
-            TCP port on which to run the gRPC server. If None, an available port
-            starting from 9559 will be assigned automatically.
+            TCP port on which to run the gRPC server. If None, a port is reserved
+            by `SimpleSwitch.port_allocator`, or counted from 9559.
         grpc_server_ssl : bool
             Whether to use SSL/TLS for gRPC server connection.
         grpc_server_cacert : str | None
@@ -83,9 +83,13 @@ class SimpleSwitchGrpc(SimpleSwitch):
 
         # RPC
         if grpc_server_port is None:
-            self.grpc_server_addr = ("0.0.0.0",
-                                     SimpleSwitchGrpc.grpc_listen_port_base)
-            SimpleSwitchGrpc.grpc_listen_port_base += 1
+            if SimpleSwitch.port_allocator is not None:
+                self.grpc_server_addr = ("0.0.0.0", SimpleSwitch.port_allocator.reserve_port(
+                    SimpleSwitchGrpc.grpc_listen_port_base))
+            else:
+                self.grpc_server_addr = ("0.0.0.0",
+                                         SimpleSwitchGrpc.grpc_listen_port_base)
+                SimpleSwitchGrpc.grpc_listen_port_base += 1
         elif not isinstance(grpc_server_port, int) or not (0 < grpc_server_port < 65536):
             raise ValueError(
                 f"Invalid gRPC server port number: {grpc_server_port}")
@@ -140,25 +144,27 @@ class SimpleSwitchGrpc(SimpleSwitch):
         super().start(controllers, SimpleSwitchGrpc.simple_switch_grpc_exec,
                       SimpleSwitchGrpc.ld_library_path, extra_args)
 
-    def wait_for_server_start(self):
+    def wait_for_server_start(self, timeout: Union[float, None] = None):
         """Waiting until model shell CLI available.
 
         Notes
         -----
         When SimpleSwitchGrpc started, gRPC server may be not just available, this function wait until it prepared.
 
+        Parameters
+        ----------
+        timeout : float | None
+            Seconds to wait, None for waiting forever.
+
         Returns
         -------
         available : bool
-            True if server available, or False if SimpleSwitchGrpc shut down.
+            True if server available, or False if SimpleSwitchGrpc shut down or timed out.
         """
         assert isinstance(self.sw, Popen)
-        while True:
-            if self.sw.poll() is not None:
-                return False
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(0.5)
-            result = sock.connect_ex(self.grpc_server_addr)
-            if result == 0:
-                sock.close()
-                return True
+        sock = wait_for_tcp_server(self.sw, self.grpc_server_addr,
+                                   min_timeout(timeout, self.ready_timeout))
+        if sock is None:
+            return False
+        sock.close()
+        return True
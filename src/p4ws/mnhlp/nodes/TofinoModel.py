@@ -12,9 +12,9 @@ Typical usage example:
 
 import json
 import os
-import socket
 import tempfile
 import threading
+import time
 from enum import Enum
 from subprocess import PIPE, Popen
 from typing import List, TextIO, Tuple, Union
@@ -23,7 +23,18 @@ from mininet.link import Intf
 from mininet.log import debug, error, info
 from mininet.node import Switch
 
+from p4ws.mnhlp.cgroup import spawn_preexec
+from p4ws.mnhlp.logdrain import drain_process
+from p4ws.mnhlp.readiness import min_timeout, wait_for_tcp_server
+from p4ws.state import make_node_mark
 from p4ws.targets import bfsde
+from p4ws.utils import NODE_ENV
+
+# Number of ports reserved from the dru_sim port base
+DRU_SIM_PORTS = 4
+
+# Number of veth ids reserved for a model by `port_allocator`, enough for 42 instances
+VETH_BLOCK = 1 << 16
 
 
 class ChipArch(Enum):
@@ -96,6 +107,18 @@ class TofinoModel(Switch):
          Standard output for model, str for a file, see Popen for more details.
     sw_stderr : TextIO | int | None
         Standard error for model, str for a file, see Popen for more details.
+    ready_timeout : float | None
+        Seconds to wait for the model CLI, None for no deadline.
+    start_time : float | None
+        Monotonic time when the model process was spawned.
+    startup_latency : float | None
+        Seconds from spawning the model until its CLI is ready.
+    cpus : List[int] | None
+        CPUs of this instance, set by `apply_placement`. The model shared by all
+        instances is pinned to CPUs of all of them, None for all.
+    cgroup : str | None
+        Path to cgroup of this instance, set by `CgroupManager`. The model shared by
+        all instances joins the cgroup of the instance starting it, None for no cgroup.
     """
 
     num_of_instances = 0
@@ -106,6 +129,21 @@ class TofinoModel(Switch):
 
     cli_port = 8000
 
+    # Allocator of ports not given, a `ResourceAllocator`, None for 8000 and 8001
+    port_allocator = None
+    # Ports reserved for all instances, as they share one model
+    _allocated_ports: Union[Tuple[int, int], None] = None
+    # First veth id of the model, a block reserved by `port_allocator`, or 0 without it
+    _veth_base: Union[int, None] = None
+
+    # Overall deadline of startup in seconds, None for no deadline
+    startup_timeout: Union[float, None] = None
+
+    start_time = None
+    startup_latency = None
+    cpus: Union[List[int], None] = None
+    cgroup: Union[str, None] = None
+
     sw = None
     _is_killed = False
     _sw_daemon = None
@@ -116,10 +154,10 @@ class TofinoModel(Switch):
                  p4_target_conf: str,
                  *,
                  chip_family: Union[ChipFamily, int] = ChipFamily.TofinoB0,
-                 cli_port: int = 8000,
+                 cli_port: Union[int, None] = None,
                  cli_credentials: Union[Tuple[str, str],
                                         List[str], None] = None,
-                 dru_sim_tcp_port_base: int = 8001,
+                 dru_sim_tcp_port_base: Union[int, None] = None,
                  time_disable: bool = False,
                  port_monitor: bool = False,
                  dod_test_model: bool = False,
@@ -127,6 +165,7 @@ class TofinoModel(Switch):
                  json_log_enable: bool = False,
                  sw_stdout: Union[TextIO, int, str, None] = PIPE,
                  sw_stderr: Union[TextIO, int, str, None] = PIPE,
+                 ready_timeout: Union[float, None] = None,
                  **kwargs):
         """Initialize a TofinoModel.
 
@@ -139,15 +178,17 @@ class TofinoModel(Switch):
 
         ### CLI Parameters
 
-        cli_port : int
-            TCP port for model shell (default: 8000).
+        cli_port : int | None
+            TCP port for model shell. If None, a port is reserved by `port_allocator`,
+            or 8000 (default: None).
         cli_credentials : (str, str) | [str, str] | None
             Username and password for model shell, None for no password (default: None).
 
         ### PCIe Parameters
 
-        dru_sim_tcp_port_base : int
-            TCP port base for dru_sim (default: 8001).
+        dru_sim_tcp_port_base : int | None
+            TCP port base for dru_sim. If None, ports are reserved by `port_allocator`,
+            or 8001 (default: None).
 
         ### Device Functional Parameters
 
@@ -168,9 +209,15 @@ class TofinoModel(Switch):
         ### Output Parameters
 
         sw_stdout : _FILE | str | None
-            Standard output for model, str for a file, see Popen for more details (default: PIPE).
+            Standard output for model, str for a file, see Popen for more details (default: PIPE, drained by `p4ws.mnhlp.logdrain`).
         sw_stderr : _FILE | str | None
-            Standard error for model, str for a file, see Popen for more details (default: PIPE).
+            Standard error for model, str for a file, see Popen for more details (default: PIPE, drained by `p4ws.mnhlp.logdrain`).
+
+        ### Startup Parameters
+
+        ready_timeout : float | None
+            Seconds to wait for the model CLI. As all instances share one model, the
+            tightest one is used. If None, wait until the overall deadline (default: None).
         """
         super().__init__(name, **kwargs)
 
@@ -185,6 +232,12 @@ class TofinoModel(Switch):
             raise ValueError(f"Invalid chip_family: {chip_family}")
         self.chip_family = chip_family
 
+        if cli_port is None or dru_sim_tcp_port_base is None:
+            auto_cli_port, auto_dru_sim_tcp_port_base = TofinoModel.allocate_ports()
+            cli_port = auto_cli_port if cli_port is None else cli_port
+            if dru_sim_tcp_port_base is None:
+                dru_sim_tcp_port_base = auto_dru_sim_tcp_port_base
+
         # CLI
         if not isinstance(cli_port, int) or cli_port <= 0 or cli_port > 65535:
             raise ValueError(
@@ -221,8 +274,91 @@ class TofinoModel(Switch):
         self.sw_stdout = sw_stdout
         self.sw_stderr = sw_stderr
 
+        # Startup
+        if ready_timeout is not None and (not isinstance(ready_timeout, (int, float)) or ready_timeout <= 0):
+            raise ValueError(f"Invalid ready_timeout: {ready_timeout}")
+        self.ready_timeout = ready_timeout
+
+        # Index of the instance in the model, which determines names of its interfaces
+        self.instance_index = TofinoModel.num_of_instances
         TofinoModel.num_of_instances += 1
 
+    @classmethod
+    def allocate_ports(cls):
+        """Get default CLI port and dru_sim port base, shared by all instances.
+
+        Returns
+        -------
+        ports : (int, int)
+            Reserved by `port_allocator` once, or 8000 and 8001 without it.
+        """
+
+        if cls.port_allocator is None:
+            return 8000, 8001
+        if TofinoModel._allocated_ports is None:
+            TofinoModel._allocated_ports = (
+                cls.port_allocator.reserve_port(8000),
+                cls.port_allocator.reserve_port(8001, DRU_SIM_PORTS))
+        return TofinoModel._allocated_ports
+
+    @classmethod
+    def allocate_veth_base(cls):
+        """Get the first veth id of the model.
+
+        Concurrent models name their interfaces `veth{N}` in the root
+        namespace, so each one reserves a block of `VETH_BLOCK` ids by
+        `port_allocator`, numbered from 1 to keep clear of 0 to 65535.
+
+        Returns
+        -------
+        veth_base : int
+            Reserved once, or 0 without `port_allocator`.
+        """
+
+        if cls.port_allocator is None:
+            return 0
+        if TofinoModel._veth_base is None:
+            block = int(cls.port_allocator.reserve_name("tofino-veth", ""))
+            TofinoModel._veth_base = (block + 1) * VETH_BLOCK
+        return TofinoModel._veth_base
+
+    @staticmethod
+    def veth_id(instance_index: int, port: int):
+        """Get id of the veth of a port, from `allocate_veth_base`.
+
+        Parameters
+        ----------
+        instance_index : int
+            Index of the instance in the model.
+        port : int
+            Port number.
+
+        Returns
+        -------
+        veth_id : int
+            Port `port` of instance `instance_index` is named `veth{veth_id}`.
+        """
+
+        base = instance_index * 512
+        dev_port = base + port - 1
+        return TofinoModel.allocate_veth_base() + base + dev_port * 2
+
+    def intf_name(self, port: int):
+        """Get name of interface of a port, used by links naming interfaces at creation.
+
+        Parameters
+        ----------
+        port : int
+            Port number.
+
+        Returns
+        -------
+        name : str
+            Name of interface.
+        """
+
+        return f"veth{TofinoModel.veth_id(self.instance_index, port)}"
+
     @classmethod
     def setup(cls):
         TofinoModel.ld_library_path, TofinoModel.tofino_model_exec = bfsde.get_bfsde_tofino_model()[
@@ -251,7 +387,8 @@ class TofinoModel(Switch):
         # tofino-model args
         # executable
         args = [TofinoModel.tofino_model_exec]
-        env = {"LD_LIBRARY_PATH": TofinoModel.ld_library_path}
+        env = {"LD_LIBRARY_PATH": TofinoModel.ld_library_path,
+               NODE_ENV: make_node_mark(",".join(i.name for i in TofinoModel.instances_started))}
 
         def check_only_one(property_name: str, fallback=None):
             prop = fallback
@@ -301,8 +438,8 @@ class TofinoModel(Switch):
 
         # Ports
         ports_out = {"PortToVeth": []}
-        for i, instance in enumerate(TofinoModel.instances_started):
-            base = i * 512
+        for index, instance in enumerate(TofinoModel.instances_started):
+            base = index * 512
 
             for i, intf in instance.intfs.items():
                 assert isinstance(i, int) and isinstance(intf, Intf)
@@ -311,10 +448,12 @@ class TofinoModel(Switch):
                     continue
 
                 dev_port = base + i - 1
-                veth1_id = base + dev_port * 2
+                veth1_id = TofinoModel.veth_id(index, i)
                 veth2_id = veth1_id + 1
 
-                intf.rename(f"veth{veth1_id}")
+                # Interfaces may be named at creation
+                if intf.name != f"veth{veth1_id}":
+                    intf.rename(f"veth{veth1_id}")
                 ports_out["PortToVeth"].append({"device_port": dev_port,
                                                 "veth1": veth1_id,
                                                 "veth2": veth2_id})
@@ -372,8 +511,18 @@ class TofinoModel(Switch):
         sw_stderr = open(sw_stderr, "w") if isinstance(
             sw_stderr, str) else sw_stderr
 
+        # All instances share one model
+        cpus = set()
+        for i in TofinoModel.instances_started:
+            cpus.update(i.cpus or ())
+        if any(not i.cpus for i in TofinoModel.instances_started):
+            cpus = None
+
         TofinoModel.sw = instance.popen(
-            args, env=env, stdout=sw_stdout, stderr=sw_stderr)
+            args, env=env, stdout=sw_stdout, stderr=sw_stderr,
+            preexec_fn=spawn_preexec(cpus, instance.cgroup))
+        drain_process(instance.name, TofinoModel.sw)
+        start_time = time.monotonic()
 
         debug(f"TofinoModel PID is {TofinoModel.sw.pid}.\n")
 
@@ -383,13 +532,24 @@ class TofinoModel(Switch):
             target=TofinoModel.__sw_daemon_proc, name=f"TofinoModel.__switch_daemon", args=(), daemon=True)
         TofinoModel._sw_daemon.start()
 
-        if not TofinoModel.wait_for_server_start():
+        ready_timeout = min_timeout(TofinoModel.startup_timeout, *(
+            instance.ready_timeout for instance in TofinoModel.instances_started))
+        if not TofinoModel.wait_for_server_start(ready_timeout):
             error(
                 f"TofinoModel not started successfully.\n")
             exit(1)
 
+        # All instances share one model
+        startup_latency = time.monotonic() - start_time
+        for instance in TofinoModel.instances_started:
+            instance.start_time = start_time
+            instance.startup_latency = startup_latency
+
     @staticmethod
     def __real_shutdown():
+        # Not started, e.g. bring-up failed before
+        if TofinoModel.sw is None:
+            return
         assert isinstance(TofinoModel.sw, Popen) and isinstance(
             TofinoModel._sw_daemon, threading.Thread)
         TofinoModel._is_killed = True
@@ -425,7 +585,7 @@ class TofinoModel(Switch):
             poll, TofinoModel._is_killed)
 
     @staticmethod
-    def wait_for_server_start():
+    def wait_for_server_start(timeout: Union[float, None] = None):
         """Waiting until model shell CLI available.
 
         Notes
@@ -437,18 +597,20 @@ class TofinoModel(Switch):
         - CLI TCP port
         This function wait until CLI TCP port available.
 
+        Parameters
+        ----------
+        timeout : float | None
+            Seconds to wait, None for waiting forever.
+
         Returns
         -------
         available : bool
-            True if CLI available, or False if model shutdown.
+            True if CLI available, or False if model shutdown or timed out.
         """
         assert isinstance(TofinoModel.sw, Popen)
-        while True:
-            if TofinoModel.sw.poll() is not None:
-                return False
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(0.5)
-            result = sock.connect_ex(("localhost", TofinoModel.cli_port))
-            if result == 0:
-                TofinoModel.sock = sock
-                return True
+        sock = wait_for_tcp_server(
+            TofinoModel.sw, ("localhost", TofinoModel.cli_port), timeout)
+        if sock is None:
+            return False
+        TofinoModel.sock = sock
+        return True
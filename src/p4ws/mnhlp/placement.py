@@ -0,0 +1,260 @@
+"""CPU placement of switches and hosts.
+
+`placement` of the net file pins switch processes, and optionally shells of
+hosts, to CPUs:
+
+    "placement": {
+        "cpus": "2-15",
+        "switch-cpus": 1,
+        "host-cpus": 1,
+        "nodes": { "s1": "0-1" }
+    }
+
+- `cpus`: CPUs to place nodes on, a list like `0-3,8` or a list of numbers,
+  default to CPUs this process may run on.
+- `switch-cpus`: Number of CPUs of each switch (default: 1).
+- `host-cpus`: Number of CPUs of each host, 0 to not pin hosts (default: 0).
+- `nodes`: Fixed CPUs of nodes, not given to other nodes.
+
+Switches are given dedicated CPUs in order, each set within one NUMA node,
+physical cores before their hyper-thread siblings, and NUMA nodes are filled
+one after another, so neighboring switches share a node. Hosts are placed on
+the NUMA node of the first switch they link to. When CPUs run out, they are
+shared from the beginning again.
+
+Typical usage example:
+
+    placement = make_topo_placement(net_config["placement"], topo)
+    apply_placement(net.hosts + net.switches, placement)
+"""
+
+import glob
+import os
+import re
+from typing import Dict, Iterable, List, Union
+
+from mininet.log import warn
+
+from p4ws.utils import get_type_name
+
+from .error import ParserError
+
+# Keys of placement
+PLACEMENT_KEYS = ("cpus", "switch-cpus", "host-cpus", "nodes")
+
+_cpu_list_pattern = re.compile(r"^\d+(-\d+)?(,\d+(-\d+)?)*$")
+
+
+def parse_cpu_list(spec: Union[str, List[int]]):
+    """Parse a CPU list.
+
+    Args:
+        spec: A list like `0-3,8`, as in cpuset(7), or a list of numbers.
+
+    Returns:
+        Sorted CPUs.
+
+    Raises:
+        ParserError: The list is incorrect.
+    """
+
+    if isinstance(spec, list) and all(isinstance(c, int) and not isinstance(c, bool) and c >= 0
+                                      for c in spec):
+        return sorted(set(spec))
+    if not isinstance(spec, str) or not _cpu_list_pattern.match(spec.replace(" ", "")):
+        raise ParserError(f"CPU list should be str like `0-3,8` or list of int, not {spec!r}")
+    cpus = set()
+    for part in spec.replace(" ", "").split(","):
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return sorted(cpus)
+
+
+def get_numa_nodes():
+    """Get NUMA node of each CPU, all in node 0 if unknown."""
+
+    numa = {}
+    for path in glob.glob("/sys/devices/system/node/node[0-9]*/cpulist"):
+        node = int(os.path.basename(os.path.dirname(path))[4:])
+        try:
+            with open(path) as f:
+                cpus = f.read().strip()
+        except OSError:
+            continue
+        if cpus:
+            for cpu in parse_cpu_list(cpus):
+                numa[cpu] = node
+    return numa
+
+
+def get_thread_index(cpu: int):
+    """Get index of a CPU among hyper-thread siblings of its core, 0 if unknown."""
+
+    try:
+        with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list") as f:
+            return parse_cpu_list(f.read().strip()).index(cpu)
+    except (OSError, ParserError, ValueError):
+        return 0
+
+
+def parse_placement(spec: dict):
+    """Parse placement of the net file.
+
+    Returns:
+        The placement, with CPU lists parsed.
+
+    Raises:
+        ParserError: Placement is incorrect.
+    """
+
+    if not isinstance(spec, dict):
+        raise ParserError(f"`placement` should be object, not {get_type_name(spec)}")
+    for key in spec:
+        if key not in PLACEMENT_KEYS:
+            raise ParserError(
+                f"Unknown key `{key}` of `placement`, should be one of {', '.join(PLACEMENT_KEYS)}")
+    placement = {
+        "cpus": parse_cpu_list(spec["cpus"]) if spec.get("cpus") is not None
+        else sorted(os.sched_getaffinity(0)),
+        "switch-cpus": spec.get("switch-cpus", 1),
+        "host-cpus": spec.get("host-cpus", 0),
+        "nodes": {}
+    }
+    for key, minimum in (("switch-cpus", 1), ("host-cpus", 0)):
+        value = placement[key]
+        if not isinstance(value, int) or isinstance(value, bool) or value < minimum:
+            raise ParserError(f"`{key}` should be int not less than {minimum}, not {value!r}")
+    nodes = spec.get("nodes", {})
+    if not isinstance(nodes, dict):
+        raise ParserError(f"`nodes` of `placement` should be object, not {get_type_name(nodes)}")
+    for name, cpus in nodes.items():
+        placement["nodes"][name] = parse_cpu_list(cpus)
+    return placement
+
+
+def make_placement(spec: dict, switches: List[str], hosts: Dict[str, Union[str, None]],
+                   numa: Union[Dict[int, int], None] = None):
+    """Assign CPUs to nodes.
+
+    Args:
+        spec: Placement of the net file, see `parse_placement`.
+        switches: Names of switches, neighbors first.
+        hosts: Name of host -> name of the first switch it links to, or None.
+        numa: CPU -> NUMA node, None to read from the system.
+
+    Returns:
+        Name of node -> CPUs, for pinned nodes.
+
+    Raises:
+        ParserError: Placement is incorrect.
+    """
+
+    spec = parse_placement(spec)
+    numa = get_numa_nodes() if numa is None else numa
+    fixed = dict((name, cpus) for name, cpus in spec["nodes"].items()
+                 if name in hosts or name in switches)
+    for name in spec["nodes"]:
+        if name not in fixed:
+            raise ParserError(f"Node `{name}` of `placement` not exists")
+    used = set(cpu for cpus in fixed.values() for cpu in cpus)
+    pool = [cpu for cpu in spec["cpus"] if cpu not in used]
+    if not pool:
+        raise ParserError("No CPUs to place nodes on")
+
+    # Free CPUs of each NUMA node, physical cores first
+    free: Dict[int, List[int]] = {}
+    for cpu in sorted(pool, key=lambda c: (get_thread_index(c), c)):
+        free.setdefault(numa.get(cpu, 0), []).append(cpu)
+    numa_order = sorted(free)
+    # CPUs shared in order once all are taken
+    shared, warned = [], []
+
+    def take(count: int, preferred: Union[int, None] = None):
+        order = numa_order if preferred is None else [preferred] + numa_order
+        for node in order:
+            if len(free.get(node, [])) >= count:
+                cpus, free[node] = free[node][:count], free[node][count:]
+                return sorted(cpus)
+        # Across NUMA nodes
+        if sum(len(cpus) for cpus in free.values()) >= count:
+            cpus = []
+            for node in numa_order:
+                got, free[node] = free[node][:count - len(cpus)], free[node][count - len(cpus):]
+                cpus.extend(got)
+            return sorted(cpus)
+        # Out of CPUs, share them in order
+        if not warned:
+            warn(f"*** Not enough CPUs for placement, {len(pool)} CPUs are shared\n")
+            warned.append(True)
+        while len(shared) < count:
+            shared.extend(pool)
+        cpus, shared[:] = shared[:count], shared[count:]
+        return sorted(set(cpus))
+
+    placement = dict(fixed)
+    for name in switches:
+        if name not in placement:
+            placement[name] = take(spec["switch-cpus"])
+    if spec["host-cpus"] > 0:
+        for name, switch in hosts.items():
+            if name in placement:
+                continue
+            preferred = numa.get(placement[switch][0], 0) if switch in placement else None
+            placement[name] = take(spec["host-cpus"], preferred)
+    return placement
+
+
+def make_topo_placement(spec: dict, topo):
+    """Assign CPUs to nodes of a topology, see `make_placement`.
+
+    Args:
+        spec: Placement of the net file.
+        topo: The topology, a `mininet.topo.Topo`.
+    """
+
+    switches = list(topo.switches())
+    switch_set = set(switches)
+    hosts = dict((name, None) for name in topo.hosts())
+    for node1, node2 in topo.links(sort=True):
+        for host, switch in ((node1, node2), (node2, node1)):
+            if host in hosts and hosts[host] is None and switch in switch_set:
+                hosts[host] = switch
+    return make_placement(spec, switches, hosts)
+
+
+def affinity_setter(cpus: Union[Iterable[int], None]):
+    """Get `preexec_fn` of `Popen` pinning the child to CPUs, None for no CPUs."""
+
+    if not cpus:
+        return None
+    cpus = set(cpus)
+    return lambda: os.sched_setaffinity(0, cpus)
+
+
+def apply_placement(nodes: Iterable, placement: Dict[str, List[int]]):
+    """Pin nodes to their CPUs.
+
+    Sets `cpus` of each node, used by switches to spawn their processes, and
+    pins shells of nodes, inherited by commands they run.
+
+    Args:
+        nodes: Nodes, e.g. `net.hosts + net.switches`.
+        placement: Name of node -> CPUs, see `make_placement`.
+
+    Returns:
+        Number of nodes pinned.
+    """
+
+    count = 0
+    for node in nodes:
+        cpus = placement.get(node.name)
+        if not cpus:
+            continue
+        node.cpus = list(cpus)
+        if node.shell is not None:
+            try:
+                os.sched_setaffinity(node.pid, cpus)
+            except OSError as e:
+                warn(f"*** Cannot pin {node.name} to CPUs {cpus}: {e}\n")
+        count += 1
+    return count
@@ -0,0 +1,351 @@
+"""Offline planning of networks.
+
+A plan is what `loadmn` builds from a topology file and a net file, computed
+without root and without starting anything: nodes and their classes, links
+with port assignments and interface names, the veth map of `TofinoModel`
+and the `ip -batch` commands configuring each node. Instead of stopping at
+the first error, all errors found are reported together.
+
+Typical usage example:
+
+    with open("topo.json") as f:
+        topo, plan, errors = make_plan(f, net_config)
+"""
+
+import json
+from typing import Dict, List, TextIO, Union
+
+from mininet.link import Intf, Link
+from mininet.node import Controller, Host, Switch
+from mininet.util import ipAdd, netParse
+
+from p4ws.utils import get_type, get_type_name
+
+from .batchconf import compile_host_config, compile_switch_config
+from .cgroup import parse_cgroups
+from .supervisor import parse_supervisor
+from .error import ParserError
+from .JsonTopo import JsonTopo
+from .links.BatchLink import BatchLink
+from .nodes.TofinoModel import TofinoModel
+from .placement import make_topo_placement
+from .staticarp import STATIC_ARP_SCOPES
+
+# Default base of host IP addresses, like `Mininet`
+DEFAULT_IP_BASE = "10.0.0.0/8"
+
+# Number of ports of an instance of TofinoModel
+TOFINO_PORTS = 512
+
+
+def get_default_type(spec, name: str, base_type: type):
+    """Get default type of nodes, links or interfaces in the net file.
+
+    Args:
+        spec: Full type name, or None for `base_type`.
+        name: Name of type, e.g. `host` for `host-type`.
+        base_type: Base type of the type.
+
+    Returns:
+        A type.
+
+    Raises:
+        ParserError: Type name is incorrect.
+    """
+
+    if spec is not None:
+        if not isinstance(spec, str):
+            raise ParserError(
+                f"`{name}-type` should be str, not {get_type_name(spec)}")
+        try:
+            t = get_type(spec)
+        except (ImportError, AttributeError, ValueError) as e:
+            raise ParserError(f"`{name}-type`: {e}")
+    else:
+        t = base_type
+    if not issubclass(t, base_type):
+        raise ParserError(
+            f"`{name}-type` should be derived of {get_type_name(base_type)}")
+    return t
+
+
+def get_full_type_name(t: type):
+    """Get full type name of a type, reversed `get_type`."""
+    return f"{t.__module__}.{t.__qualname__}"
+
+
+class PlanIntf:
+    """Interface of a planned node, duck typed as `mininet.link.Intf`."""
+
+    def __init__(self, name: str, node: "PlanNode", port: int,
+                 ip: Union[str, None] = None, prefixLen: Union[int, None] = None,
+                 mac: Union[str, None] = None):
+        self.name = name
+        self.node = node
+        self.port = port
+        self.ip = ip
+        self.prefixLen = prefixLen
+        self.mac = mac
+
+    def __repr__(self):
+        return f"<PlanIntf {self.name}>"
+
+
+class PlanNode:
+    """Planned node, duck typed as `mininet.node.Node` for compiling net file."""
+
+    def __init__(self, name: str, cls: type, params: dict, is_switch: bool):
+        self.name = name
+        self.cls = cls
+        self.params = params
+        self.is_switch = is_switch
+        self.inNamespace = not is_switch
+        self.intfs: Dict[int, PlanIntf] = {}
+        self.nameToIntf: Dict[str, PlanIntf] = {}
+        self.instance_index: Union[int, None] = None
+
+    def add_intf(self, intf: PlanIntf):
+        self.intfs[intf.port] = intf
+        self.nameToIntf[intf.name] = intf
+
+    def defaultIntf(self):
+        """Get interface of the lowest port, like `Node.defaultIntf`."""
+        if self.intfs:
+            return self.intfs[min(self.intfs)]
+        return None
+
+    def intf_name(self, port: int):
+        """Get name of interface of a port."""
+        if self.instance_index is not None:
+            return f"veth{TofinoModel.veth_id(self.instance_index, port)}"
+        return f"{self.name}-eth{port}"
+
+    def to_json(self):
+        out = {
+            "class": get_full_type_name(self.cls),
+            "params": _to_json(self.params),
+            "intfs": dict((port, {
+                "name": intf.name,
+                "ip": [intf.ip, intf.prefixLen],
+                "mac": intf.mac
+            }) for port, intf in sorted(self.intfs.items()))
+        }
+        if self.instance_index is not None:
+            out["instance-index"] = self.instance_index
+        return out
+
+
+def _to_json(obj):
+    """Convert parameters to JSON values, types by their full names."""
+
+    if isinstance(obj, dict):
+        return dict((str(k), _to_json(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return [_to_json(v) for v in obj]
+    if isinstance(obj, type):
+        return get_full_type_name(obj)
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    return str(obj)
+
+
+def make_plan(topo_fp: TextIO, net_config: dict, stream: bool = False):
+    """Make plan of a network offline.
+
+    Args:
+        topo_fp: File object of the topology file.
+        net_config: Content of the net file.
+        stream: Read the topology file incrementally, see `JsonTopo`.
+
+    Returns:
+        A tuple of the JsonTopo, the plan, a JSON value, and list of
+        ParserError. The topology and the plan are None if files cannot be read.
+    """
+
+    errors: List[ParserError] = []
+
+    def report(where: str, e: Exception):
+        errors.append(ParserError(str(e), where))
+
+    # Topology
+    try:
+        topo = JsonTopo(topo_fp, errors=errors, stream=stream)
+    except (json.decoder.JSONDecodeError, ParserError, ImportError, AttributeError, ValueError, AssertionError) as e:
+        return None, None, [ParserError(getattr(e, "msg", str(e)), f"topo:{getattr(e, 'path', None) or '$'}")]
+    errors = [ParserError(e.msg, f"topo:{e.path}") for e in errors]
+
+    if not isinstance(net_config, dict):
+        return None, None, [ParserError(f"Top-level should be object, not {get_type_name(net_config)}", "net:$")]
+
+    # Default types
+    types = {}
+    for name, base_type in (("host", Host), ("switch", Switch), ("controller", Controller),
+                            ("link", Link), ("intf", Intf)):
+        try:
+            types[name] = get_default_type(
+                net_config.get(f"{name}-type"), name, base_type)
+        except ParserError as e:
+            report("net:$", e.msg)
+            types[name] = base_type
+
+    # Nodes, in the order `Mininet.buildFromTopo` adds them
+    nodes: Dict[str, PlanNode] = {}
+    try:
+        ip_base, prefix_len = netParse(
+            net_config.get("net-config", {}).get("ipBase", DEFAULT_IP_BASE))
+    except (AttributeError, ValueError) as e:
+        report("net:$.net-config.ipBase", e)
+        ip_base, prefix_len = netParse(DEFAULT_IP_BASE)
+    next_ip = 1
+    host_ips = {}
+    for name in topo.hosts():
+        params = dict(topo.nodeInfo(name))
+        cls = params.pop("cls", None) or types["host"]
+        if not issubclass(cls, Host):
+            report(f"topo:node({name})",
+                   f"Class should be derived of Host, not {get_full_type_name(cls)}")
+        nodes[name] = PlanNode(name, cls, params, False)
+        ip = params.get("ip")
+        if ip is None:
+            ip = f"{ipAdd(next_ip, ipBaseNum=ip_base, prefixLen=prefix_len)}/{prefix_len}"
+        next_ip += 1
+        host_ips[name] = ip
+
+    num_of_tofino = 0
+    for name in topo.switches():
+        params = dict(topo.nodeInfo(name))
+        params.pop("isSwitch", None)
+        cls = params.pop("cls", None) or types["switch"]
+        if not issubclass(cls, Switch):
+            report(f"topo:node({name})",
+                   f"Class should be derived of Switch, not {get_full_type_name(cls)}")
+        node = PlanNode(name, cls, params, True)
+        if issubclass(cls, TofinoModel):
+            node.instance_index = num_of_tofino
+            num_of_tofino += 1
+        nodes[name] = node
+
+    # Links
+    links = []
+    for index, (node1, node2, info) in enumerate(topo.links(sort=True, withInfo=True)):
+        where = f"topo:link({node1}, {node2})"
+        info = dict(info)
+        ends = []
+        for n in (1, 2):
+            name, port = info.pop(f"node{n}"), info.pop(f"port{n}")
+            node = nodes.get(name)
+            if node is None:
+                report(where, f"Node `{name}` not exists")
+            elif not isinstance(port, int) or port < 0:
+                report(where, f"Invalid port number: {name}.{port}")
+            elif port in node.intfs:
+                report(where, f"Port {name}.{port} already used by {node.intfs[port].name}")
+            elif node.instance_index is not None and not 1 <= port <= TOFINO_PORTS:
+                report(where, f"Port of TofinoModel should be in [1, {TOFINO_PORTS}]: {name}.{port}")
+            else:
+                intf_name = info.get(f"intfName{n}") or node.intf_name(port)
+                mac = info.get(f"addr{n}") or (info.get(f"params{n}") or {}).get("mac")
+                intf = PlanIntf(intf_name, node, port, mac=mac)
+                node.add_intf(intf)
+                ends.append(intf)
+        if len(ends) != 2:
+            continue
+        cls = info.pop("cls", None) or types["link"]
+        if info.get("profile") is not None and not issubclass(cls, BatchLink):
+            report(where, f"Link profiles need BatchLink, not {get_full_type_name(cls)}")
+        links.append({
+            "node1": ends[0].node.name,
+            "port1": ends[0].port,
+            "intf1": ends[0].name,
+            "node2": ends[1].node.name,
+            "port2": ends[1].port,
+            "intf2": ends[1].name,
+            "class": get_full_type_name(cls),
+            "params": _to_json(info)
+        })
+
+    # IP addresses of hosts are set to their default interfaces
+    for name, ip in host_ips.items():
+        intf = nodes[name].defaultIntf()
+        if intf is None:
+            continue
+        if "/" in ip:
+            intf.ip, prefix = ip.split("/", 1)
+            intf.prefixLen = int(prefix)
+        else:
+            intf.ip, intf.prefixLen = ip, prefix_len
+        if intf.mac is None:
+            intf.mac = nodes[name].params.get("mac")
+
+    # Net file
+    commands: Dict[str, List[str]] = {}
+    for section, is_switch, compile_config in (("hosts", False, compile_host_config),
+                                               ("switches", True, compile_switch_config)):
+        if section not in net_config:
+            continue
+        if not isinstance(net_config[section], dict):
+            report("net:$", f"`{section}` should be object, not {get_type_name(net_config[section])}")
+            continue
+        for name, config in net_config[section].items():
+            where = f"net:$.{section}.{name}"
+            node = nodes.get(name)
+            if node is None or node.is_switch != is_switch:
+                report(where, f"{'Switch' if is_switch else 'Host'} `{name}` not exists")
+                continue
+            try:
+                script = compile_config(node, config)
+            except (ParserError, RuntimeError, ValueError, TypeError, KeyError, IndexError) as e:
+                report(where, e)
+                continue
+            script.commit()
+            commands[name] = script.commands
+
+    populate_static_arp_scope = net_config.get("populate-static-arp", False)
+    if populate_static_arp_scope is True:
+        populate_static_arp_scope = "all"
+    if populate_static_arp_scope is not False and populate_static_arp_scope not in STATIC_ARP_SCOPES:
+        report("net:$", f"`populate-static-arp` should be bool or one of {STATIC_ARP_SCOPES}, not {populate_static_arp_scope}")
+        populate_static_arp_scope = False
+
+    placement = None
+    if net_config.get("placement") is not None:
+        try:
+            placement = make_topo_placement(net_config["placement"], topo)
+        except ParserError as e:
+            report("net:$.placement", e)
+
+    cgroups = None
+    if net_config.get("cgroups") is not None:
+        try:
+            cgroups = parse_cgroups(net_config["cgroups"])
+            for name in cgroups["nodes"]:
+                if name not in nodes:
+                    report(f"net:$.cgroups.nodes.{name}", f"Node `{name}` not exists")
+        except ParserError as e:
+            report("net:$.cgroups", e)
+
+    supervisor = None
+    if net_config.get("supervisor") is not None:
+        try:
+            policy, policies = parse_supervisor(net_config["supervisor"])
+            supervisor = {"policy": policy, "nodes": policies}
+            for name in policies:
+                if name not in nodes or not nodes[name].is_switch:
+                    report(f"net:$.supervisor.nodes.{name}", f"Switch `{name}` not exists")
+        except ParserError as e:
+            report("net:$.supervisor", e)
+
+    plan = {
+        "hosts": dict((n.name, n.to_json()) for n in nodes.values() if not n.is_switch),
+        "switches": dict((n.name, n.to_json()) for n in nodes.values() if n.is_switch),
+        "links": links,
+        "link-profiles": topo.link_profiles,
+        "tofino-veths": dict((n.name, dict((port, intf.name) for port, intf in sorted(n.intfs.items())))
+                             for n in nodes.values() if n.instance_index is not None),
+        "commands": commands,
+        "populate-static-arp": populate_static_arp_scope,
+        "placement": placement,
+        "cgroups": cgroups,
+        "supervisor": supervisor
+    }
+    return topo, plan, errors
@@ -0,0 +1,197 @@
+"""Readiness detection of switch processes.
+
+A switch is ready when its server (Thrift, gRPC or model CLI) accepts TCP
+connections. Between probes, the waiter sleeps on a pidfd of the process, so
+it wakes up immediately if the process exits and does not burn CPU otherwise.
+Intervals between probes grow exponentially.
+
+Typical usage example:
+
+    sock = wait_for_tcp_server(proc, ("localhost", 9090), timeout=30)
+    if sock is not None:
+        sock.close()
+"""
+
+import os
+import select
+import socket
+import time
+from subprocess import Popen
+from typing import Dict, Iterable, List, Tuple, Union
+
+# First interval between probes in seconds
+PROBE_INTERVAL_MIN = 0.01
+# Max interval between probes in seconds
+PROBE_INTERVAL_MAX = 0.5
+# Multiplier of interval after each failed probe
+PROBE_BACKOFF = 2.0
+# Timeout of a single connection attempt in seconds
+PROBE_CONNECT_TIMEOUT = 0.5
+
+# Upper bounds of buckets in seconds of startup latency histogram
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class ProcessWatcher:
+    """Watch exit of a process without busy waiting.
+
+    Use a pidfd if supported by the kernel, or fall back to sleeping and
+    polling the process.
+    """
+
+    def __init__(self, proc: Popen):
+        """Watch a process.
+
+        Args:
+            proc: Process to watch.
+        """
+
+        self.proc = proc
+        self.fd = None
+        self.exited = False
+        try:
+            self.fd = os.pidfd_open(proc.pid)
+        except ProcessLookupError:
+            # Already reaped
+            self.exited = True
+        except (AttributeError, OSError):
+            pass
+
+    def wait(self, timeout: float):
+        """Wait until the process exits or timed out.
+
+        Args:
+            timeout: Seconds to wait.
+
+        Returns:
+            True if the process exited.
+        """
+
+        if self.exited or self.proc.poll() is not None:
+            self.exited = True
+            return True
+
+        if self.fd is not None:
+            poller = select.poll()
+            poller.register(self.fd, select.POLLIN)
+            self.exited = bool(poller.poll(max(timeout, 0) * 1000))
+        else:
+            time.sleep(max(timeout, 0))
+        self.exited = self.exited or self.proc.poll() is not None
+        return self.exited
+
+    def close(self):
+        """Release the pidfd."""
+
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def probe_tcp(addr: Tuple[str, int]):
+    """Try to connect to a TCP server once.
+
+    Args:
+        addr: Address (host, port) of the server.
+
+    Returns:
+        A connected socket, or None if the connection failed.
+    """
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(PROBE_CONNECT_TIMEOUT)
+    try:
+        if sock.connect_ex(addr) == 0:
+            return sock
+    except OSError:
+        pass
+    sock.close()
+    return None
+
+
+def wait_for_tcp_server(proc: Popen, addr: Tuple[str, int], timeout: Union[float, None] = None):
+    """Wait until a process accepts TCP connections.
+
+    Args:
+        proc: Process serving.
+        addr: Address (host, port) of the server.
+        timeout: Seconds to wait, None for waiting forever.
+
+    Returns:
+        A connected socket, which should be closed by the caller, or None if
+        the process exited or timed out.
+    """
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    interval = PROBE_INTERVAL_MIN
+    with ProcessWatcher(proc) as watcher:
+        while True:
+            if watcher.wait(0):
+                return None
+            sock = probe_tcp(addr)
+            if sock is not None:
+                return sock
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                interval = min(interval, remaining)
+            if watcher.wait(interval):
+                return None
+            interval = min(interval * PROBE_BACKOFF, PROBE_INTERVAL_MAX)
+
+
+def min_timeout(*timeouts: Union[float, None]):
+    """Get the tightest of timeouts, where None stands for no timeout."""
+
+    timeouts_ = [t for t in timeouts if t is not None]
+    return min(timeouts_) if timeouts_ else None
+
+
+def latency_histogram(latencies: Iterable[float], buckets: Iterable[float] = LATENCY_BUCKETS):
+    """Count latencies into buckets.
+
+    Args:
+        latencies: Latencies in seconds.
+        buckets: Ascending upper bounds of buckets in seconds.
+
+    Returns:
+        A list of (upper bound, count) pairs, the last upper bound is None for
+        latencies exceeding all buckets.
+    """
+
+    buckets = list(buckets)
+    counts: List[int] = [0] * (len(buckets) + 1)
+    for latency in latencies:
+        for i, bound in enumerate(buckets):
+            if latency <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+    return list(zip(buckets + [None], counts))
+
+
+def get_startup_latencies(switches: Iterable):
+    """Get time-to-ready of started switches.
+
+    Args:
+        switches: Switches, those without `startup_latency` are skipped.
+
+    Returns:
+        A dict maps switch name to its startup latency in seconds.
+    """
+
+    latencies: Dict[str, float] = {}
+    for switch in switches:
+        latency = getattr(switch, "startup_latency", None)
+        if latency is not None:
+            latencies[switch.name] = latency
+    return latencies
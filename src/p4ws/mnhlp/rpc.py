@@ -0,0 +1,324 @@
+"""JSON-RPC control of a running network over a Unix socket.
+
+Requests and responses are JSON-RPC 2.0 objects, one per line. A connection
+may send any number of requests, so one warm network can serve many tests.
+
+Methods:
+- `nodes()`: Names and classes of hosts and switches.
+- `inventory()`: Interfaces of nodes, as written to `--out-file` of loadmn.
+- `cmd(node, cmd)`: Run a shell command in a node, returns output, error and exit code.
+- `fanout(cmd, nodes, classes, timeout)`: Run a shell command in nodes selected
+  by name patterns and classes concurrently, returns results of each node.
+- `link_profile(name, profile)`: Define or change a link profile, only
+  interfaces whose profile changed are re-applied, returns number of them.
+- `restart(node, timeout)`: Restart a switch with the same interfaces and
+  ports, waiting for it at most `timeout` seconds (default: `RESTART_TIMEOUT`,
+  or `start-timeout` of the supervisor).
+- `supervisor()`: Crashes, restarts and downtime of switches restarted by
+  the supervisor.
+- `logs(node, stream, size)`: Last bytes of `stdout` or `stderr` of a switch
+  process, kept by the log drain.
+- `stop()`: Stop serving, and then the network is stopped.
+
+Typical usage example:
+
+    server = RpcServer("/tmp/p4ws.sock", net, inventory)
+    server.serve_forever()
+
+    with RpcClient("/tmp/p4ws.sock") as client:
+        client.call("cmd", node="h1", cmd="ping -c 1 10.0.0.2")
+"""
+
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+from typing import Callable, Union
+
+from mininet.log import debug, info
+from mininet.net import Mininet
+
+from p4ws.fanout import fanout
+
+from .error import ParserError
+from .linkprofile import LinkShaper
+from .logdrain import get_log_drain
+from .supervisor import Supervisor
+
+# Error codes of JSON-RPC 2.0
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+# Default seconds to wait for a switch restarted without a supervisor
+RESTART_TIMEOUT = 30.0
+
+
+class RpcError(Exception):
+    """Error returned to the client."""
+
+    def __init__(self, code: int, message: str):
+        Exception.__init__(self, message)
+        self.code = code
+        self.message = message
+
+    def __reduce__(self):
+        return self.__class__, (self.code, self.message)
+
+
+class _RpcHandler(socketserver.StreamRequestHandler):
+    """Handle requests of a connection, one per line."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self.server.handle_line(line)
+            if response is not None:
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+                self.wfile.flush()
+            if self.server.stopping:
+                break
+
+
+class RpcServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """JSON-RPC server of a running network.
+
+    Commands of different nodes run concurrently, each in a new process
+    attached to the node, so they never interfere with node shells.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: str, net: Mininet, inventory: Callable[[], dict],
+                 shaper: Union[LinkShaper, None] = None,
+                 supervisor: Union[Supervisor, None] = None):
+        """Listen on a Unix socket.
+
+        Args:
+            path: Path to the socket, an existing socket file is replaced.
+            net: The running network.
+            inventory: Function returns interfaces of nodes.
+            shaper: Applier of link profiles of the network, or None.
+            supervisor: Supervisor of switches, also restarting switches for
+                clients, or None.
+
+        Raises:
+            FileExistsError: `path` exists and is not a socket.
+            OSError: The socket cannot be listened on.
+        """
+
+        try:
+            mode = os.lstat(path).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            if not stat.S_ISSOCK(mode):
+                raise FileExistsError(f"Not a socket, not replaced: {path}")
+            os.remove(path)
+        socketserver.UnixStreamServer.__init__(self, path, _RpcHandler)
+        self.path = path
+        self.net = net
+        self.inventory = inventory
+        self.shaper = shaper
+        self.supervisor = supervisor
+        self.stopping = False
+        self.methods = {
+            "nodes": self.rpc_nodes,
+            "inventory": self.rpc_inventory,
+            "cmd": self.rpc_cmd,
+            "fanout": self.rpc_fanout,
+            "link_profile": self.rpc_link_profile,
+            "restart": self.rpc_restart,
+            "supervisor": self.rpc_supervisor,
+            "logs": self.rpc_logs,
+            "stop": self.rpc_stop,
+        }
+        self._restart_lock = threading.Lock()
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def handle_line(self, line: bytes):
+        """Handle a request line.
+
+        Args:
+            line: A JSON-RPC request.
+
+        Returns:
+            A JSON-RPC response, or None for notifications.
+        """
+
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return {"jsonrpc": "2.0", "id": None,
+                    "error": {"code": PARSE_ERROR, "message": str(e)}}
+
+        request_id = request.get("id") if isinstance(request, dict) else None
+        try:
+            if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+                raise RpcError(INVALID_REQUEST, "Request should be object with `method`")
+            method = self.methods.get(request["method"])
+            if method is None:
+                raise RpcError(METHOD_NOT_FOUND,
+                               f"Unknown method: {request['method']}")
+            params = request.get("params", {})
+            if not isinstance(params, dict):
+                raise RpcError(INVALID_PARAMS, "`params` should be object")
+            try:
+                result = method(**params)
+            except TypeError as e:
+                raise RpcError(INVALID_PARAMS, str(e))
+        except RpcError as e:
+            response = {"jsonrpc": "2.0", "id": request_id,
+                        "error": {"code": e.code, "message": e.message}}
+        except Exception as e:
+            debug(f"RpcServer: {request}: {e}\n")
+            response = {"jsonrpc": "2.0", "id": request_id,
+                        "error": {"code": SERVER_ERROR, "message": str(e)}}
+        else:
+            response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+        if isinstance(request, dict) and "id" not in request:
+            return None
+        return response
+
+    def get_node(self, name: str):
+        """Get a node by name, or raise RpcError."""
+
+        if not isinstance(name, str) or name not in self.net:
+            raise RpcError(INVALID_PARAMS, f"Node not found: {name}")
+        return self.net.get(name)
+
+    def rpc_nodes(self):
+        return {
+            "hosts": {h.name: type(h).__name__ for h in self.net.hosts},
+            "switches": {s.name: type(s).__name__ for s in self.net.switches}
+        }
+
+    def rpc_inventory(self):
+        return self.inventory()
+
+    def rpc_cmd(self, node: str, cmd: str):
+        if not isinstance(cmd, str):
+            raise RpcError(INVALID_PARAMS, "`cmd` should be str")
+        # Not `shell=True`, which needs $SHELL, often unset for daemons
+        out, err, code = self.get_node(node).pexec(["sh", "-c", cmd])
+        return {"output": out, "error": err, "code": code}
+
+    def rpc_fanout(self, cmd: str, nodes: list = None, classes: list = None,
+                   timeout: float = None):
+        if not isinstance(cmd, str):
+            raise RpcError(INVALID_PARAMS, "`cmd` should be str")
+        return fanout(self.net, cmd, nodes, classes, timeout).to_json()
+
+    def rpc_link_profile(self, name: str, profile: dict = None):
+        if self.shaper is None:
+            raise RpcError(INVALID_PARAMS, "Link profiles not enabled")
+        try:
+            changed = self.shaper.set_profile(name, profile, self.net.links)
+        except ParserError as e:
+            raise RpcError(INVALID_PARAMS, str(e))
+        return {"changed": changed}
+
+    def rpc_restart(self, node: str, timeout: float = None):
+        if timeout is not None and (not isinstance(timeout, (int, float)) or timeout <= 0):
+            raise RpcError(INVALID_PARAMS, "`timeout` should be positive seconds")
+        switch = self.get_node(node)
+        if not hasattr(switch, "restart"):
+            raise RpcError(INVALID_PARAMS,
+                           f"Restart not supported by {type(switch).__name__}")
+        info(f"*** Restarting {switch.name}\n")
+        if self.supervisor is not None:
+            started = self.supervisor.restart(switch, timeout)
+        else:
+            with self._restart_lock:
+                started = switch.restart(RESTART_TIMEOUT if timeout is None else timeout)
+        return {"started": started,
+                "startup-latency": getattr(switch, "startup_latency", None)}
+
+    def rpc_supervisor(self):
+        if self.supervisor is None:
+            raise RpcError(INVALID_PARAMS, "Supervisor not enabled")
+        return self.supervisor.to_json()
+
+    def rpc_logs(self, node: str, stream: str = "stderr", size: int = None):
+        if size is not None and (not isinstance(size, int) or size < 0):
+            raise RpcError(INVALID_PARAMS, "`size` should be non-negative int")
+        name = self.get_node(node).name
+        try:
+            return get_log_drain().tail(name, stream, size)
+        except KeyError:
+            raise RpcError(INVALID_PARAMS, f"No {stream} of {name} drained")
+
+    def rpc_stop(self):
+        self.stopping = True
+        threading.Thread(target=self.shutdown, daemon=True).start()
+        return True
+
+
+class RpcClient:
+    """JSON-RPC client of `RpcServer`.
+
+    Typical usage example:
+
+        with RpcClient("/tmp/p4ws.sock") as client:
+            print(client.call("nodes"))
+    """
+
+    def __init__(self, path: str):
+        """Connect to a server.
+
+        Args:
+            path: Path to the socket.
+        """
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.rfile = self.sock.makefile("rb")
+        self.next_id = 0
+
+    def call(self, method: str, **params):
+        """Call a method.
+
+        Args:
+            method: Name of method.
+            **params: Parameters of method.
+
+        Returns:
+            Result of method.
+
+        Raises:
+            RpcError: Error returned by server.
+            ConnectionError: Connection closed by server.
+        """
+
+        self.next_id += 1
+        request = {"jsonrpc": "2.0", "id": self.next_id,
+                   "method": method, "params": params}
+        self.sock.sendall(json.dumps(request).encode() + b"\n")
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        response = json.loads(line)
+        if "error" in response:
+            raise RpcError(response["error"]["code"],
+                           response["error"]["message"])
+        return response["result"]
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,430 @@
+"""Sharded execution of a topology over several processes.
+
+Nodes of a topology are partitioned into shards, and each shard is run by a
+worker process with its own `Mininet`, so building, starting and configuring
+nodes scale with cores. Links inside a shard are created by its worker, and
+links across shards are stitched by the coordinator, which creates each veth
+pair with its ends moved into namespaces of both nodes by PID, before the
+workers start their switches.
+
+Nodes are partitioned in breadth-first order from switches, with hosts next
+to their switches, into shards of equal size, which keeps most links inside
+a shard. Default IP and MAC addresses of hosts are assigned by the
+coordinator in the order of `Mininet`, so they are the same as unsharded.
+
+Typical usage example:
+
+    sharded = ShardedNet(topo, 4, make_net, configure, output)
+    sharded.start()
+    print(sharded.output)
+    sharded.stop()
+
+Notes
+-----
+Controllers are only added by the first shard. `TofinoModel` is not
+supported, as its veth names depend on instances of the same process.
+"""
+
+import multiprocessing
+import signal
+import subprocess
+import traceback
+from collections import deque
+from typing import Callable, Dict, List, Tuple, Union
+
+from mininet.log import debug, error, info
+from mininet.net import Mininet
+from mininet.topo import Topo
+from mininet.util import ipAdd, macColonHex, netParse
+
+from p4ws.state import make_state
+
+from .batchconf import apply_node_scripts
+from .cgroup import CgroupManager
+from .error import ParserError
+from .linkprofile import LinkShaper
+from .logdrain import get_log_drain
+from .placement import apply_placement
+from .links.BatchLink import IP_EXEC, BatchLink, flush_links
+from .nodes.SimpleSwitch import SimpleSwitch
+from .nodes.SimpleSwitchGrpc import SimpleSwitchGrpc
+from .nodes.TofinoModel import TofinoModel
+from .readiness import latency_histogram
+from .staticarp import build_neighbor_table, compile_static_arp, update_macs
+from .teardown import stop_net
+
+# Default IP base of Mininet
+DEFAULT_IP_BASE = "10.0.0.0/8"
+
+# Seconds to wait for a worker to stop
+STOP_TIMEOUT = 30.0
+
+
+class StitchedLink:
+    """Local end of a link across shards, duck typed as `mininet.link.Link`
+    for `LinkShaper`.
+
+    Attributes:
+        intf1: The local interface.
+        intf2: None, the other end is owned by another shard.
+        profile: Name of link profile, or None.
+    """
+
+    def __init__(self, intf, profile: Union[str, None] = None):
+        self.intf1 = intf
+        self.intf2 = None
+        self.profile = profile
+
+
+def partition_topo(topo: Topo, shards: int):
+    """Partition nodes of a topology into shards.
+
+    Args:
+        topo: The topology.
+        shards: Number of shards.
+
+    Returns:
+        Name of node -> index of shard.
+    """
+
+    neighbors: Dict[str, List[str]] = dict((n, []) for n in topo.nodes())
+    for node1, node2 in topo.links(sort=True):
+        neighbors[node1].append(node2)
+        neighbors[node2].append(node1)
+
+    # Hosts are visited right after their switches
+    order = []
+    seen = set()
+    for root in topo.switches() + topo.hosts():
+        if root in seen:
+            continue
+        seen.add(root)
+        queue = deque([root])
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for n in sorted(neighbors[node], key=lambda n: (topo.isSwitch(n), n)):
+                if n not in seen:
+                    seen.add(n)
+                    queue.append(n)
+
+    size = max(1, -(-len(order) // shards))
+    return dict((node, i // size) for i, node in enumerate(order))
+
+
+def make_shard_topos(topo: Topo, owners: Dict[str, int], shards: int,
+                     ip_base: str = DEFAULT_IP_BASE, auto_set_macs: bool = False,
+                     default_switch: Union[type, None] = None):
+    """Split a topology into shards.
+
+    Default ports of switches are assigned here, like default addresses of
+    hosts, as counters of classes are not shared by workers.
+
+    Args:
+        topo: The topology.
+        owners: Name of node -> index of shard.
+        shards: Number of shards.
+        ip_base: Base of default IP addresses of hosts.
+        auto_set_macs: Set default MAC addresses of hosts, like `Mininet`.
+        default_switch: Class of switches without `cls`, or None.
+
+    Returns:
+        A tuple of topologies of shards, local ends of links across shards of
+        each shard, as (node, port, interface name, params, profile), and
+        links across shards, as (name1, mac1, node1, name2, mac2, node2).
+    """
+
+    topos = [Topo() for _ in range(shards)]
+    stitches: List[List[tuple]] = [[] for _ in range(shards)]
+    cross_links: List[tuple] = []
+
+    ip_base_num, prefix_len = netParse(ip_base)
+    for i, name in enumerate(topo.hosts()):
+        params = dict(topo.nodeInfo(name))
+        params.setdefault("ip", f"{ipAdd(i + 1, ipBaseNum=ip_base_num, prefixLen=prefix_len)}/{prefix_len}")
+        if auto_set_macs:
+            params.setdefault("mac", macColonHex(i + 1))
+        topos[owners[name]].addHost(name, **params)
+    for name in topo.switches():
+        params = dict(topo.nodeInfo(name))
+        params.pop("isSwitch", None)
+        cls = params.get("cls")
+        if isinstance(cls, type) and issubclass(cls, TofinoModel):
+            raise ParserError(f"TofinoModel cannot be sharded: {name}")
+        cls = cls if cls is not None else default_switch
+        # Reserved by each worker if ports are allocated
+        if isinstance(cls, type) and issubclass(cls, SimpleSwitch) \
+                and SimpleSwitch.port_allocator is None:
+            if params.get("listenPort") is None:
+                params["listenPort"] = SimpleSwitch.listen_port_base
+                SimpleSwitch.listen_port_base += 1
+            if issubclass(cls, SimpleSwitchGrpc) and params.get("grpc_server_port") is None:
+                params["grpc_server_port"] = SimpleSwitchGrpc.grpc_listen_port_base
+                SimpleSwitchGrpc.grpc_listen_port_base += 1
+        topos[owners[name]].addSwitch(name, **params)
+
+    for node1, node2, params in topo.links(sort=True, withInfo=True):
+        params = dict(params)
+        shard1, shard2 = owners[node1], owners[node2]
+        if shard1 == shard2:
+            topos[shard1].addLink(**params)
+            continue
+        port1, port2 = params["port1"], params["port2"]
+        name1 = params.get("intfName1") or f"{BatchLink.intf_prefix}{node1}-eth{port1}"
+        name2 = params.get("intfName2") or f"{BatchLink.intf_prefix}{node2}-eth{port2}"
+        params1 = dict(params.get("params1") or {})
+        params2 = dict(params.get("params2") or {})
+        mac1 = params.get("addr1") or params1.pop("mac", None)
+        mac2 = params.get("addr2") or params2.pop("mac", None)
+        profile = params.get("profile")
+        stitches[shard1].append((node1, port1, name1, params1, profile))
+        stitches[shard2].append((node2, port2, name2, params2, profile))
+        cross_links.append((name1, mac1, node1, name2, mac2, node2))
+    return topos, stitches, cross_links
+
+
+def stitch_links(cross_links: List[tuple], pids: Dict[str, int]):
+    """Create veth pairs of links across shards by one `ip -batch` process.
+
+    Both ends are moved into namespaces of their nodes by PID, and are
+    brought up by their workers.
+
+    Args:
+        cross_links: Links across shards, see `make_shard_topos`.
+        pids: Name of node -> PID of its shell.
+
+    Raises:
+        RuntimeError: Failed to create interface pairs.
+    """
+
+    def end(name: str, mac: Union[str, None], node: str):
+        return f"name {name}" + (f" address {mac}" if mac else "") + f" netns {pids[node]}"
+
+    if not cross_links:
+        return
+    script = "".join(f"link add {end(name1, mac1, node1)} type veth peer {end(name2, mac2, node2)}\n"
+                     for name1, mac1, node1, name2, mac2, node2 in cross_links)
+    result = subprocess.run([IP_EXEC, "-batch", "-"], input=script.encode(),
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"Error stitching links across shards: {result.stdout.decode(errors='replace')}")
+
+
+def _run_worker(conn, index: int, topo: Topo, stitches: List[tuple],
+                link_profiles: Dict[str, dict],
+                make_net: Callable[[int], Mininet],
+                configure: Callable[[Mininet], None],
+                output: Callable[[Mininet], dict],
+                static_arp_scope: Union[str, bool],
+                placement: Dict[str, List[int]],
+                cgroups: Union[CgroupManager, None]):
+    """Main of a worker, driven by messages of the coordinator."""
+
+    # Interrupts are handled by the coordinator
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    net = None
+    try:
+        net = make_net(index)
+        net.buildFromTopo(topo)
+        flush_links()
+        conn.send(("built", dict((n.name, n.pid) for n in net.hosts + net.switches)))
+        if conn.recv()[0] != "stitched":
+            return
+
+        # Stitched interfaces are already in namespaces of their nodes
+        links = [StitchedLink(net.intf(name, node=net[node], port=port,
+                                       moveIntfFn=lambda *_: True, **params), profile)
+                 for node, port, name, params, profile in stitches]
+        net.configHosts()
+        net.built = True
+        apply_placement(net.hosts + net.switches, placement)
+        if cgroups is not None:
+            cgroups.add_nodes(net.hosts, net.switches)
+        net.start()
+        LinkShaper(link_profiles).apply(net.links + links)
+        configure(net)
+        if static_arp_scope is not False:
+            update_macs(net.hosts)
+            conn.send(("arp", build_neighbor_table(net.hosts)))
+            message = conn.recv()
+            if message[0] != "arp":
+                return
+            apply_node_scripts(compile_static_arp(net.hosts, message[1], static_arp_scope))
+
+        conn.send(("started", (output(net), make_state(net)["nodes"])))
+        conn.recv()
+    except EOFError:
+        pass
+    except Exception as e:
+        debug(traceback.format_exc())
+        conn.send(("error", f"Shard {index}: {e}"))
+    finally:
+        if net is not None:
+            stop_net(net)
+        # Workers exit without flushing files
+        get_log_drain().close()
+        conn.close()
+
+
+class ShardedNet:
+    """Network run by several worker processes.
+
+    Attributes:
+        shards: Number of shards.
+        owners: Name of node -> index of shard.
+        pids: Name of node -> PID of its shell, hosts first.
+        nodes: Name of node -> its state, see `p4ws.state.make_state`.
+        output: Merged outputs of workers, see `make_net_output` of loadmn.
+    """
+
+    def __init__(self, topo: Topo, shards: int,
+                 make_net: Callable[[int], Mininet],
+                 configure: Callable[[Mininet], None],
+                 output: Callable[[Mininet], dict],
+                 static_arp_scope: Union[str, bool] = False,
+                 ip_base: str = DEFAULT_IP_BASE, auto_set_macs: bool = False,
+                 placement: Union[Dict[str, List[int]], None] = None,
+                 cgroups: Union[CgroupManager, None] = None,
+                 default_switch: Union[type, None] = None):
+        """Partition a topology.
+
+        Args:
+            topo: The topology, a `JsonTopo`.
+            shards: Number of shards, more than nodes are reduced.
+            make_net: Function makes an empty Mininet with `build=False`
+                for a shard by its index.
+            configure: Function configures nodes of a started shard.
+            output: Function returns output of a shard, like `make_net_output`.
+            static_arp_scope: Scope of static ARP population, or False.
+            ip_base: Base of default IP addresses of hosts.
+            auto_set_macs: Set default MAC addresses of hosts.
+            placement: Name of node -> CPUs, see `make_placement`, or None.
+            cgroups: Cgroups of nodes, set up by the coordinator, or None.
+            default_switch: Class of switches without `cls`, made by `make_net`.
+
+        Raises:
+            ParserError: Topology cannot be sharded.
+        """
+
+        self.shards = max(1, min(shards, len(topo.nodes())))
+        self.owners = partition_topo(topo, self.shards)
+        self.topos, self.stitches, self.cross_links = make_shard_topos(
+            topo, self.owners, self.shards, ip_base, auto_set_macs, default_switch)
+        self.link_profiles = getattr(topo, "link_profiles", {})
+        self.make_net = make_net
+        self.configure = configure
+        self.make_output = output
+        self.static_arp_scope = static_arp_scope
+        self.placement = placement or {}
+        self.cgroups = cgroups
+        self.pids: Dict[str, int] = {}
+        self.nodes: Dict[str, dict] = {}
+        self.output = None
+        self._workers: List[Tuple[multiprocessing.Process, object]] = []
+
+    def _recv_all(self, kind: str):
+        """Receive a message of `kind` from each worker.
+
+        Raises:
+            RuntimeError: A worker failed.
+        """
+
+        messages, errors = [], []
+        for _, conn in self._workers:
+            try:
+                message = conn.recv()
+            except EOFError:
+                message = ("error", "Worker exited")
+            if message[0] == "error":
+                errors.append(message[1])
+            elif message[0] != kind:
+                errors.append(f"Unexpected message: {message[0]}")
+            messages.append(message)
+        if errors:
+            raise RuntimeError("\n".join(errors))
+        return [message[1] for message in messages]
+
+    def _send_all(self, *message):
+        for _, conn in self._workers:
+            try:
+                conn.send(message)
+            except (BrokenPipeError, EOFError, OSError):
+                pass
+
+    def start(self):
+        """Start workers, stitch links across shards, and wait for all nodes
+        started and configured.
+
+        Raises:
+            RuntimeError: A worker failed, all workers are stopped.
+        """
+
+        info(f"*** Starting {self.shards} shards, "
+             f"{len(self.cross_links)} links across shards\n")
+        context = multiprocessing.get_context("fork")
+        for index in range(self.shards):
+            parent, child = context.Pipe()
+            worker = context.Process(
+                target=_run_worker, name=f"p4ws-shard-{index}",
+                args=(child, index, self.topos[index], self.stitches[index],
+                      self.link_profiles, self.make_net, self.configure,
+                      self.make_output, self.static_arp_scope, self.placement,
+                      self.cgroups))
+            worker.start()
+            child.close()
+            self._workers.append((worker, parent))
+
+        try:
+            pids = {}
+            for shard_pids in self._recv_all("built"):
+                pids.update(shard_pids)
+
+            stitch_links(self.cross_links, pids)
+            self._send_all("stitched")
+
+            if self.static_arp_scope is not False:
+                table = {}
+                for shard_table in self._recv_all("arp"):
+                    table.update(shard_table)
+                self._send_all("arp", table)
+
+            started = self._recv_all("started")
+        except BaseException:
+            self.stop()
+            raise
+
+        outputs = [output for output, _ in started]
+        self.output = self.merge_outputs(outputs)
+        self.nodes = {}
+        for _, nodes in started:
+            self.nodes.update(nodes)
+        self.pids = dict((name, pids[name]) for name in sorted(
+            pids, key=lambda n: (n not in self.output["hosts"], n)))
+
+    @staticmethod
+    def merge_outputs(outputs: List[dict]):
+        """Merge outputs of shards."""
+
+        merged = {"hosts": {}, "switches": {}}
+        for output in outputs:
+            merged["hosts"].update(output["hosts"])
+            merged["switches"].update(output["switches"])
+        latencies = [s["startup-latency"] for s in merged["switches"].values()
+                     if s.get("startup-latency") is not None]
+        merged["startup-latency-histogram"] = [
+            [bound, count] for bound, count in latency_histogram(latencies)]
+        return merged
+
+    def stop(self):
+        """Stop all workers and their nodes."""
+
+        self._send_all("stop")
+        for worker, conn in self._workers:
+            worker.join(STOP_TIMEOUT)
+            if worker.is_alive():
+                error(f"*** {worker.name} not stopped, killing it\n")
+                worker.kill()
+                worker.join()
+            conn.close()
+        self._workers = []
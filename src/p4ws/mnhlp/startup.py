@@ -0,0 +1,57 @@
+"""Concurrent startup of switches.
+
+Switches supporting batch startup spawn their processes in `start` and defer
+waiting for readiness to `batchStartup`, where all of them are waited for
+concurrently under one overall deadline.
+
+Typical usage example:
+
+    latencies = wait_for_switches(switches, timeout=60)
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Union
+
+from mininet.node import Switch
+
+
+def wait_for_switches(switches: Iterable[Switch], timeout: Union[float, None] = None):
+    """Wait until all spawned switches are ready, concurrently.
+
+    Each switch should have been spawned by its `start` method, which records
+    `start_time`, and should provide `wait_for_server_start(timeout)`.
+    On success, `startup_latency` of the switch is set.
+
+    Args:
+        switches: Spawned switches.
+        timeout: Overall deadline in seconds counted from the earliest spawned
+            switch, None for no deadline.
+
+    Returns:
+        A dict maps each switch to its startup latency in seconds, or None if
+        it shut down or did not become ready before the deadline.
+    """
+
+    switches = list(switches)
+    if not switches:
+        return {}
+
+    deadline = None
+    if timeout is not None:
+        deadline = min(s.start_time for s in switches) + timeout
+
+    def wait(switch):
+        remaining = None if deadline is None else max(
+            deadline - time.monotonic(), 0)
+        if not switch.wait_for_server_start(remaining):
+            return None
+        switch.startup_latency = time.monotonic() - switch.start_time
+        return switch.startup_latency
+
+    with ThreadPoolExecutor(max_workers=len(switches),
+                            thread_name_prefix="p4ws.mnhlp.startup") as executor:
+        latencies = executor.map(wait, switches)
+        result: Dict[Switch, Union[float, None]] = dict(
+            zip(switches, latencies))
+    return result
@@ -0,0 +1,142 @@
+"""Static ARP population of hosts.
+
+Unlike `Mininet.staticArp`, which runs one `arp` command for every pair of
+hosts, the table of IP to MAC addresses is built once, and pushed into each
+host by one `ip -batch` process. Hosts are populated in parallel.
+
+Typical usage example:
+
+    populate_static_arp(net.hosts, scope="subnet")
+"""
+
+import ipaddress
+import re
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import PIPE
+from typing import Dict, List
+
+from mininet.node import Node
+
+from .batchconf import IP_EXEC, MAX_WORKERS, NodeScript, apply_node_scripts
+
+# Scopes of static ARP population
+# - all: every host learns all other hosts, like `Mininet.staticArp`
+# - subnet: every host learns hosts in subnets of its interfaces
+STATIC_ARP_SCOPES = ("all", "subnet")
+
+_link_ether_regex = re.compile(r"^\d+:\s+([^:@\s]+)[@:].*link/ether\s+(\S+)")
+
+
+def read_macs(node: Node):
+    """Read MAC addresses of all interfaces of a node at once.
+
+    Args:
+        node: The node.
+
+    Returns:
+        A dict maps interface name to MAC address.
+    """
+
+    proc = node.popen([IP_EXEC, "-o", "link", "show"], stdout=PIPE, stderr=PIPE)
+    out, _ = proc.communicate()
+    macs: Dict[str, str] = {}
+    for line in out.decode(errors="replace").splitlines():
+        m = _link_ether_regex.match(line)
+        if m:
+            macs[m.group(1)] = m.group(2)
+    return macs
+
+
+def update_macs(hosts: List[Node], max_workers: int = MAX_WORKERS):
+    """Fill MAC addresses of interfaces unknown to Mininet.
+
+    Mininet only tracks MAC addresses specified explicitly, so missing ones
+    are read from hosts in parallel, one process per host.
+
+    Args:
+        hosts: Hosts to update.
+        max_workers: Max number of hosts read at the same time.
+    """
+
+    hosts = [h for h in hosts if any(
+        intf.mac is None and intf.name != "lo" for intf in h.intfs.values())]
+    if not hosts:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(hosts)),
+                            thread_name_prefix="p4ws.mnhlp.staticarp") as executor:
+        for host, macs in zip(hosts, executor.map(read_macs, hosts)):
+            for intf in host.intfs.values():
+                if intf.mac is None and intf.name in macs:
+                    intf.mac = macs[intf.name]
+
+
+def build_neighbor_table(hosts: List[Node]):
+    """Build table of IP addresses to MAC addresses of hosts.
+
+    Args:
+        hosts: Hosts.
+
+    Returns:
+        A dict maps IP address to MAC address.
+    """
+
+    table: Dict[str, str] = {}
+    for host in hosts:
+        for intf in host.intfs.values():
+            if intf.name == "lo" or intf.ip is None or intf.mac is None:
+                continue
+            table[intf.ip] = intf.mac
+    return table
+
+
+def compile_static_arp(hosts: List[Node], table: Dict[str, str], scope: str = "all"):
+    """Compile static ARP entries of hosts.
+
+    Args:
+        hosts: Hosts to populate.
+        table: Table of IP addresses to MAC addresses.
+        scope: One of `STATIC_ARP_SCOPES`.
+
+    Returns:
+        A list of NodeScript.
+    """
+
+    if scope not in STATIC_ARP_SCOPES:
+        raise ValueError(
+            f"Invalid scope: {scope}, should be one of {STATIC_ARP_SCOPES}")
+
+    # Addresses are parsed once, and subnets once per host
+    entries = [(ip, ipaddress.ip_address(ip), mac) for ip, mac in table.items()]
+    scripts = []
+    for host in hosts:
+        script = NodeScript(host)
+        networks = script.networks()
+        own_ips = {intf.ip for intf in host.intfs.values()}
+        for ip, addr, mac in entries:
+            if ip in own_ips:
+                continue
+            intf = script.intf_for(addr, fallback=(scope == "all"), networks=networks)
+            if intf is None:
+                continue
+            script.set_arp(ip, mac, intf)
+        scripts.append(script)
+    return scripts
+
+
+def populate_static_arp(hosts: List[Node], scope: str = "all", max_workers: int = MAX_WORKERS):
+    """Populate static ARP entries of hosts.
+
+    Args:
+        hosts: Hosts to populate.
+        scope: One of `STATIC_ARP_SCOPES`.
+        max_workers: Max number of hosts populated at the same time.
+
+    Raises:
+        ValueError: Invalid scope.
+        RuntimeError: Some commands failed.
+    """
+
+    update_macs(hosts, max_workers)
+    table = build_neighbor_table(hosts)
+    apply_node_scripts(compile_static_arp(
+        hosts, table, scope), max_workers)
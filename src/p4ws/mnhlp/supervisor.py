@@ -0,0 +1,298 @@
+"""Supervisor restarting crashed switches.
+
+Switches report unexpected exits, and switches not started in time, by
+`on_crash` of their class. The supervisor restarts each of them by its
+`restart`, with the same interfaces and ports, and replays its startup
+configuration. Restarts are limited by a policy, from `supervisor` of the net
+file:
+
+    "supervisor": {
+        "max-restarts": 5,
+        "window": 300,
+        "backoff": 1,
+        "max-backoff": 30,
+        "start-timeout": 30,
+        "nodes": { "s1": { "max-restarts": 0 } }
+    }
+
+- `max-restarts`: Max number of restarts of a switch in `window` seconds,
+  then it is given up (default: 5).
+- `window`: Seconds of the window (default: 300).
+- `backoff`: Seconds before the first restart, doubled by each failed
+  restart (default: 1).
+- `max-backoff`: Max seconds before a restart (default: 30).
+- `start-timeout`: Seconds to wait for a restarted switch to serve, then the
+  restart failed (default: 30).
+- `nodes`: Policies of switches, override the policy above.
+
+`TofinoModel` is not restarted, as all instances share one model process.
+
+Typical usage example:
+
+    supervisor = Supervisor(net_config["supervisor"], replay)
+    supervisor.start()
+    ...
+    supervisor.stop()
+    print(supervisor.to_json())
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Union
+
+from mininet.log import error, info
+from mininet.node import Node
+
+from p4ws.utils import get_type_name
+
+from .error import ParserError
+from .nodes.SimpleSwitch import SimpleSwitch
+
+# Keys of a policy -> default
+POLICY_KEYS = {"max-restarts": 5, "window": 300.0, "backoff": 1.0, "max-backoff": 30.0,
+               "start-timeout": 30.0}
+
+
+def parse_policy(spec: dict, base: Union[dict, None] = None):
+    """Parse a restart policy.
+
+    Args:
+        spec: The policy, with keys in `POLICY_KEYS`.
+        base: Policy overridden by `spec`, None for defaults.
+
+    Raises:
+        ParserError: Policy is incorrect.
+    """
+
+    if not isinstance(spec, dict):
+        raise ParserError(f"Restart policy should be object, not {get_type_name(spec)}")
+    policy = dict(base or POLICY_KEYS)
+    for key, value in spec.items():
+        if key not in POLICY_KEYS:
+            raise ParserError(
+                f"Unknown key `{key}` of restart policy, should be one of {', '.join(POLICY_KEYS)}")
+        if key == "max-restarts":
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                raise ParserError(f"`max-restarts` should be non-negative int, not {value!r}")
+        elif not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+            raise ParserError(f"`{key}` should be non-negative seconds, not {value!r}")
+        policy[key] = value
+    return policy
+
+
+def parse_supervisor(spec: dict):
+    """Parse `supervisor` of the net file.
+
+    Returns:
+        Policy of all switches, and policies of named switches.
+
+    Raises:
+        ParserError: `supervisor` is incorrect.
+    """
+
+    if not isinstance(spec, dict):
+        raise ParserError(f"`supervisor` should be object, not {get_type_name(spec)}")
+    spec = dict(spec)
+    nodes = spec.pop("nodes", {})
+    if not isinstance(nodes, dict):
+        raise ParserError(f"`nodes` of `supervisor` should be object, not {get_type_name(nodes)}")
+    policy = parse_policy(spec)
+    return policy, dict((name, parse_policy(p, policy)) for name, p in nodes.items())
+
+
+class NodeStatus:
+    """Supervision status of a switch.
+
+    Attributes:
+        state: `running`, `restarting`, or `failed` if given up.
+        crashes: Number of crashes, including failed restarts.
+        restarts: Number of successful restarts.
+        downtime: Seconds from crashes until the switch served again.
+        last_exit: Exit code of the last crash, None if timed out.
+        down_since: Time of the crash being recovered, by `time.monotonic`.
+        restart_times: Times of recent restarts, to limit them.
+    """
+
+    def __init__(self):
+        self.state = "running"
+        self.crashes = 0
+        self.restarts = 0
+        self.downtime = 0.0
+        self.last_exit = None
+        self.down_since = None
+        self.restart_times: List[float] = []
+
+    def to_json(self):
+        downtime = self.downtime
+        if self.down_since is not None:
+            downtime += time.monotonic() - self.down_since
+        return {
+            "state": self.state,
+            "crashes": self.crashes,
+            "restarts": self.restarts,
+            "downtime": downtime,
+            "last-exit": self.last_exit
+        }
+
+
+class Supervisor:
+    """Supervisor of switches with `restart`.
+
+    Attributes:
+        policy: Restart policy of all switches.
+        policies: Restart policies of named switches.
+        replay: Function replays startup configuration of a restarted switch, or None.
+        status: Name of switch -> NodeStatus, of switches crashed.
+        lock: Guards `status`, never held while a switch is restarted.
+    """
+
+    def __init__(self, spec: dict, replay: Union[Callable[[Node], None], None] = None):
+        """Parse policies.
+
+        Args:
+            spec: `supervisor` of the net file.
+            replay: Function replays startup configuration of a switch.
+
+        Raises:
+            ParserError: `supervisor` is incorrect.
+        """
+
+        self.policy, self.policies = parse_supervisor(spec)
+        self.replay = replay
+        self.status: Dict[str, NodeStatus] = {}
+        self.lock = threading.Lock()
+        # Name of switch -> lock held while restarting it, also by other callers
+        self._restart_locks: Dict[str, threading.Lock] = {}
+        self._events: "queue.Queue[Union[Node, None]]" = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start handling crashes of switches."""
+
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="p4ws.mnhlp.supervisor", daemon=True)
+        self._thread.start()
+        SimpleSwitch.on_crash = self.on_crash
+
+    def stop(self):
+        """Stop handling crashes, before the network is stopped."""
+
+        SimpleSwitch.on_crash = None
+        self._stopped.set()
+        self._events.put(None)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def on_crash(self, switch: Node, exit_code: Union[int, None]):
+        """Event: a switch exited unexpectedly, or was not started in time.
+
+        Called by threads of switches, so it only queues the switch.
+        """
+
+        with self.lock:
+            status = self.status.setdefault(switch.name, NodeStatus())
+            # Crashes while restarting are handled by the restart
+            if status.state != "running":
+                return
+            status.state = "restarting"
+            status.crashes += 1
+            status.last_exit = exit_code
+            status.down_since = time.monotonic()
+        self._events.put(switch)
+
+    def _restart_lock(self, switch: Node):
+        with self.lock:
+            return self._restart_locks.setdefault(switch.name, threading.Lock())
+
+    def _policy(self, switch: Node):
+        return self.policies.get(switch.name, self.policy)
+
+    def restart(self, switch: Node, timeout: Union[float, None] = None):
+        """Restart a switch now, e.g. requested by a client.
+
+        Args:
+            switch: The switch.
+            timeout: Seconds to wait for it, None for `start-timeout`.
+
+        Returns:
+            True if the switch serves again in time.
+        """
+
+        if timeout is None:
+            timeout = self._policy(switch)["start-timeout"]
+        with self._restart_lock(switch):
+            started = switch.restart(timeout)
+            if started:
+                self._replay(switch)
+            return started
+
+    def _replay(self, switch: Node):
+        if self.replay is None:
+            return
+        try:
+            self.replay(switch)
+        except (ParserError, RuntimeError, ValueError) as e:
+            error(f"*** Cannot replay configuration of {switch.name}: {e}\n")
+
+    def _run(self):
+        while True:
+            switch = self._events.get()
+            if switch is None or self._stopped.is_set():
+                return
+            self._recover(switch)
+
+    def _recover(self, switch: Node):
+        """Restart a crashed switch until it serves, or its policy gives up."""
+
+        status = self.status[switch.name]
+        policy = self._policy(switch)
+        backoff = policy["backoff"]
+        while not self._stopped.is_set():
+            now = time.monotonic()
+            status.restart_times = [t for t in status.restart_times
+                                    if now - t < policy["window"]]
+            if len(status.restart_times) >= policy["max-restarts"]:
+                error(f"*** {switch.name} given up, restarted {len(status.restart_times)} times "
+                      f"in {policy['window']:g}s, at most {policy['max-restarts']}\n")
+                with self.lock:
+                    status.state = "failed"
+                return
+            if self._stopped.wait(min(backoff, policy["max-backoff"])):
+                return
+
+            info(f"*** Restarting {switch.name}, exit code {status.last_exit}\n")
+            with self.lock:
+                status.restart_times.append(time.monotonic())
+            # Crashes while restarting are ignored by `on_crash`, as the
+            # state is not running
+            with self._restart_lock(switch):
+                started = switch.restart(policy["start-timeout"])
+                exit_code = None
+                if started:
+                    self._replay(switch)
+                else:
+                    exit_code = switch.sw.poll()
+                    # Not served in time
+                    if exit_code is None:
+                        switch.stop()
+            with self.lock:
+                if started:
+                    status.downtime += time.monotonic() - status.down_since
+                    status.down_since = None
+                    status.restarts += 1
+                    status.state = "running"
+                    info(f"*** {switch.name} restarted\n")
+                    return
+                status.crashes += 1
+                status.last_exit = exit_code
+            backoff *= 2
+
+    def to_json(self):
+        """Get restart counts and downtime of switches crashed."""
+
+        with self.lock:
+            return dict((name, status.to_json()) for name, status in self.status.items())
@@ -0,0 +1,91 @@
+"""Parallel teardown of networks.
+
+`Mininet.stop` deletes links one by one, each by two shell round trips.
+Here links are deleted in bulk: deleting one end of a veth pair deletes its
+peer, so one end of each link is deleted by one `ip -batch` process per
+namespace, namespaces in parallel. Switches supporting `batchShutdown` are
+then stopped concurrently by `Mininet.stop`.
+
+Typical usage example:
+
+    stop_net(net)
+"""
+
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from mininet.link import Link
+from mininet.log import debug, info
+from mininet.net import Mininet
+from mininet.node import Node
+
+from .batchconf import IP_EXEC, MAX_WORKERS, NodeScript, apply_node_script
+
+
+def delete_links(links: List[Link], max_workers: int = MAX_WORKERS):
+    """Delete links in bulk.
+
+    Ends in the root namespace are preferred, so most links are deleted by a
+    single process. Failures are ignored, like `Intf.delete`.
+
+    Args:
+        links: Links to delete.
+        max_workers: Max number of namespaces handled at the same time.
+    """
+
+    root_commands: List[str] = []
+    scripts: Dict[Node, NodeScript] = {}
+    deleted = []
+    for link in links:
+        if link.intf1 is None or link.intf2 is None:
+            continue
+        root_intfs = [i for i in (link.intf1, link.intf2)
+                      if not i.node.inNamespace]
+        if root_intfs:
+            root_commands.append(f"link del dev {root_intfs[0].name}")
+        else:
+            intf = link.intf1
+            if intf.node not in scripts:
+                scripts[intf.node] = NodeScript(intf.node)
+            scripts[intf.node].add(f"link del dev {intf.name}")
+        deleted.append(link)
+
+    if root_commands:
+        result = subprocess.run([IP_EXEC, "-force", "-batch", "-"],
+                                input=("\n".join(root_commands) + "\n").encode(),
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        if result.returncode != 0:
+            debug(f"delete_links: {result.stdout.decode(errors='replace')}\n")
+
+    def apply(script: NodeScript):
+        try:
+            apply_node_script(script)
+        except RuntimeError as e:
+            debug(f"delete_links: {e}\n")
+
+    if scripts:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(scripts)),
+                                thread_name_prefix="p4ws.mnhlp.teardown") as executor:
+            list(executor.map(apply, scripts.values()))
+
+    # Update Mininet states, like `Link.delete`
+    for link in deleted:
+        for intf in (link.intf1, link.intf2):
+            intf.node.delIntf(intf)
+            intf.link = None
+        link.intf1, link.intf2 = None, None
+
+
+def stop_net(net: Mininet, max_workers: int = MAX_WORKERS):
+    """Stop a network, with links deleted in bulk.
+
+    Args:
+        net: The network.
+        max_workers: Max number of namespaces handled at the same time.
+    """
+
+    info(f"*** Deleting {len(net.links)} links\n")
+    delete_links(net.links, max_workers)
+    net.links.clear()
+    net.stop()
@@ -0,0 +1,195 @@
+"""Compact range and template syntax of topology files.
+
+Ranges in names of nodes expand to a node per number, e.g. `"h[1-4]"` to
+`h1`, `h2`, `h3` and `h4`. Numbers are zero-padded to the width of the lower
+bound if it has leading zeros, e.g. `"h[01-10]"` to `h01` ... `h10`.
+
+A link template repeats a link for each value of its variables:
+
+    { "for": { "i": "[1-1024]" }, "link": ["h{i}", "s{i//32}", 0, "{i%32+2}"] }
+
+Expressions in braces support int constants, variables and `+ - * // %`.
+Strings of a single expression, like ports above, are replaced by int.
+
+Everything expands lazily, item by item.
+
+Typical usage example:
+
+    for name in expand_range("h[1-1024]"):
+        topo.addHost(name)
+"""
+
+import ast
+import itertools
+import operator
+import re
+from typing import Dict, Iterator
+
+from p4ws.utils import get_type_name
+
+from .error import ParserError
+
+_range_regex = re.compile(r"\[(\d+)-(\d+)\]")
+_expr_regex = re.compile(r"\{([^{}]*)\}")
+
+_binary_operators = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod
+}
+
+_unary_operators = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg
+}
+
+
+def parse_range(spec: str):
+    """Parse a range like `[1-4]`.
+
+    Args:
+        spec: The range, bounds are inclusive.
+
+    Returns:
+        A tuple of a range and width of zero-padding.
+
+    Raises:
+        ParserError: Format of range is incorrect.
+    """
+
+    m = _range_regex.fullmatch(spec)
+    if m is None:
+        raise ParserError(f"Range should be like `[1-4]`, not {spec}")
+    return _make_range(m)
+
+
+def _make_range(m: re.Match):
+    lower, upper = m.group(1), m.group(2)
+    if int(lower) > int(upper):
+        raise ParserError(f"Empty range: {m.group(0)}")
+    width = len(lower) if len(lower) > 1 and lower.startswith("0") else 0
+    return range(int(lower), int(upper) + 1), width
+
+
+def expand_range(name: str) -> Iterator[str]:
+    """Expand ranges in a name.
+
+    Args:
+        name: Name with any number of ranges, e.g. `"h[1-4]"`.
+
+    Returns:
+        An iterator of names, the name itself if no range.
+
+    Raises:
+        ParserError: Format of range is incorrect.
+    """
+
+    m = _range_regex.search(name)
+    if m is None:
+        yield name
+        return
+    numbers, width = _make_range(m)
+    head, tail = name[:m.start()], name[m.end():]
+    for n in numbers:
+        for rest in expand_range(tail):
+            yield f"{head}{n:0{width}d}{rest}"
+
+
+def evaluate(expr: str, variables: Dict[str, int]) -> int:
+    """Evaluate an int expression without `eval`.
+
+    Args:
+        expr: Expression, e.g. `i//32`.
+        variables: Values of variables.
+
+    Returns:
+        Value of expression.
+
+    Raises:
+        ParserError: Expression is incorrect or not supported.
+    """
+
+    def visit(node):
+        if isinstance(node, ast.Expression):
+            return visit(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, int) and not isinstance(node.value, bool):
+            return node.value
+        if isinstance(node, ast.Name):
+            if node.id not in variables:
+                raise ParserError(f"Unknown variable `{node.id}` in `{expr}`")
+            return variables[node.id]
+        if isinstance(node, ast.BinOp) and type(node.op) in _binary_operators:
+            return _binary_operators[type(node.op)](visit(node.left), visit(node.right))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _unary_operators:
+            return _unary_operators[type(node.op)](visit(node.operand))
+        raise ParserError(f"Unsupported expression `{expr}`")
+
+    try:
+        tree = ast.parse(expr.strip(), mode="eval")
+    except SyntaxError:
+        raise ParserError(f"Invalid expression `{expr}`")
+    try:
+        return visit(tree)
+    except ZeroDivisionError:
+        raise ParserError(f"Division by zero in `{expr}`")
+
+
+def format_template(value, variables: Dict[str, int]):
+    """Substitute expressions in a template value.
+
+    Args:
+        value: A str, or a list or object of templates, others are kept.
+        variables: Values of variables.
+
+    Returns:
+        The value substituted, str of a single expression is replaced by int.
+    """
+
+    if isinstance(value, str):
+        m = _expr_regex.fullmatch(value)
+        if m is not None:
+            return evaluate(m.group(1), variables)
+        return _expr_regex.sub(lambda m: str(evaluate(m.group(1), variables)), value)
+    if isinstance(value, list):
+        return [format_template(v, variables) for v in value]
+    if isinstance(value, dict):
+        return dict((k, format_template(v, variables)) for k, v in value.items())
+    return value
+
+
+def expand_link_template(spec: dict) -> Iterator:
+    """Expand a link template.
+
+    Args:
+        spec: `for` maps variables to ranges, `link` is a link in any form of
+            the topology file.
+
+    Returns:
+        An iterator of links.
+
+    Raises:
+        ParserError: Format of template is incorrect.
+    """
+
+    spec = dict(spec)
+    variables, link = spec.pop("for"), spec.pop("link", None)
+    if not isinstance(variables, dict) or not variables:
+        raise ParserError(
+            f"`for` should be object of ranges, not {variables}")
+    if link is None:
+        raise ParserError("`link` of template should not be ignored")
+    if spec:
+        raise ParserError(f"Unsupported keys of template: {', '.join(spec)}")
+    for var, r in variables.items():
+        if not var.isidentifier():
+            raise ParserError(f"Invalid variable name `{var}`")
+        if not isinstance(r, str):
+            raise ParserError(
+                f"Range should be str, not {get_type_name(r)}")
+
+    names = list(variables)
+    ranges = [parse_range(variables[var])[0] for var in names]
+    for values in itertools.product(*ranges):
+        yield format_template(link, dict(zip(names, values)))
@@ -0,0 +1,177 @@
+"""State of a running network.
+
+`loadmn --state-file` writes PIDs of nodes of the running network, so other
+subcommands, e.g. `exec`, find them without asking Mininet. This module does
+not import Mininet.
+
+Typical usage example:
+
+    state = read_state(path)
+    pid = get_node_pid(state, "h1")
+"""
+
+import json
+import os
+import tempfile
+
+from p4ws.utils import get_class_names
+
+# Environment variable of default state file
+STATE_ENV = "P4WS_STATE_FILE"
+
+# PID and start time of the run owning nodes started by this process
+_run = None
+
+
+def get_start_time(pid: int):
+    """Get start time of a process, in clock ticks since boot.
+
+    Args:
+        pid: PID of the process.
+
+    Returns:
+        Start time, or None if the process does not exist.
+    """
+
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Command name may contain spaces and parentheses
+    return int(stat[stat.rindex(b")") + 2:].split()[19])
+
+
+def get_run():
+    """Get the run owning nodes started by this process.
+
+    The run is the first process asking for it, forked workers, e.g. shards,
+    inherit the run of their parent once it asked.
+
+    Returns:
+        PID and start time of the run.
+    """
+
+    global _run
+    if _run is None:
+        _run = (os.getpid(), get_start_time(os.getpid()))
+    return _run
+
+
+def make_node_mark(name: str):
+    """Make value of `NODE_ENV` of a node, its name and the run owning it.
+
+    Args:
+        name: Name of the node, or names of nodes sharing a process.
+
+    Returns:
+        The value, like `s1@1234:5678`.
+    """
+
+    pid, start_time = get_run()
+    return f"{name}@{pid}:{start_time}"
+
+
+def parse_node_mark(mark: str):
+    """Parse value of `NODE_ENV` made by `make_node_mark`.
+
+    Args:
+        mark: The value.
+
+    Returns:
+        Name of the node, PID and start time of the run, or None if incorrect.
+    """
+
+    name, sep, run = mark.rpartition("@")
+    pid, _, start_time = run.partition(":")
+    if not sep or not pid.isdigit() or not start_time.isdigit():
+        return None
+    return name, int(pid), int(start_time)
+
+
+def make_state(net, daemon=None):
+    """Make state of a running network.
+
+    Args:
+        net: The network, a `mininet.net.Mininet`.
+        daemon: Path to socket of JSON-RPC server, or None.
+
+    Returns:
+        PID of loadmn, socket of JSON-RPC server, and PIDs of nodes with their
+        classes and start times, to detect reused PIDs, and interfaces of
+        nodes in the root namespace.
+    """
+
+    nodes = {}
+    for kind, ns in (("host", net.hosts), ("switch", net.switches)):
+        for node in ns:
+            nodes[node.name] = {
+                "kind": kind,
+                "classes": get_class_names(node),
+                "pid": node.pid,
+                "start-time": get_start_time(node.pid),
+                # Interfaces in the root namespace, left over if loadmn crashed
+                "intfs": [] if node.inNamespace else
+                [name for name in node.intfNames() if name != "lo"]
+            }
+    return {
+        "pid": os.getpid(),
+        "daemon": os.path.abspath(daemon) if daemon else None,
+        "nodes": nodes
+    }
+
+
+def write_state(path: str, state: dict):
+    """Write state atomically."""
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                               prefix=".tmp.")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def read_state(path: str):
+    """Read state.
+
+    Args:
+        path: Path to state file.
+
+    Returns:
+        The state.
+
+    Raises:
+        OSError: State file cannot be read.
+        ValueError: State file is incorrect.
+    """
+
+    with open(path) as f:
+        state = json.load(f)
+    if not isinstance(state, dict) or not isinstance(state.get("nodes"), dict):
+        raise ValueError(f"{path} is not a state file")
+    return state
+
+
+def get_node_pid(state: dict, name: str):
+    """Get PID of a node.
+
+    Args:
+        state: The state.
+        name: Name of the node.
+
+    Returns:
+        PID of the node.
+
+    Raises:
+        KeyError: Node not found.
+        ProcessLookupError: Process of the node exited, the network may be stopped.
+    """
+
+    node = state["nodes"][name]
+    if get_start_time(node["pid"]) != node["start-time"]:
+        raise ProcessLookupError(f"Process of {name} ({node['pid']}) exited")
+    return node["pid"]
@@ -1,7 +1,49 @@
 """Utils."""
 
+import builtins
+import functools
 import importlib
 
+# Environment variable marking processes of p4ws nodes, its value is name of
+# node and the run owning it, see `p4ws.state.make_node_mark`
+NODE_ENV = "P4WS_NODE"
+
+
+# Short aliases of well-known types, name -> full type name
+TYPE_ALIASES = {
+    "BatchLink": "p4ws.mnhlp.links.BatchLink.BatchLink",
+    "NamespaceHost": "p4ws.mnhlp.nodes.NamespaceHost.NamespaceHost",
+    "SimpleSwitch": "p4ws.mnhlp.nodes.SimpleSwitch.SimpleSwitch",
+    "SimpleSwitchGrpc": "p4ws.mnhlp.nodes.SimpleSwitchGrpc.SimpleSwitchGrpc",
+    "TofinoModel": "p4ws.mnhlp.nodes.TofinoModel.TofinoModel",
+    "Host": "mininet.node.Host",
+    "CPULimitedHost": "mininet.node.CPULimitedHost",
+    "Switch": "mininet.node.Switch",
+    "OVSSwitch": "mininet.node.OVSSwitch",
+    "OVSKernelSwitch": "mininet.node.OVSKernelSwitch",
+    "UserSwitch": "mininet.node.UserSwitch",
+    "Controller": "mininet.node.Controller",
+    "Link": "mininet.link.Link",
+    "TCLink": "mininet.link.TCLink",
+}
+
+# Type names resolved at most, least recently used ones are dropped
+TYPE_CACHE_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=TYPE_CACHE_SIZE)
+def _resolve_type(path: str):
+    path = TYPE_ALIASES.get(path, path)
+    r = path.rsplit(".", 1)
+    if len(r) != 1:
+        mod, cls = r
+        t = getattr(importlib.import_module(mod), cls)
+    else:
+        t = getattr(builtins, path, None)
+    if not isinstance(t, type):
+        raise ValueError(f"{path} is not name of a type")
+    return t
+
 
 def get_type(path: str):
     """Get type by its type name.
@@ -10,8 +52,11 @@ def get_type(path: str):
     - `mininet.node.Host`
     - `mininet.node.Switch`
 
+    or by a short alias in `TYPE_ALIASES`, e.g. `SimpleSwitchGrpc`. Names are
+    resolved once and cached, see `warm_type_cache`.
+
     Args:
-        path: Full type name, including module name and class name or None.
+        path: Full type name, including module name and class name, an alias, or None.
 
     Returns:
         A type, or None if path is None.
@@ -24,20 +69,58 @@ def get_type(path: str):
 
     if not path:
         return None
-    r = path.rsplit(".", 1)
-    if len(r) != 1:
-        mod, cls = r
-        t = getattr(importlib.import_module(mod), cls)
-    else:
+    if not isinstance(path, str):
+        raise ValueError(f"{path!r} is not name of a type")
+    return _resolve_type(path)
+
+
+def register_type_alias(name: str, path: str):
+    """Register a short alias of a type.
+
+    Args:
+        name: Alias, without dots.
+        path: Full type name.
+    """
+
+    global _type_cache_warmed
+    TYPE_ALIASES[name] = path
+    _resolve_type.cache_clear()
+    _type_cache_warmed = False
+
+
+# Whether aliases are resolved
+_type_cache_warmed = False
+
+
+def warm_type_cache():
+    """Resolve all aliases in `TYPE_ALIASES`, once per process.
+
+    Aliases whose modules cannot be imported are skipped, they raise when used.
+    """
+
+    global _type_cache_warmed
+    if _type_cache_warmed:
+        return
+    _type_cache_warmed = True
+    for name in TYPE_ALIASES:
         try:
-            t = eval(path)
-        except Exception as e:
-            raise ValueError(f"{path} is not name of a type")
-    if not isinstance(t, type):
-        raise ValueError(f"{path} is not name of a type")
-    return t
+            _resolve_type(name)
+        except (ImportError, AttributeError, ValueError):
+            pass
 
 
 def get_type_name(obj: object):
     """Get type name of an object."""
     return type(obj).__name__
+
+
+def get_class_names(obj: object):
+    """Get names of classes of an object, short and full, including base classes."""
+
+    names = []
+    for c in type(obj).__mro__:
+        if c is object:
+            break
+        names.append(c.__name__)
+        names.append(f"{c.__module__}.{c.__qualname__}")
+    return names
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from p4ws.events import (MESSAGE_HEADER, NO_ARG, EventStore, EventWriter,
+                         decode_message, load_names)
+
+
+def make_message(type_: int, fields: bytes = b"", packet: int = 1):
+    return MESSAGE_HEADER.pack(type_, 0, 0, 0xabc, packet, 0) + fields
+
+
+def test_decode_message():
+    row = decode_message(make_message(12, (3).to_bytes(4, "little") + (7).to_bytes(4, "little")))
+    assert row == (12, 0, 0xabc, 1, 0, 3, 7)
+    assert decode_message(make_message(999)) == (999, 0, 0xabc, 1, 0, NO_ARG, NO_ARG)
+
+
+def test_decode_message_truncated():
+    with pytest.raises(ValueError):
+        decode_message(make_message(12, b"\0\0"))
+    with pytest.raises(ValueError):
+        decode_message(b"\0" * 8)
+
+
+def test_load_names(tmp_path):
+    p4_json = tmp_path / "s1.json"
+    p4_json.write_text(json.dumps({
+        "actions": [{"id": 0, "name": "drop"}],
+        "pipelines": [{"id": 0, "name": "ingress",
+                       "tables": [{"id": 2, "name": "fwd"}], "conditionals": []}]}))
+    names = load_names(str(p4_json))
+    assert names["actions"] == {"0": "drop"}
+    assert names["tables"] == {"2": "fwd"}
+    assert load_names(str(tmp_path / "missing.json")) == {}
+    assert load_names(None) == {}
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "events")
+    writer = EventWriter(path, ["s1", "s2"], {"s1": {"tables": {"2": "fwd"}}})
+    writer.append(0, 1.5, [decode_message(make_message(0, (1).to_bytes(4, "little")))])
+    writer.append(0, 2.0, [decode_message(make_message(
+        12, (2).to_bytes(4, "little") + (5).to_bytes(4, "little")))])
+    assert writer.flush() == 2
+    writer.append(1, 3.0, [decode_message(make_message(11, (4).to_bytes(4, "little") + b"\1", 2))])
+    writer.close()
+    assert writer.rows == 3
+
+    store = EventStore(path)
+    assert len(store) == 3
+    assert store.select(switch="s1", types=["table_hit"]) == [{
+        "time": 2.0, "switch": "s1", "type": "table_hit", "cxt": 0, "sig": 0xabc,
+        "id": 1, "copy": 0, "table": "fwd", "entry": 5}]
+    assert store.event(2)["condition"] == 4
+    assert store.event(2)["result"] is True
+    assert store.indices(packet=2) == [2]
+    assert store.count() == {"s1": {"packet_in": 1, "table_hit": 1},
+                             "s2": {"condition_eval": 1}}
+    with pytest.raises(ValueError):
+        store.indices(switch="s3")
+    with pytest.raises(ValueError):
+        store.indices(types=["unknown"])
+
+
+def test_store_exists(tmp_path):
+    EventWriter(str(tmp_path), ["s1"]).close()
+    with pytest.raises(FileExistsError):
+        EventWriter(str(tmp_path), ["s1"])
+
+
+def test_store_truncated(tmp_path):
+    writer = EventWriter(str(tmp_path), ["s1"])
+    writer.append(0, 1.0, [decode_message(make_message(999))])
+    writer.close()
+    with open(tmp_path / "id.col", "r+b") as f:
+        f.truncate(4)
+    with pytest.raises(ValueError):
+        EventStore(str(tmp_path))
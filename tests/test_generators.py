@@ -0,0 +1,61 @@
+import pytest
+
+from p4ws.mnhlp import ParserError
+from p4ws.mnhlp.generators import fat_tree, generate, parse_generator_uri
+
+
+def test_fat_tree_counts():
+    items = list(fat_tree({"k": 4}))
+    switches = [i for i in items if i[0] == "switch"]
+    hosts = [i for i in items if i[0] == "host"]
+    links = [i for i in items if i[0] == "link"]
+    assert len(switches) == 20
+    assert sum(1 for i in switches if i[2] == "core") == 4
+    assert len(hosts) == 16
+    assert len(links) == 48
+
+
+def test_fat_tree_ports_unique():
+    used = set()
+    for item in fat_tree({"k": 6}):
+        if item[0] != "link":
+            continue
+        _, node1, node2, port1, port2 = item
+        for node, port in ((node1, port1), (node2, port2)):
+            assert (node, port) not in used
+            used.add((node, port))
+
+
+def test_fat_tree_names():
+    items = list(fat_tree({"k": 2}, "x-"))
+    assert ("switch", "x-c1", "core") in items
+    assert ("host", "x-h2", "host") in items
+    assert ("link", "x-h1", "x-e1", 0, 1) in items
+
+
+@pytest.mark.parametrize("args", [{"k": 3}, {"k": 0}, {"k": "4"}, {"k": 4, "n": 1}])
+def test_fat_tree_invalid(args):
+    with pytest.raises(ParserError):
+        list(fat_tree(args))
+
+
+def test_generate_styles():
+    items = list(generate({"type": "fat-tree", "k": 2, "host-class": "h",
+                           "core-class": "c", "link-class": "l"}))
+    assert ("switch", "c1", "c") in items
+    assert ("switch", "a1", None) in items
+    assert ("host", "h1", "h") in items
+    assert all(i[-1] == "l" for i in items if i[0] == "link")
+
+
+def test_parse_generator_uri():
+    assert parse_generator_uri("gen:fat-tree?k=8") == {"type": "fat-tree", "k": 8}
+    assert parse_generator_uri("gen:torus?x=2&y=a") == {"type": "torus", "x": 2, "y": "a"}
+    assert parse_generator_uri("topo.json") is None
+
+
+def test_parse_generator_uri_str_values():
+    spec = parse_generator_uri("gen:leaf-spine?prefix=1&leaf-class=2&leaves=2")
+    assert spec == {"type": "leaf-spine", "prefix": "1", "leaf-class": "2", "leaves": 2}
+    items = list(generate(spec))
+    assert ("switch", "1l1", "2") in items
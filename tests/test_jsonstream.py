@@ -0,0 +1,60 @@
+import io
+import json
+
+import pytest
+
+from p4ws.mnhlp.jsonstream import JsonStreamReader
+
+DOCUMENT = {
+    "hosts": {"h1": {"ip": "10.0.0.1/24"}, "h2": {}},
+    "links": [["h1", "s1"], ["h2", "s1", 0, 12345]],
+    "numbers": [1, 23, 456789, -1.5e10, True, None],
+    "text": "a \"quoted\" \\ string é"
+}
+
+
+def read_all(reader: JsonStreamReader):
+    """Read the next value item by item."""
+
+    c = reader.peek()
+    if c == "{":
+        return dict((key, read_all(reader)) for key in reader.iter_object())
+    if c == "[":
+        return [read_all(reader) for _ in reader.iter_array()]
+    return reader.read_value()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 16])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_chunk_boundaries(chunk_size, indent):
+    text = json.dumps(DOCUMENT, indent=indent)
+    reader = JsonStreamReader(io.StringIO(text), chunk_size)
+    assert read_all(reader) == DOCUMENT
+    assert reader.peek() == ""
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4])
+def test_number_split(chunk_size):
+    reader = JsonStreamReader(io.StringIO("[12345678, 9]"), chunk_size)
+    assert read_all(reader) == [12345678, 9]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5])
+def test_skip_value(chunk_size):
+    reader = JsonStreamReader(io.StringIO(json.dumps(DOCUMENT)), chunk_size)
+    values = {}
+    for key in reader.iter_object():
+        if key == "links":
+            values[key] = reader.read_value()
+        else:
+            reader.skip_value()
+    assert values == {"links": DOCUMENT["links"]}
+
+
+@pytest.mark.parametrize("text, pos", [
+    ('{"a": [1, 2}', 11), ('{"a" 1}', 5), ('{a: 1}', 1), ('[1, 2', 5)])
+def test_errors(text, pos):
+    reader = JsonStreamReader(io.StringIO(text), 2)
+    with pytest.raises(json.JSONDecodeError) as e:
+        read_all(reader)
+    assert e.value.pos == pos
@@ -0,0 +1,48 @@
+import pytest
+
+from p4ws.mnhlp.logdrain import RingBuffer
+
+
+def test_ring_buffer_grows():
+    buffer = RingBuffer(8)
+    assert buffer.getvalue() == b""
+    buffer.write(b"abc")
+    assert len(buffer.buffer) == 3
+    assert buffer.getvalue() == b"abc"
+    assert buffer.getvalue(2) == b"bc"
+
+
+def test_ring_buffer_wraps():
+    buffer = RingBuffer(8)
+    buffer.write(b"abcdef")
+    buffer.write(b"ghij")
+    assert len(buffer.buffer) == 8
+    assert buffer.getvalue() == b"cdefghij"
+    buffer.write(b"klm")
+    assert buffer.getvalue() == b"fghijklm"
+    assert buffer.getvalue(5) == b"ijklm"
+    assert buffer.written == 13
+
+
+def test_ring_buffer_large_write():
+    buffer = RingBuffer(4)
+    buffer.write(b"ab")
+    buffer.write(b"0123456789")
+    assert buffer.getvalue() == b"6789"
+
+
+@pytest.mark.parametrize("capacity", [1, 3, 16])
+def test_ring_buffer_chunks(capacity):
+    buffer = RingBuffer(capacity)
+    data = b""
+    for i in range(40):
+        chunk = bytes(range(i % 7))
+        buffer.write(chunk)
+        data += chunk
+        assert buffer.getvalue() == data[-capacity:]
+
+
+def test_ring_buffer_empty():
+    buffer = RingBuffer(0)
+    buffer.write(b"abc")
+    assert buffer.getvalue() == b""
@@ -0,0 +1,42 @@
+import pytest
+
+from p4ws.mnhlp import ParserError
+from p4ws.mnhlp.template import evaluate, expand_link_template, expand_range
+
+
+def test_expand_range():
+    assert list(expand_range("h[1-3]")) == ["h1", "h2", "h3"]
+    assert list(expand_range("h1")) == ["h1"]
+
+
+def test_expand_range_padded():
+    names = list(expand_range("h[08-10]"))
+    assert names == ["h08", "h09", "h10"]
+
+
+def test_expand_range_nested():
+    assert list(expand_range("s[1-2]p[1-2]")) == ["s1p1", "s1p2", "s2p1", "s2p2"]
+
+
+def test_expand_range_empty():
+    with pytest.raises(ParserError):
+        list(expand_range("h[3-1]"))
+
+
+@pytest.mark.parametrize("expr, value", [
+    ("i", 33), ("i//32", 1), ("i%32+2", 3), ("-i*2", -66), ("(i+1)//2", 17), ("7", 7)])
+def test_evaluate(expr, value):
+    assert evaluate(expr, {"i": 33}) == value
+
+
+@pytest.mark.parametrize("expr", [
+    "j", "i/2", "i**2", "__import__('os')", "i.real", "1//0", "'a'", "True", "i +"])
+def test_evaluate_invalid(expr):
+    with pytest.raises(ParserError):
+        evaluate(expr, {"i": 1})
+
+
+def test_expand_link_template():
+    links = list(expand_link_template(
+        {"for": {"i": "[1-3]"}, "link": ["h{i}", "s{i//2}", 0, "{i%2+1}"]}))
+    assert links == [["h1", "s0", 0, 2], ["h2", "s1", 0, 1], ["h3", "s1", 0, 2]]
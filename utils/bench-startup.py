@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+#
+# Benchmark startup latency of p4ws executable.
+# Copyright 2025 P4WS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Author: NTLPY <59137305+NTLPY@users.noreply.github.com>
+#
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Commands to benchmark, and modules they must not import
+COMMANDS = {
+    "version": ["mininet", "setuptools_scm", "p4ws.loadmn", "p4ws.tar", "p4ws.patch", "p4ws.clean"],
+    "help": ["mininet", "setuptools_scm", "p4ws.loadmn", "p4ws.tar", "p4ws.patch", "p4ws.clean"],
+    "tar --help": ["mininet", "setuptools_scm", "p4ws.loadmn"],
+    "clean --help": ["mininet", "setuptools_scm", "p4ws.loadmn"],
+}
+
+
+def get_workspace_path():
+    """
+    Get the workspace path for the current P4WS project.
+    """
+    return os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+
+
+def run(command: str, importtime: bool = False):
+    """
+    Run `python3 -m p4ws <command>`, return elapsed seconds and stderr.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.join(get_workspace_path(), "src")] + env.get("PYTHONPATH", "").split(os.pathsep))
+    argv = [sys.executable] + (["-X", "importtime"] if importtime else []) + \
+        ["-m", "p4ws"] + command.split()
+    start = time.perf_counter()
+    result = subprocess.run(argv, env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True)
+    return time.perf_counter() - start, result.stderr
+
+
+def get_imported_modules(stderr: str):
+    """
+    Get names of modules from output of `-X importtime`.
+    """
+    modules = set()
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark startup latency of p4ws executable.")
+    parser.add_argument("-n", "--runs", type=int, default=10,
+                        help="runs of each command (default: %(default)s)")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="fail if median latency of a command exceeds MS milliseconds", metavar="MS")
+    args = parser.parse_args()
+
+    failed = False
+    for command, forbidden in COMMANDS.items():
+        _, stderr = run(command, importtime=True)
+        modules = get_imported_modules(stderr)
+        imported = sorted(m for m in modules
+                          if any(m == f or m.startswith(f + ".") for f in forbidden))
+        latencies = [run(command)[0] * 1000 for _ in range(args.runs)]
+        median = statistics.median(latencies)
+        print("{:<16} median {:7.1f} ms, min {:7.1f} ms, {} modules".format(
+            command, median, min(latencies), len(modules)))
+        if imported:
+            print("Error: '{}' imported {}".format(command, ", ".join(imported)))
+            failed = True
+        if args.max_ms is not None and median > args.max_ms:
+            print("Error: '{}' exceeded {} ms".format(command, args.max_ms))
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    exit(main())